@@ -47,9 +47,24 @@ def create_app(config_name=None):
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
     
+    # Shared metrics snapshot: one collector process, read-only view per worker
+    if app.config.get('SHARED_METRICS_ENABLED'):
+        from .services.metrics_snapshot import SharedMetricsReader, supervise_collector
+        supervise_collector(
+            app.config['SHARED_METRICS_NAME'],
+            app.config['SHARED_METRICS_SIZE'],
+            app.config['SHARED_METRICS_INTERVAL'],
+            app.config.get('DOCKER_HOST')
+        )
+        app.extensions['metrics_snapshot'] = SharedMetricsReader(
+            app.config['SHARED_METRICS_NAME'],
+            app.config['SHARED_METRICS_MAX_AGE']
+        )
+    
     # Register blueprints
     from routes import (api_docker, api_system, api_auth, api_radarr, api_sonarr, 
-                        api_overseerr, api_plex, api_tautulli, api_utorrent, api_rutorrent)
+                        api_overseerr, api_plex, api_tautulli, api_utorrent, api_rutorrent,
+                        api_storage, api_torrents, api_library)
     app.register_blueprint(api_auth.bp)
     app.register_blueprint(api_docker.bp)
     app.register_blueprint(api_system.bp)
@@ -60,6 +75,9 @@ def create_app(config_name=None):
     app.register_blueprint(api_tautulli.bp)
     app.register_blueprint(api_utorrent.bp)
     app.register_blueprint(api_rutorrent.bp)
+    app.register_blueprint(api_storage.bp)
+    app.register_blueprint(api_torrents.bp)
+    app.register_blueprint(api_library.bp)
     
     # Error handlers
     @app.errorhandler(404)
@@ -113,6 +131,13 @@ def create_app(config_name=None):
             db.session.add(admin)
             db.session.commit()
             logger.info("Default admin user created. Username: admin, Password: admin")
+        
+        # Background jobs start in every worker; a ProcessLock lets one run them
+        api_torrents.get_transfer_sampler()
+        if app.config.get('RADARR_API_KEY'):
+            api_radarr.get_library_sync()
+        if app.config.get('SONARR_API_KEY'):
+            api_sonarr.get_library_sync()
     
     logger.info(f"SeedBox Control Panel initialized with config: {config_name}")
     return app, socketio if socketio else None
@@ -35,6 +35,30 @@ class Config:
     SONARR_URL = os.getenv('SONARR_URL', 'http://localhost:8989')
     SONARR_API_KEY = os.getenv('SONARR_API_KEY', '')
     
+    # Radarr/Sonarr library sync: history poll interval and full re-import interval (seconds)
+    LIBRARY_SYNC_INTERVAL = int(os.getenv('LIBRARY_SYNC_INTERVAL', 300))
+    LIBRARY_FULL_SYNC_INTERVAL = int(os.getenv('LIBRARY_FULL_SYNC_INTERVAL', 86400))
+    
+    # Radarr/Sonarr search scheduler: ids per command, concurrent commands, and indexer
+    # queries per hour (default, plus per-indexer overrides as name=limit,name=limit)
+    SEARCH_BATCH_SIZE = int(os.getenv('SEARCH_BATCH_SIZE', 20))
+    SEARCH_MAX_INFLIGHT = int(os.getenv('SEARCH_MAX_INFLIGHT', 2))
+    SEARCH_INDEXER_HOURLY_LIMIT = int(os.getenv('SEARCH_INDEXER_HOURLY_LIMIT', 60))
+    SEARCH_INDEXER_LIMITS = {
+        name.strip().lower(): int(limit)
+        for name, limit in (item.split('=', 1) for item in os.getenv('SEARCH_INDEXER_LIMITS', '').split(',') if '=' in item)
+    }
+    # Queries charged for a Sonarr series search when its season count is not synced yet
+    SEARCH_SERIES_COST = int(os.getenv('SEARCH_SERIES_COST', 10))
+    
+    # Radarr/Sonarr paged lists (wanted/missing, history): page size and pages fetched
+    # concurrently when streaming every page
+    ARR_PAGE_SIZE = int(os.getenv('ARR_PAGE_SIZE', 250))
+    ARR_PAGE_WORKERS = int(os.getenv('ARR_PAGE_WORKERS', 4))
+    
+    # Seconds between background refreshes of cached Radarr/Sonarr calendar windows
+    CALENDAR_REFRESH_INTERVAL = int(os.getenv('CALENDAR_REFRESH_INTERVAL', 1800))
+    
     PLEX_URL = os.getenv('PLEX_URL', 'http://localhost:32400')
     PLEX_TOKEN = os.getenv('PLEX_TOKEN', '')
     
@@ -58,6 +82,55 @@ class Config:
     RUTORRENT_URL = os.getenv('RUTORRENT_URL', 'http://localhost:8081')
     RUTORRENT_USERNAME = os.getenv('RUTORRENT_USERNAME', '')
     RUTORRENT_PASSWORD = os.getenv('RUTORRENT_PASSWORD', '')
+    # XML-RPC mount: /plugins/httprpc/action.php, /plugins/rpc/rpc.php or /RPC2
+    RUTORRENT_RPC_PATH = os.getenv('RUTORRENT_RPC_PATH', '/plugins/httprpc/action.php')
+    # Optional direct SCGI socket to rtorrent: unix:///path/rpc.socket or host:5000
+    RTORRENT_SCGI_ADDRESS = os.getenv('RTORRENT_SCGI_ADDRESS', '')
+    RTORRENT_SCGI_POOL_SIZE = int(os.getenv('RTORRENT_SCGI_POOL_SIZE', 4))
+    
+    # Torrent clients merged into /api/torrents (comma separated: utorrent, rutorrent)
+    TORRENT_CLIENTS = [c for c in os.getenv('TORRENT_CLIENTS', 'utorrent,rutorrent').split(',') if c]
+    
+    # Seconds a fetched torrent list is shared between list/stats/bandwidth calls
+    TORRENT_SNAPSHOT_TTL = float(os.getenv('TORRENT_SNAPSHOT_TTL', 2.0))
+    
+    # Seconds a torrent's files/peers/trackers stay cached (dropped early on state change)
+    TORRENT_DETAIL_TTL = float(os.getenv('TORRENT_DETAIL_TTL', 10.0))
+    
+    # Download pipeline: seconds the *arr queues are cached, and seconds without
+    # downloaded bytes before a queued torrent counts as stalled
+    PIPELINE_QUEUE_TTL = float(os.getenv('PIPELINE_QUEUE_TTL', 5.0))
+    PIPELINE_STALL_SECONDS = int(os.getenv('PIPELINE_STALL_SECONDS', 600))
+    
+    # Per-torrent transfer history: sample interval (seconds) and raw sample retention (days)
+    TRANSFER_SAMPLE_INTERVAL = int(os.getenv('TRANSFER_SAMPLE_INTERVAL', 300))
+    TRANSFER_SAMPLE_RETENTION_DAYS = int(os.getenv('TRANSFER_SAMPLE_RETENTION_DAYS', 2))
+    
+    # JSON file with seeding policies (ratio/seed-time/disk rules) for /api/torrents/policies
+    SEEDING_POLICIES_FILE = os.getenv('SEEDING_POLICIES_FILE', '')
+    
+    # Concurrent submissions to the client during bulk torrent upload
+    TORRENT_UPLOAD_WORKERS = int(os.getenv('TORRENT_UPLOAD_WORKERS', 4))
+    
+    # Storage paths scanned for hardlinks, duplicates and orphans (comma separated)
+    DOWNLOAD_PATHS = [p for p in os.getenv('DOWNLOAD_PATHS', '').split(',') if p]
+    MEDIA_PATHS = [p for p in os.getenv('MEDIA_PATHS', '').split(',') if p]
+    # Seconds the download file index, hardlink report and label usage report are reused
+    STORAGE_INDEX_TTL = int(os.getenv('STORAGE_INDEX_TTL', 600))
+    
+    # Sensor polling (hardware reads are slow on some hosts)
+    SENSOR_POLL_INTERVAL = int(os.getenv('SENSOR_POLL_INTERVAL', 30))
+    SENSOR_HISTORY_SIZE = int(os.getenv('SENSOR_HISTORY_SIZE', 20))
+    
+    # Directory for the lock files that elect one worker to run each background job
+    PROCESS_LOCK_DIR = os.getenv('PROCESS_LOCK_DIR', '') or None
+    
+    # Shared-memory metrics snapshot (one collector process for all workers)
+    SHARED_METRICS_ENABLED = os.getenv('SHARED_METRICS_ENABLED', 'false').lower() == 'true'
+    SHARED_METRICS_NAME = os.getenv('SHARED_METRICS_NAME', 'seedbox_metrics')
+    SHARED_METRICS_SIZE = int(os.getenv('SHARED_METRICS_SIZE', 4 * 1024 * 1024))
+    SHARED_METRICS_INTERVAL = int(os.getenv('SHARED_METRICS_INTERVAL', 5))
+    SHARED_METRICS_MAX_AGE = int(os.getenv('SHARED_METRICS_MAX_AGE', 30))
     
     # Features
     ENABLE_WEBSOCKET = os.getenv('ENABLE_WEBSOCKET', 'true').lower() == 'true'
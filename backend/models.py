@@ -177,10 +177,16 @@ class MediaLibrary(db.Model):
     title = db.Column(db.String(500), nullable=False)
     year = db.Column(db.Integer)
     status = db.Column(db.String(50))  # wanted, monitored, unmonitored, etc
-    file_size = db.Column(db.Integer)  # bytes
+    file_size = db.Column(db.BigInteger)  # bytes
     date_added = db.Column(db.DateTime)
     last_sync = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    metadata = db.Column(JSON)  # Store additional info
+    # 'metadata' is reserved on declarative models; keep the column name, rename the attribute
+    extra = db.Column('metadata', JSON)  # Store additional info
+    
+    __table_args__ = (
+        db.UniqueConstraint('app_type', 'remote_id', name='uq_media_library_item'),
+        db.Index('ix_media_library_app_title', 'app_type', 'title'),
+    )
     
     def to_dict(self):
         return {
@@ -191,5 +197,106 @@ class MediaLibrary(db.Model):
             'status': self.status,
             'file_size': self.file_size,
             'date_added': self.date_added.isoformat() if self.date_added else None,
-            'metadata': self.metadata
+            'metadata': self.extra
+        }
+
+
+class LibrarySyncState(db.Model):
+    """Progress of the Radarr/Sonarr -> MediaLibrary sync"""
+    __tablename__ = 'library_sync_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    app_type = db.Column(db.String(20), unique=True, nullable=False)  # radarr, sonarr
+    last_full_sync = db.Column(db.DateTime)
+    last_sync = db.Column(db.DateTime)
+    history_cursor = db.Column(db.String(40))  # date of the newest history record applied
+    items = db.Column(db.Integer, default=0)
+    
+    def to_dict(self):
+        return {
+            'app_type': self.app_type,
+            'last_full_sync': self.last_full_sync.isoformat() if self.last_full_sync else None,
+            'last_sync': self.last_sync.isoformat() if self.last_sync else None,
+            'history_cursor': self.history_cursor,
+            'items': self.items
         }
+
+
+class MediaSearchEntry(db.Model):
+    """Searchable titles for MediaLibrary items (SQLite mirrors this into an FTS5 table)"""
+    __tablename__ = 'media_search'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    app_type = db.Column(db.String(20), nullable=False)  # radarr, sonarr
+    remote_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(500), nullable=False)
+    alt_titles = db.Column(db.Text)  # alternate titles, space separated
+    year = db.Column(db.Integer)
+    search_text = db.Column(db.Text)  # lowercased title, alternates and year for LIKE search
+    
+    __table_args__ = (db.UniqueConstraint('app_type', 'remote_id', name='uq_media_search_item'),)
+
+
+class IndexerBudget(db.Model):
+    """Hourly search query budget for one Radarr/Sonarr indexer, shared by every worker"""
+    __tablename__ = 'indexer_budgets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    app_type = db.Column(db.String(20), nullable=False)  # radarr, sonarr
+    name = db.Column(db.String(200), nullable=False)  # lowercased indexer name
+    capacity = db.Column(db.Integer, nullable=False)  # queries per hour
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)  # unix seconds of the last refill
+    
+    __table_args__ = (db.UniqueConstraint('app_type', 'name', name='uq_indexer_budget'),)
+
+
+class TrackedTorrent(db.Model):
+    """Torrent identity for transfer history (hash -> compact integer id)"""
+    __tablename__ = 'tracked_torrents'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    client = db.Column(db.String(20), nullable=False)  # utorrent, rutorrent
+    info_hash = db.Column(db.String(40), nullable=False)
+    name = db.Column(db.String(500))
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('client', 'info_hash', name='uq_tracked_torrent'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'client': self.client,
+            'hash': self.info_hash,
+            'name': self.name,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None
+        }
+
+
+class TorrentTransferSample(db.Model):
+    """Per-torrent transfer deltas, stored only for torrents that changed"""
+    __tablename__ = 'torrent_transfer_samples'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    torrent_id = db.Column(db.Integer, db.ForeignKey('tracked_torrents.id'), nullable=False)
+    ts = db.Column(db.Integer, nullable=False)  # unix seconds
+    uploaded = db.Column(db.BigInteger, default=0)  # bytes since previous sample
+    downloaded = db.Column(db.BigInteger, default=0)  # bytes since previous sample
+    
+    __table_args__ = (db.Index('ix_transfer_samples_ts_torrent', 'ts', 'torrent_id'),)
+
+
+class TorrentTransferDaily(db.Model):
+    """Daily rollup of per-torrent transfer deltas"""
+    __tablename__ = 'torrent_transfer_daily'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    torrent_id = db.Column(db.Integer, db.ForeignKey('tracked_torrents.id'), nullable=False)
+    day = db.Column(db.Integer, nullable=False)  # days since unix epoch (UTC)
+    uploaded = db.Column(db.BigInteger, default=0)
+    downloaded = db.Column(db.BigInteger, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('torrent_id', 'day', name='uq_transfer_daily'),
+        db.Index('ix_transfer_daily_day_torrent', 'day', 'torrent_id'),
+    )
@@ -6,7 +6,7 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..services.docker_service import DockerService
 from ..models import AuditLog, db
-from ..utils import log_audit, handle_errors
+from ..utils import log_audit, handle_errors, get_shared_metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,10 +49,13 @@ def docker_status():
 @handle_errors
 def list_containers():
     """List all containers"""
-    docker_svc = get_docker_service()
     all_containers = request.args.get('all', 'true').lower() == 'true'
     
-    containers = docker_svc.get_containers(all=all_containers)
+    containers = get_shared_metrics('containers')
+    if containers is None:
+        containers = get_docker_service().get_containers(all=all_containers)
+    elif not all_containers:
+        containers = [c for c in containers if c['status'] == 'running']
     
     return jsonify({
         'containers': containers,
@@ -0,0 +1,54 @@
+"""
+Media library routes
+Title search across the synced Radarr and Sonarr libraries
+"""
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from ..services.library_search import LibrarySearchIndex
+from ..utils import handle_errors
+from .api_radarr import get_library_sync as get_radarr_library_sync
+from .api_sonarr import get_library_sync as get_sonarr_library_sync
+import logging
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('library', __name__, url_prefix='/api/library')
+
+library_search = None
+
+
+def get_library_search():
+    """Get or create the search index, making sure both library syncs are running
+    
+    The syncs import in the background; until they finish, search covers
+    whatever has been indexed so far.
+    """
+    global library_search
+    if library_search is None:
+        library_search = LibrarySearchIndex()
+        for get_sync in (get_radarr_library_sync, get_sonarr_library_sync):
+            get_sync()
+    return library_search
+
+
+@bp.before_request
+@jwt_required()
+def require_auth():
+    """Require authentication for all library routes"""
+    pass
+
+
+@bp.route('/search', methods=['GET'])
+@handle_errors
+def search():
+    """Search movie and series titles, alternate titles and years by prefix"""
+    query = request.args.get('q', '').strip()
+    app_type = request.args.get('type')
+    limit = request.args.get('limit', 20, type=int)
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if app_type not in (None, 'radarr', 'sonarr'):
+        return jsonify({'error': 'type must be radarr or sonarr'}), 400
+    
+    results = get_library_search().search(query, app_type=app_type, limit=max(1, min(limit, 100)))
+    return jsonify(results), 200
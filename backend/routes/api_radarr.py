@@ -3,10 +3,15 @@ Radarr integration routes
 Phase 5: 'RR' stack API integrations
 """
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..services.radarr_service import RadarrService
+from ..services.library_sync import RadarrLibrarySync
+from ..services.library_search import LibrarySearchIndex
+from ..services.process_lock import ProcessLock
+from ..services.search_scheduler import SearchScheduler, recency
+from ..services.calendar_cache import CalendarCache
 from ..models import AppConfig, MediaLibrary, db
-from ..utils import handle_errors, log_audit
+from ..utils import arr_list_response, handle_errors, log_audit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +19,9 @@ logger = logging.getLogger(__name__)
 bp = Blueprint('radarr', __name__, url_prefix='/api/radarr')
 
 radarr_service = None
+library_sync = None
+search_scheduler = None
+calendar_cache = None
 
 
 def get_radarr_service():
@@ -27,6 +35,49 @@ def get_radarr_service():
     return radarr_service
 
 
+def get_library_sync():
+    """Get or create the Radarr library sync, starting its background refresh (called at app startup)"""
+    global library_sync
+    if library_sync is None:
+        library_sync = RadarrLibrarySync(
+            get_radarr_service(),
+            interval=current_app.config.get('LIBRARY_SYNC_INTERVAL', 300),
+            full_sync_interval=current_app.config.get('LIBRARY_FULL_SYNC_INTERVAL', 86400),
+            search_index=LibrarySearchIndex(),
+            lock=ProcessLock('radarr-library-sync', current_app.config.get('PROCESS_LOCK_DIR'))
+        )
+        library_sync.start(current_app._get_current_object())
+    return library_sync
+
+
+def get_search_scheduler():
+    """Get or create the Radarr search scheduler, starting its background loop"""
+    global search_scheduler
+    if search_scheduler is None:
+        search_scheduler = SearchScheduler(
+            get_radarr_service(), 'radarr', ('movie',),
+            batch_size=current_app.config.get('SEARCH_BATCH_SIZE', 20),
+            max_inflight=current_app.config.get('SEARCH_MAX_INFLIGHT', 2),
+            indexer_limit=current_app.config.get('SEARCH_INDEXER_HOURLY_LIMIT', 60),
+            indexer_limits=current_app.config.get('SEARCH_INDEXER_LIMITS', {})
+        )
+        search_scheduler.start(current_app._get_current_object())
+    return search_scheduler
+
+
+def get_calendar_cache():
+    """Get or create the upcoming releases cache, starting its background refresh"""
+    global calendar_cache
+    if calendar_cache is None:
+        radarr = get_radarr_service()
+        calendar_cache = CalendarCache(
+            radarr.fetch_calendar, radarr.format_calendar_movie, 'radarr',
+            refresh_interval=current_app.config.get('CALENDAR_REFRESH_INTERVAL', 1800)
+        )
+        calendar_cache.start()
+    return calendar_cache
+
+
 @bp.before_request
 @jwt_required()
 def require_auth():
@@ -60,10 +111,17 @@ def status():
 @bp.route('/movies', methods=['GET'])
 @handle_errors
 def movies():
-    """Get movies from library"""
-    radarr = get_radarr_service()
+    """Get movies from the synced library table (?live=true asks Radarr directly)
+    
+    Radarr is asked directly until the initial library import has finished.
+    """
     limit = request.args.get('limit', 100, type=int)
-    movies_list = radarr.get_movies(limit=limit)
+    if request.args.get('live', 'false').lower() == 'true' or not get_library_sync().is_synced():
+        movies_list = get_radarr_service().get_movies(limit=limit)
+    else:
+        rows = MediaLibrary.query.filter_by(app_type='radarr') \
+            .order_by(MediaLibrary.title).limit(limit).all()
+        movies_list = [row.extra for row in rows]
     
     return jsonify({
         'movies': movies_list,
@@ -74,24 +132,43 @@ def movies():
 @bp.route('/stats', methods=['GET'])
 @handle_errors
 def stats():
-    """Get Radarr statistics"""
-    radarr = get_radarr_service()
-    stats_data = radarr.get_movie_stats()
+    """Get Radarr statistics from the cached library totals (?live=true recounts upstream)"""
+    stats_data = None
+    if request.args.get('live', 'false').lower() != 'true':
+        stats_data = get_library_sync().get_stats()
+    if stats_data is None:
+        stats_data = get_radarr_service().get_movie_stats()
     return jsonify(stats_data), 200
 
 
 @bp.route('/upcoming', methods=['GET'])
 @handle_errors
 def upcoming():
-    """Get upcoming releases"""
-    radarr = get_radarr_service()
-    days = request.args.get('days', 7, type=int)
-    upcoming_list = radarr.get_upcoming(days=days)
+    """Get upcoming releases from memory (?past= and ?days= set the window, ?live=true asks Radarr directly)"""
+    days = max(0, min(request.args.get('days', 7, type=int), 90))
+    past = max(0, min(request.args.get('past', 30, type=int), 90))
     
-    return jsonify({
-        'upcoming': upcoming_list,
-        'count': len(upcoming_list)
-    }), 200
+    if request.args.get('live', 'false').lower() == 'true':
+        upcoming_list = get_radarr_service().get_upcoming(days=days)
+        return jsonify({
+            'upcoming': upcoming_list,
+            'count': len(upcoming_list)
+        }), 200
+    
+    try:
+        window = get_calendar_cache().get(past, days)
+    except Exception as e:
+        logger.error(f"Error getting Radarr calendar: {e}")
+        return jsonify({'error': 'Failed to fetch calendar from Radarr'}), 502
+    
+    response = jsonify({
+        'upcoming': window['items'],
+        'count': len(window['items']),
+        'start': window['start'],
+        'end': window['end']
+    })
+    response.set_etag(window['etag'])
+    return response.make_conditional(request)
 
 
 @bp.route('/queue', methods=['GET'])
@@ -110,35 +187,68 @@ def queue():
 @bp.route('/history', methods=['GET'])
 @handle_errors
 def history():
-    """Get recent history"""
+    """Get history, newest first: one page (?page=, ?page_size=) or every page as NDJSON (?stream=true)"""
     radarr = get_radarr_service()
-    limit = request.args.get('limit', 50, type=int)
-    history_list = radarr.get_history(limit=limit)
-    
-    return jsonify({
-        'history': history_list,
-        'count': len(history_list)
-    }), 200
+    return arr_list_response('history', radarr.get_history_page, radarr.iter_history, default_size=50)
 
 
 @bp.route('/search/<int:movie_id>', methods=['POST'])
 @handle_errors
 def search(movie_id):
-    """Trigger search for a movie"""
-    from flask_jwt_extended import get_jwt_identity
-    user_id = get_jwt_identity()
+    """Queue a search for a movie ahead of bulk searches"""
+    queued = get_search_scheduler().enqueue('movie', [movie_id])
     
-    radarr = get_radarr_service()
-    result = radarr.trigger_search([movie_id])
+    log_audit(get_jwt_identity(), 'radarr_search_queued', request.remote_addr, 'success',
+              target=f'movie_{movie_id}')
+    return jsonify({'message': 'Search queued', 'queued': queued}), 202
+
+
+@bp.route('/search', methods=['POST'])
+@handle_errors
+def bulk_search():
+    """Queue searches for {"ids": [...]} or every missing movie ({"missing": true})
     
-    if result:
-        log_audit(user_id, 'radarr_search_triggered', request.remote_addr, 'success', 
-                 target=f'movie_{movie_id}')
-        return jsonify({'message': 'Search triggered'}), 200
+    Missing movies come from the synced library and are ordered by release
+    or added date, newest first. Before the initial import has finished they
+    are read from Radarr in the background instead.
+    """
+    data = request.get_json(silent=True) or {}
+    scheduler = get_search_scheduler()
+    sync = get_library_sync()
+    
+    if data.get('missing') and not sync.is_synced():
+        def pages():
+            formatted = [sync.format(movie) for movie in sync.fetch_all() if sync.item_status(movie) == 'wanted']
+            yield [(movie['id'], recency(movie.get('releaseDate'), movie.get('added'))) for movie in formatted]
+        
+        started = scheduler.enqueue_background('movie', pages(), 'missing')
+        log_audit(get_jwt_identity(), 'radarr_bulk_search_queued', request.remote_addr, 'success',
+                  target='missing movies')
+        return jsonify({
+            'message': 'Queuing missing movies' if started else 'Missing movies are already being queued',
+            'loading': True
+        }), 202
+    elif data.get('missing'):
+        rows = MediaLibrary.query.filter_by(app_type='radarr', status='wanted').all()
+        queued = scheduler.enqueue_many('movie', (
+            (row.remote_id, recency((row.extra or {}).get('releaseDate'), (row.extra or {}).get('added')))
+            for row in rows
+        ))
+    elif isinstance(data.get('ids'), list) and data['ids']:
+        queued = scheduler.enqueue('movie', [int(i) for i in data['ids']])
     else:
-        log_audit(user_id, 'radarr_search_failed', request.remote_addr, 'failure', 
-                 target=f'movie_{movie_id}')
-        return jsonify({'error': 'Failed to trigger search'}), 500
+        return jsonify({'error': 'Provide ids or missing'}), 400
+    
+    log_audit(get_jwt_identity(), 'radarr_bulk_search_queued', request.remote_addr, 'success',
+              target=f'{queued} movies')
+    return jsonify({'message': 'Searches queued', 'queued': queued}), 202
+
+
+@bp.route('/search/queue', methods=['GET'])
+@handle_errors
+def search_queue():
+    """Get queued searches, indexer budgets and search command progress"""
+    return jsonify(get_search_scheduler().get_status()), 200
 
 
 @bp.route('/config', methods=['GET'])
@@ -148,3 +258,24 @@ def config():
     radarr = get_radarr_service()
     config_data = radarr.get_config()
     return jsonify(config_data), 200
+
+
+@bp.route('/library/sync', methods=['GET'])
+@handle_errors
+def library_sync_state():
+    """Get the library sync state"""
+    return jsonify(get_library_sync().get_state()), 200
+
+
+@bp.route('/library/sync', methods=['POST'])
+@handle_errors
+def run_library_sync():
+    """Sync the library now; {"full": true} forces a full import"""
+    data = request.get_json(silent=True) or {}
+    result = get_library_sync().sync(full=bool(data.get('full')))
+    
+    log_audit(get_jwt_identity(), 'sync_radarr_library', request.remote_addr,
+              'failure' if 'error' in result else 'success', target='radarr')
+    
+    return jsonify(result), 200 if 'error' not in result else 502
+
@@ -5,8 +5,13 @@ Phase 5: 'RR' stack API integrations
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..services.sonarr_service import SonarrService
-from ..models import AppConfig, db
-from ..utils import handle_errors, log_audit
+from ..services.library_sync import SonarrLibrarySync
+from ..services.library_search import LibrarySearchIndex
+from ..services.process_lock import ProcessLock
+from ..services.search_scheduler import SearchScheduler, recency
+from ..services.calendar_cache import CalendarCache
+from ..models import AppConfig, MediaLibrary, db
+from ..utils import arr_list_response, handle_errors, log_audit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +19,9 @@ logger = logging.getLogger(__name__)
 bp = Blueprint('sonarr', __name__, url_prefix='/api/sonarr')
 
 sonarr_service = None
+library_sync = None
+search_scheduler = None
+calendar_cache = None
 
 
 def get_sonarr_service():
@@ -27,6 +35,66 @@ def get_sonarr_service():
     return sonarr_service
 
 
+def get_library_sync():
+    """Get or create the Sonarr library sync, starting its background refresh (called at app startup)"""
+    global library_sync
+    if library_sync is None:
+        library_sync = SonarrLibrarySync(
+            get_sonarr_service(),
+            interval=current_app.config.get('LIBRARY_SYNC_INTERVAL', 300),
+            full_sync_interval=current_app.config.get('LIBRARY_FULL_SYNC_INTERVAL', 86400),
+            search_index=LibrarySearchIndex(),
+            lock=ProcessLock('sonarr-library-sync', current_app.config.get('PROCESS_LOCK_DIR'))
+        )
+        library_sync.start(current_app._get_current_object())
+    return library_sync
+
+
+def search_cost(kind, ids):
+    """Indexer queries a search command costs
+    
+    EpisodeSearch queries once per episode; SeriesSearch queries once per
+    season (season packs), taken from the synced library when known.
+    """
+    if kind != 'series':
+        return len(ids)
+    seasons = {
+        row.remote_id: (row.extra or {}).get('seasonCount')
+        for row in MediaLibrary.query.filter(MediaLibrary.app_type == 'sonarr', MediaLibrary.remote_id.in_(ids))
+    }
+    default = current_app.config.get('SEARCH_SERIES_COST', 10)
+    return sum(max(1, seasons.get(series_id) or default) for series_id in ids)
+
+
+def get_search_scheduler():
+    """Get or create the Sonarr search scheduler, starting its background loop"""
+    global search_scheduler
+    if search_scheduler is None:
+        search_scheduler = SearchScheduler(
+            get_sonarr_service(), 'sonarr', ('series', 'episode'),
+            batch_size=current_app.config.get('SEARCH_BATCH_SIZE', 20),
+            max_inflight=current_app.config.get('SEARCH_MAX_INFLIGHT', 2),
+            indexer_limit=current_app.config.get('SEARCH_INDEXER_HOURLY_LIMIT', 60),
+            indexer_limits=current_app.config.get('SEARCH_INDEXER_LIMITS', {}),
+            cost=search_cost
+        )
+        search_scheduler.start(current_app._get_current_object())
+    return search_scheduler
+
+
+def get_calendar_cache():
+    """Get or create the episode calendar cache, starting its background refresh"""
+    global calendar_cache
+    if calendar_cache is None:
+        sonarr = get_sonarr_service()
+        calendar_cache = CalendarCache(
+            sonarr.fetch_calendar, sonarr.format_calendar_episode, 'sonarr',
+            refresh_interval=current_app.config.get('CALENDAR_REFRESH_INTERVAL', 1800)
+        )
+        calendar_cache.start()
+    return calendar_cache
+
+
 @bp.before_request
 @jwt_required()
 def require_auth():
@@ -60,10 +128,17 @@ def status():
 @bp.route('/series', methods=['GET'])
 @handle_errors
 def series():
-    """Get series from library"""
-    sonarr = get_sonarr_service()
+    """Get series from the synced library table (?live=true asks Sonarr directly)
+    
+    Sonarr is asked directly until the initial library import has finished.
+    """
     limit = request.args.get('limit', 100, type=int)
-    series_list = sonarr.get_series(limit=limit)
+    if request.args.get('live', 'false').lower() == 'true' or not get_library_sync().is_synced():
+        series_list = get_sonarr_service().get_series(limit=limit)
+    else:
+        rows = MediaLibrary.query.filter_by(app_type='sonarr') \
+            .order_by(MediaLibrary.title).limit(limit).all()
+        series_list = [row.extra for row in rows]
     
     return jsonify({
         'series': series_list,
@@ -74,24 +149,43 @@ def series():
 @bp.route('/stats', methods=['GET'])
 @handle_errors
 def stats():
-    """Get Sonarr statistics"""
-    sonarr = get_sonarr_service()
-    stats_data = sonarr.get_series_stats()
+    """Get Sonarr statistics from the cached library totals (?live=true recounts upstream)"""
+    stats_data = None
+    if request.args.get('live', 'false').lower() != 'true':
+        stats_data = get_library_sync().get_stats()
+    if stats_data is None:
+        stats_data = get_sonarr_service().get_series_stats()
     return jsonify(stats_data), 200
 
 
 @bp.route('/calendar', methods=['GET'])
 @handle_errors
 def calendar():
-    """Get upcoming episodes"""
-    sonarr = get_sonarr_service()
-    days = request.args.get('days', 7, type=int)
-    calendar_list = sonarr.get_calendar(days=days)
+    """Get upcoming episodes from memory (?past= and ?days= set the window, ?live=true asks Sonarr directly)"""
+    days = max(0, min(request.args.get('days', 7, type=int), 90))
+    past = max(0, min(request.args.get('past', 30, type=int), 90))
     
-    return jsonify({
-        'calendar': calendar_list,
-        'count': len(calendar_list)
-    }), 200
+    if request.args.get('live', 'false').lower() == 'true':
+        calendar_list = get_sonarr_service().get_calendar(days=days)
+        return jsonify({
+            'calendar': calendar_list,
+            'count': len(calendar_list)
+        }), 200
+    
+    try:
+        window = get_calendar_cache().get(past, days)
+    except Exception as e:
+        logger.error(f"Error getting Sonarr calendar: {e}")
+        return jsonify({'error': 'Failed to fetch calendar from Sonarr'}), 502
+    
+    response = jsonify({
+        'calendar': window['items'],
+        'count': len(window['items']),
+        'start': window['start'],
+        'end': window['end']
+    })
+    response.set_etag(window['etag'])
+    return response.make_conditional(request)
 
 
 @bp.route('/queue', methods=['GET'])
@@ -110,47 +204,72 @@ def queue():
 @bp.route('/wanted', methods=['GET'])
 @handle_errors
 def wanted():
-    """Get wanted episodes"""
+    """Get missing episodes, most recently aired first: one page or every page as NDJSON (?stream=true)"""
     sonarr = get_sonarr_service()
-    wanted_list = sonarr.get_wanted()
-    
-    return jsonify({
-        'wanted': wanted_list,
-        'count': len(wanted_list)
-    }), 200
+    return arr_list_response('wanted', sonarr.get_wanted_page, sonarr.iter_wanted, default_size=100)
 
 
 @bp.route('/history', methods=['GET'])
 @handle_errors
 def history():
-    """Get recent history"""
+    """Get history, newest first: one page (?page=, ?page_size=) or every page as NDJSON (?stream=true)"""
     sonarr = get_sonarr_service()
-    limit = request.args.get('limit', 50, type=int)
-    history_list = sonarr.get_history(limit=limit)
-    
-    return jsonify({
-        'history': history_list,
-        'count': len(history_list)
-    }), 200
+    return arr_list_response('history', sonarr.get_history_page, sonarr.iter_history, default_size=50)
 
 
 @bp.route('/search/<int:series_id>', methods=['POST'])
 @handle_errors
 def search(series_id):
-    """Trigger search for a series"""
-    user_id = get_jwt_identity()
+    """Queue a search for a series ahead of bulk searches"""
+    queued = get_search_scheduler().enqueue('series', [series_id])
     
-    sonarr = get_sonarr_service()
-    result = sonarr.trigger_search([series_id])
+    log_audit(get_jwt_identity(), 'sonarr_search_queued', request.remote_addr, 'success',
+              target=f'series_{series_id}')
+    return jsonify({'message': 'Search queued', 'queued': queued}), 202
+
+
+@bp.route('/search', methods=['POST'])
+@handle_errors
+def bulk_search():
+    """Queue searches for {"episode_ids": [...]}, {"series_ids": [...]} or missing episodes
+    
+    {"missing": true} reads the wanted/missing episodes in the background
+    and queues them page by page, most recently aired first; episode ids are
+    batched into EpisodeSearch commands.
+    """
+    data = request.get_json(silent=True) or {}
+    scheduler = get_search_scheduler()
     
-    if result:
-        log_audit(user_id, 'sonarr_search_triggered', request.remote_addr, 'success', 
-                 target=f'series_{series_id}')
-        return jsonify({'message': 'Search triggered'}), 200
+    if data.get('missing'):
+        sonarr = get_sonarr_service()
+        pages = (
+            [(episode['id'], recency(episode.get('airDateUtc'))) for episode in page['records'] if episode.get('id')]
+            for page in sonarr.iter_wanted()
+        )
+        started = scheduler.enqueue_background('episode', pages, 'missing')
+        log_audit(get_jwt_identity(), 'sonarr_bulk_search_queued', request.remote_addr, 'success',
+                  target='missing episodes')
+        return jsonify({
+            'message': 'Queuing missing episodes' if started else 'Missing episodes are already being queued',
+            'loading': True
+        }), 202
+    elif isinstance(data.get('episode_ids'), list) and data['episode_ids']:
+        queued = scheduler.enqueue('episode', [int(i) for i in data['episode_ids']])
+    elif isinstance(data.get('series_ids'), list) and data['series_ids']:
+        queued = scheduler.enqueue('series', [int(i) for i in data['series_ids']])
     else:
-        log_audit(user_id, 'sonarr_search_failed', request.remote_addr, 'failure', 
-                 target=f'series_{series_id}')
-        return jsonify({'error': 'Failed to trigger search'}), 500
+        return jsonify({'error': 'Provide episode_ids, series_ids or missing'}), 400
+    
+    log_audit(get_jwt_identity(), 'sonarr_bulk_search_queued', request.remote_addr, 'success',
+              target=f'{queued} items')
+    return jsonify({'message': 'Searches queued', 'queued': queued}), 202
+
+
+@bp.route('/search/queue', methods=['GET'])
+@handle_errors
+def search_queue():
+    """Get queued searches, indexer budgets and search command progress"""
+    return jsonify(get_search_scheduler().get_status()), 200
 
 
 @bp.route('/config', methods=['GET'])
@@ -160,3 +279,24 @@ def config():
     sonarr = get_sonarr_service()
     config_data = sonarr.get_config()
     return jsonify(config_data), 200
+
+
+@bp.route('/library/sync', methods=['GET'])
+@handle_errors
+def library_sync_state():
+    """Get the library sync state"""
+    return jsonify(get_library_sync().get_state()), 200
+
+
+@bp.route('/library/sync', methods=['POST'])
+@handle_errors
+def run_library_sync():
+    """Sync the library now; {"full": true} forces a full import"""
+    data = request.get_json(silent=True) or {}
+    result = get_library_sync().sync(full=bool(data.get('full')))
+    
+    log_audit(get_jwt_identity(), 'sync_sonarr_library', request.remote_addr,
+              'failure' if 'error' in result else 'success', target='sonarr')
+    
+    return jsonify(result), 200 if 'error' not in result else 502
+
@@ -0,0 +1,58 @@
+"""
+Storage analysis routes
+Hardlink, duplicate and orphan detection across download and media paths
+"""
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from ..services.storage_service import StorageService
+from ..utils import handle_errors
+from .clients import get_torrent_locations
+import logging
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('storage', __name__, url_prefix='/api/storage')
+
+storage_service = None
+
+
+def get_storage_service():
+    """Get or create storage service instance"""
+    global storage_service
+    if storage_service is None:
+        storage_service = StorageService(
+            current_app.config.get('DOWNLOAD_PATHS', []),
+            current_app.config.get('MEDIA_PATHS', []),
+            index_ttl=current_app.config.get('STORAGE_INDEX_TTL', 600)
+        )
+    return storage_service
+
+
+@bp.before_request
+@jwt_required()
+def require_auth():
+    """Require authentication for all storage routes"""
+    pass
+
+
+@bp.route('/hardlinks', methods=['GET'])
+@handle_errors
+def hardlink_report():
+    """Get hardlink, duplicate and orphaned download report"""
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    storage = get_storage_service()
+    report = storage.get_report(refresh=refresh)
+    
+    return jsonify(report), 200
+
+
+@bp.route('/labels', methods=['GET'])
+@handle_errors
+def label_usage():
+    """Get per-label disk usage with hardlinked and cross-seeded data counted once"""
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    storage = get_storage_service()
+    report = storage.get_label_report(get_torrent_locations, refresh=refresh)
+    
+    return jsonify(report), 200
+
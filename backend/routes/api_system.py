@@ -4,15 +4,30 @@ Phase 1 & 4: System stats and WebSocket real-time updates
 """
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from ..services.system_service import SystemService
+from ..services.system_service import SystemService, SensorPoller
+from ..services.metrics_snapshot import SNAPSHOT_PROCESS_LIMIT
 from ..models import SystemMetric, ContainerMetric, db
-from ..utils import handle_errors
+from ..utils import handle_errors, get_shared_metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('system', __name__, url_prefix='/api/system')
 
+sensor_poller = None
+
+
+def get_sensor_poller():
+    """Get or create the background sensor poller"""
+    global sensor_poller
+    if sensor_poller is None:
+        sensor_poller = SensorPoller(
+            interval=current_app.config.get('SENSOR_POLL_INTERVAL', 30),
+            history_size=current_app.config.get('SENSOR_HISTORY_SIZE', 20)
+        )
+        sensor_poller.start()
+    return sensor_poller
+
 
 @bp.before_request
 @jwt_required()
@@ -25,7 +40,7 @@ def require_auth():
 @handle_errors
 def get_stats():
     """Get current system statistics"""
-    stats = SystemService.get_system_stats()
+    stats = get_shared_metrics('system') or SystemService.get_system_stats()
     
     # Store metric in database for historical tracking
     try:
@@ -51,7 +66,7 @@ def get_stats():
 @handle_errors
 def get_cpu():
     """Get detailed CPU information"""
-    cpu_stats = SystemService.get_cpu_stats()
+    cpu_stats = get_shared_metrics('cpu') or SystemService.get_cpu_stats()
     return jsonify(cpu_stats), 200
 
 
@@ -59,7 +74,7 @@ def get_cpu():
 @handle_errors
 def get_memory():
     """Get detailed memory information"""
-    memory_stats = SystemService.get_memory_stats()
+    memory_stats = get_shared_metrics('memory') or SystemService.get_memory_stats()
     return jsonify(memory_stats), 200
 
 
@@ -68,7 +83,7 @@ def get_memory():
 def get_disk():
     """Get disk statistics"""
     path = request.args.get('path', '/')
-    disk_stats = SystemService.get_disk_stats(path)
+    disk_stats = (get_shared_metrics('disk') if path == '/' else None) or SystemService.get_disk_stats(path)
     return jsonify(disk_stats), 200
 
 
@@ -76,7 +91,7 @@ def get_disk():
 @handle_errors
 def get_network():
     """Get network statistics"""
-    network_stats = SystemService.get_network_stats()
+    network_stats = get_shared_metrics('network') or SystemService.get_network_stats()
     return jsonify(network_stats), 200
 
 
@@ -85,15 +100,19 @@ def get_network():
 def get_processes():
     """Get top processes by memory"""
     limit = request.args.get('limit', 10, type=int)
-    processes = SystemService.get_process_list(limit)
+    processes = get_shared_metrics('processes')
+    if processes is None or limit > SNAPSHOT_PROCESS_LIMIT:
+        processes = SystemService.get_process_list(limit)
+    processes = processes[:limit]
     return jsonify({'processes': processes}), 200
 
 
 @bp.route('/sensors', methods=['GET'])
 @handle_errors
 def get_sensors():
-    """Get sensor information (temperature, fans)"""
-    sensors = SystemService.get_sensor_stats()
+    """Get cached sensor information (temperature, fans)"""
+    include_history = request.args.get('history', 'false').lower() == 'true'
+    sensors = get_sensor_poller().get_snapshot(include_history=include_history)
     return jsonify(sensors), 200
 
 
@@ -0,0 +1,254 @@
+"""
+Unified torrent routes
+One merged view across every configured torrent client
+"""
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.transfer_history import TransferSampler, top_earners
+from ..services.process_lock import ProcessLock
+from ..services.seeding_policy import SeedingPolicy, SeedingPolicyEngine, load_policies
+from ..services.torrent_upload import TorrentUploader, UploadItem
+from ..services.tracker_stats import TrackerStats
+from ..services.download_pipeline import DownloadPipeline
+from ..utils import handle_errors, log_audit_batch, parse_torrent_query
+from .clients import get_torrent_aggregator
+from .api_radarr import get_radarr_service
+from .api_sonarr import get_sonarr_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('torrents', __name__, url_prefix='/api/torrents')
+
+transfer_sampler = None
+policy_engine = None
+tracker_stats = None
+download_pipeline = None
+
+
+def get_transfer_sampler():
+    """Get or create the transfer history sampler and start it (called at app startup)"""
+    global transfer_sampler
+    if transfer_sampler is None:
+        transfer_sampler = TransferSampler(
+            get_torrent_aggregator(),
+            interval=current_app.config.get('TRANSFER_SAMPLE_INTERVAL', 300),
+            retention_days=current_app.config.get('TRANSFER_SAMPLE_RETENTION_DAYS', 2),
+            lock=ProcessLock('transfer-sampler', current_app.config.get('PROCESS_LOCK_DIR'))
+        )
+        transfer_sampler.start(current_app._get_current_object())
+    return transfer_sampler
+
+
+def get_policy_engine():
+    """Get or create the seeding policy engine with the configured policies"""
+    global policy_engine
+    if policy_engine is None:
+        policy_engine = SeedingPolicyEngine(
+            get_torrent_aggregator(),
+            load_policies(current_app.config.get('SEEDING_POLICIES_FILE'))
+        )
+    return policy_engine
+
+
+def get_tracker_stats():
+    """Get or create the per-tracker statistics view"""
+    global tracker_stats
+    if tracker_stats is None:
+        tracker_stats = TrackerStats(get_torrent_aggregator())
+    return tracker_stats
+
+
+def get_download_pipeline():
+    """Get or create the *arr queue / torrent client pipeline view"""
+    global download_pipeline
+    if download_pipeline is None:
+        download_pipeline = DownloadPipeline(
+            get_torrent_aggregator(),
+            {'radarr': get_radarr_service(), 'sonarr': get_sonarr_service()},
+            queue_ttl=current_app.config.get('PIPELINE_QUEUE_TTL', 5.0),
+            stall_after=current_app.config.get('PIPELINE_STALL_SECONDS', 600)
+        )
+    return download_pipeline
+
+
+@bp.before_request
+@jwt_required()
+def require_auth():
+    """Require authentication for all torrent routes"""
+    pass
+
+
+@bp.route('', methods=['GET'])
+@handle_errors
+def list_torrents():
+    """Get the merged torrent list from all clients
+    
+    Accepts the same sort/filter/paging args as the per-client lists.
+    """
+    query = parse_torrent_query()
+    merged = get_torrent_aggregator().get_merged()
+    torrents = merged['torrents']
+    
+    if query is None:
+        return jsonify({
+            'torrents': torrents,
+            'count': len(torrents),
+            'bandwidth': merged['bandwidth'],
+            'errors': merged['errors']
+        }), 200
+    
+    total, rows = merged['store'].query(**query)
+    
+    return jsonify({
+        'torrents': rows,
+        'count': len(rows),
+        'total': total,
+        'offset': query['offset'],
+        'bandwidth': merged['bandwidth'],
+        'errors': merged['errors']
+    }), 200
+
+
+@bp.route('/bandwidth', methods=['GET'])
+@handle_errors
+def bandwidth():
+    """Get combined bandwidth totals across all clients"""
+    merged = get_torrent_aggregator().get_merged()
+    
+    return jsonify({
+        **merged['bandwidth'],
+        'errors': merged['errors']
+    }), 200
+
+
+@bp.route('/trackers', methods=['GET'])
+@handle_errors
+def tracker_totals():
+    """Get upload, download, ratio and torrent counts per tracker domain
+    
+    Tracker URLs are fetched once per torrent; "pending" counts torrents
+    whose trackers could not be fetched yet.
+    """
+    return jsonify(get_tracker_stats().get_stats()), 200
+
+
+@bp.route('/pipeline', methods=['GET'])
+@handle_errors
+def pipeline():
+    """Get Radarr/Sonarr queue items joined by infohash with their torrent's speed, peers and stall state"""
+    return jsonify(get_download_pipeline().get_pipeline()), 200
+
+
+@bp.route('/history/top', methods=['GET'])
+@handle_errors
+def top_transfers():
+    """Get the torrents that uploaded or downloaded the most recently
+    
+    Query args: hours (default 24), limit (default 20),
+    metric (uploaded or downloaded, default uploaded).
+    """
+    hours = request.args.get('hours', 24, type=int)
+    limit = request.args.get('limit', 20, type=int)
+    metric = request.args.get('metric', 'uploaded')
+    
+    if hours is None or hours < 1 or limit is None or limit < 1:
+        return jsonify({'error': 'hours and limit must be positive integers'}), 400
+    if metric not in ('uploaded', 'downloaded'):
+        return jsonify({'error': 'metric must be uploaded or downloaded'}), 400
+    
+    torrents = top_earners(hours=hours, limit=min(limit, 500), order_by=metric)
+    
+    return jsonify({
+        'torrents': torrents,
+        'count': len(torrents),
+        'hours': hours,
+        'metric': metric
+    }), 200
+
+
+@bp.route('/policies', methods=['GET'])
+@handle_errors
+def list_policies():
+    """Get the configured seeding policies"""
+    engine = get_policy_engine()
+    
+    return jsonify({
+        'policies': [p.to_dict() for p in engine.policies],
+        'count': len(engine.policies)
+    }), 200
+
+
+@bp.route('/policies/run', methods=['POST'])
+@handle_errors
+def run_policies():
+    """Evaluate seeding policies and optionally apply them
+    
+    Body: {"dry_run": true, "policies": [...]}; dry_run defaults to true and
+    policies defaults to the configured set.
+    """
+    data = request.get_json() or {}
+    dry_run = data.get('dry_run', True) is not False
+    policies = None
+    if 'policies' in data:
+        if not isinstance(data['policies'], list):
+            raise ValueError('policies must be a list')
+        policies = [SeedingPolicy.from_dict(p) for p in data['policies']]
+    
+    plan = get_policy_engine().run(dry_run=dry_run, policies=policies)
+    
+    if not dry_run:
+        log_audit_batch(get_jwt_identity(), request.remote_addr, [
+            {'action': f"policy_{entry['action'].replace('-', '_')}_torrent",
+             'target': h,
+             'status': 'success' if ok else 'failure',
+             'details': {'policy': entry['policy'], 'client': entry['client']}}
+            for entry in plan['actions']
+            for h, ok in entry['results'].items()
+        ])
+    
+    return jsonify(plan), 200
+
+
+@bp.route('/upload', methods=['POST'])
+@handle_errors
+def upload_torrents():
+    """Add many .torrent files and magnet links to one client
+    
+    Multipart form: client (utorrent or rutorrent), any number of
+    "torrents" file parts and "magnets" fields (one or more links per
+    field, newline separated). Returns a status per item: added, exists,
+    duplicate, invalid or failed.
+    """
+    name = request.form.get('client', 'utorrent')
+    client = next((c for c in get_torrent_aggregator().clients if c.name == name), None)
+    if client is None:
+        return jsonify({'error': f'Unknown torrent client: {name}'}), 400
+    
+    items = [
+        UploadItem(f.filename or 'upload.torrent', 'file', f.read())
+        for f in request.files.getlist('torrents')
+    ]
+    for field in request.form.getlist('magnets'):
+        items.extend(UploadItem(link, 'magnet', link) for link in field.split() if link)
+    if not items:
+        return jsonify({'error': 'No torrents or magnets provided'}), 400
+    
+    uploader = TorrentUploader(
+        client.service, current_app.config.get('TORRENT_UPLOAD_WORKERS', 4)
+    )
+    results = [item.to_dict() for item in uploader.upload(items)]
+    added = [r for r in results if r['status'] == 'added']
+    
+    log_audit_batch(get_jwt_identity(), request.remote_addr, [
+        {'action': f'add_{name}_torrent', 'target': r['hash'],
+         'details': {'name': r['name'], 'type': r['type']}}
+        for r in added
+    ])
+    
+    return jsonify({
+        'client': name,
+        'requested': len(results),
+        'added': len(added),
+        'results': results
+    }), 200
@@ -2,13 +2,16 @@
 uTorrent routes
 """
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..services.utorrent_service import UTorrentService
-from ..utils import handle_errors, log_audit
+from ..utils import (handle_errors, log_audit, log_audit_batch, parse_torrent_query,
+                     resolve_bulk_hashes)
 import logging
 
 logger = logging.getLogger(__name__)
 
+BULK_ACTIONS = ('start', 'stop', 'pause', 'resume', 'remove')
+
 bp = Blueprint('utorrent', __name__, url_prefix='/api/utorrent')
 
 utorrent_service = None
@@ -21,7 +24,9 @@ def get_utorrent_service():
         utorrent_service = UTorrentService(
             current_app.config.get('UTORRENT_URL'),
             current_app.config.get('UTORRENT_USERNAME'),
-            current_app.config.get('UTORRENT_PASSWORD')
+            current_app.config.get('UTORRENT_PASSWORD'),
+            current_app.config.get('TORRENT_SNAPSHOT_TTL', 2.0),
+            current_app.config.get('TORRENT_DETAIL_TTL', 10.0)
         )
     return utorrent_service
 
@@ -59,13 +64,29 @@ def get_status():
 @bp.route('/torrents', methods=['GET'])
 @handle_errors
 def list_torrents():
-    """Get all torrents"""
-    utorrent = get_utorrent_service()
-    torrents = utorrent.get_torrents()
+    """Get torrents, optionally filtered, sorted and paged server-side
+    
+    Query args: sort (prefix '-' or order=desc for descending), state
+    (comma separated), label, name (substring), offset, limit and fields.
+    Without any of them the full list is returned unchanged.
+    """
+    query = parse_torrent_query()
+    snapshot = get_utorrent_service().get_snapshot()
+    
+    if query is None:
+        torrents = snapshot.to_dicts()
+        return jsonify({
+            'torrents': torrents,
+            'count': len(torrents)
+        }), 200
+    
+    total, rows = snapshot.store.query(**query)
     
     return jsonify({
-        'torrents': torrents,
-        'count': len(torrents)
+        'torrents': rows,
+        'count': len(rows),
+        'total': total,
+        'offset': query['offset']
     }), 200
 
 
@@ -89,6 +110,20 @@ def bandwidth_stats():
     return jsonify(bandwidth), 200
 
 
+@bp.route('/torrents/<hash_id>/<any(files, peers, trackers):kind>', methods=['GET'])
+@handle_errors
+def torrent_detail(hash_id, kind):
+    """Get a torrent's files, peers or trackers, fetched on demand and cached briefly"""
+    detail = get_utorrent_service().get_torrent_detail(hash_id, kind)
+    
+    if detail is None:
+        return jsonify({'error': 'Torrent not found'}), 404
+    if not detail:
+        return jsonify({'error': f'Failed to fetch torrent {kind} from uTorrent'}), 502
+    
+    return jsonify(detail), 200
+
+
 @bp.route('/torrents/<hash_id>/start', methods=['POST'])
 @handle_errors
 def start_torrent(hash_id):
@@ -165,6 +200,42 @@ def remove_torrent(hash_id):
     }), 200 if success else 400
 
 
+@bp.route('/torrents/bulk/<action>', methods=['POST'])
+@handle_errors
+def bulk_action(action):
+    """Apply an action to many torrents at once
+    
+    Body: {"hashes": [...]} or {"filter": {"state": ..., "label": ..., "name": ...}},
+    plus "delete_files" for remove.
+    """
+    if action not in BULK_ACTIONS:
+        return jsonify({'error': f'Unknown action: {action}'}), 400
+    
+    data = request.get_json() or {}
+    utorrent = get_utorrent_service()
+    hashes = resolve_bulk_hashes(data, lambda: utorrent.get_snapshot().store)
+    if action == 'remove' and data.get('delete_files'):
+        action = 'remove-all'
+    
+    results = utorrent.bulk_action(action, hashes)
+    succeeded = sum(1 for ok in results.values() if ok)
+    
+    audit_action = f"{action.replace('-', '_')}_utorrent_torrent"
+    log_audit_batch(get_jwt_identity(), request.remote_addr, [
+        {'action': audit_action, 'target': h, 'status': 'success' if ok else 'failure',
+         'details': {'bulk': True}}
+        for h, ok in results.items()
+    ])
+    
+    return jsonify({
+        'action': action,
+        'requested': len(hashes),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    }), 200
+
+
 @bp.route('/torrents/add-url', methods=['POST'])
 @handle_errors
 def add_torrent_url():
@@ -0,0 +1,33 @@
+"""
+Shared torrent client accessors
+The multi-client aggregator used by the torrent and storage routes, kept
+out of the blueprint modules so routes can share it without importing
+each other
+"""
+from flask import current_app
+from ..services.torrent_clients import TorrentAggregator, TorrentClient
+from .api_utorrent import get_utorrent_service
+from .api_rutorrent import get_rutorrent_service
+
+CLIENT_FACTORIES = {
+    'utorrent': lambda: TorrentClient('utorrent', get_utorrent_service()),
+    'rutorrent': lambda: TorrentClient('rutorrent', get_rutorrent_service()),
+}
+
+torrent_aggregator = None
+
+
+def get_torrent_aggregator():
+    """Get or create the multi-client aggregator"""
+    global torrent_aggregator
+    if torrent_aggregator is None:
+        names = current_app.config.get('TORRENT_CLIENTS', list(CLIENT_FACTORIES))
+        torrent_aggregator = TorrentAggregator([
+            CLIENT_FACTORIES[name]() for name in names if name in CLIENT_FACTORIES
+        ])
+    return torrent_aggregator
+
+
+def get_torrent_locations():
+    """Get (label, save path, size) for every torrent in every client, for the label report"""
+    return [(r.label, r.save_path, r.size) for r in get_torrent_aggregator().get_records()]
@@ -6,6 +6,7 @@ This module contains wrapper classes for all external services:
 - System monitoring
 - Media servers (Plex, Radarr, Sonarr, Overseerr, Tautulli)
 - Torrent clients (uTorrent, ruTorrent)
+- Storage analysis (hardlinks, duplicates, orphans)
 """
 
 from .docker_service import DockerService
@@ -17,6 +18,8 @@ from .plex_service import PlexService
 from .tautulli_service import TautulliService
 from .utorrent_service import UTorrentService
 from .rutorrent_service import RuTorrentService
+from .storage_service import StorageService
+from .torrent_clients import TorrentAggregator
 
 __all__ = [
     'DockerService',
@@ -28,4 +31,6 @@ __all__ = [
     'TautulliService',
     'UTorrentService',
     'RuTorrentService',
+    'StorageService',
+    'TorrentAggregator',
 ]
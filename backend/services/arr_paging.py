@@ -0,0 +1,58 @@
+"""
+Paged retrieval for Radarr/Sonarr list endpoints
+Fetches page resources (wanted/missing, history) one page or every page at a
+time, with a bounded number of pages in flight
+"""
+import math
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_page(session, url: str, params: Optional[Dict] = None, page: int = 1,
+               page_size: int = 100, timeout: int = 30) -> Dict:
+    """Fetch one page, returning records with page, pages and total (raises on error)"""
+    response = session.get(url, params={**(params or {}), 'page': page, 'pageSize': page_size},
+                           timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    total = data.get('totalRecords', 0)
+    return {
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'pages': max(1, math.ceil(total / page_size)),
+        'records': data.get('records', [])
+    }
+
+
+def iter_pages(session, url: str, params: Optional[Dict] = None, start_page: int = 1,
+               page_size: int = 250, max_workers: int = 4, timeout: int = 30) -> Iterator[Dict]:
+    """Yield every page from start_page on, in order (raises on error)
+    
+    The first page gives the page count; after that up to max_workers pages
+    are fetched ahead, so memory stays bounded however long the list is.
+    A caller that stops early can resume later from the last page it saw + 1.
+    """
+    first = fetch_page(session, url, params, start_page, page_size, timeout)
+    yield first
+    remaining = iter(range(start_page + 1, first['pages'] + 1))
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='arr-pages')
+    try:
+        window = deque()
+        for page in remaining:
+            window.append(executor.submit(fetch_page, session, url, params, page, page_size, timeout))
+            if len(window) >= max_workers:
+                break
+        while window:
+            result = window.popleft().result()
+            page = next(remaining, None)
+            if page is not None:
+                window.append(executor.submit(fetch_page, session, url, params, page, page_size, timeout))
+            yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
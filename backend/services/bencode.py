@@ -0,0 +1,181 @@
+"""
+Bencode decoding for .torrent files
+Walks the buffer by offset, so the info dictionary is hashed straight from
+the original bytes and piece hashes are skipped instead of copied
+"""
+import base64
+import hashlib
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class BencodeError(ValueError):
+    """Malformed bencoded data"""
+
+
+def _read_int(data: memoryview, pos: int, end_byte: int) -> Tuple[int, int]:
+    """Read ASCII digits up to end_byte, returning (value, position after end_byte)"""
+    end = pos
+    length = len(data)
+    while end < length and data[end] != end_byte:
+        end += 1
+    if end >= length or end == pos:
+        raise BencodeError(f"unterminated integer at offset {pos}")
+    try:
+        return int(bytes(data[pos:end])), end + 1
+    except ValueError:
+        raise BencodeError(f"invalid integer at offset {pos}")
+
+
+def skip(data: memoryview, pos: int) -> int:
+    """Return the offset just past the value at pos without building it"""
+    depth = 0
+    length = len(data)
+    while True:
+        if pos >= length:
+            raise BencodeError('unexpected end of data')
+        byte = data[pos]
+        if byte == 0x69:  # i
+            _, pos = _read_int(data, pos + 1, 0x65)
+        elif 0x30 <= byte <= 0x39:
+            size, pos = _read_int(data, pos, 0x3a)
+            pos += size
+            if pos > length:
+                raise BencodeError('string runs past end of data')
+        elif byte in (0x6c, 0x64):  # l, d
+            depth += 1
+            pos += 1
+        elif byte == 0x65 and depth:  # e
+            depth -= 1
+            pos += 1
+        else:
+            raise BencodeError(f"unexpected byte at offset {pos}")
+        if depth == 0:
+            return pos
+
+
+def decode_at(data: memoryview, pos: int, skip_keys: Set[bytes] = frozenset()):
+    """Decode the value at pos, returning (value, end offset)
+    
+    Dictionary values under skip_keys are stepped over and left out.
+    """
+    byte = data[pos] if pos < len(data) else None
+    if byte is None:
+        raise BencodeError('unexpected end of data')
+    if byte == 0x69:
+        return _read_int(data, pos + 1, 0x65)
+    if 0x30 <= byte <= 0x39:
+        size, start = _read_int(data, pos, 0x3a)
+        end = start + size
+        if end > len(data):
+            raise BencodeError('string runs past end of data')
+        return bytes(data[start:end]), end
+    if byte == 0x6c:
+        items, pos = [], pos + 1
+        while pos < len(data) and data[pos] != 0x65:
+            value, pos = decode_at(data, pos, skip_keys)
+            items.append(value)
+        if pos >= len(data):
+            raise BencodeError('unterminated list')
+        return items, pos + 1
+    if byte == 0x64:
+        result, pos = {}, pos + 1
+        while pos < len(data) and data[pos] != 0x65:
+            key, pos = decode_at(data, pos)
+            if not isinstance(key, bytes):
+                raise BencodeError('dictionary keys must be strings')
+            if key in skip_keys:
+                pos = skip(data, pos)
+                continue
+            result[key], pos = decode_at(data, pos, skip_keys)
+        if pos >= len(data):
+            raise BencodeError('unterminated dictionary')
+        return result, pos + 1
+    raise BencodeError(f"unexpected byte at offset {pos}")
+
+
+def decode(data: bytes):
+    """Decode a complete bencoded value"""
+    value, end = decode_at(memoryview(data), 0)
+    if end != len(data):
+        raise BencodeError('trailing data after value')
+    return value
+
+
+def _length(entry: Dict) -> int:
+    """Get a non-negative integer length from an info or file dictionary"""
+    length = entry.get(b'length', 0)
+    if type(length) is not int or length < 0:
+        raise BencodeError('length must be a non-negative integer')
+    return length
+
+
+def parse_torrent(data: bytes) -> Dict:
+    """Get the infohash, name and total size of a .torrent file
+    
+    Only the top-level keys are walked; the info dictionary is hashed from
+    its original byte span and decoded without its piece hashes.
+    """
+    view = memoryview(data)
+    if not view or view[0] != 0x64:
+        raise BencodeError('torrent file must be a dictionary')
+    
+    pos = 1
+    info_span = None
+    while pos < len(view) and view[pos] != 0x65:
+        key, pos = decode_at(view, pos)
+        start = pos
+        pos = skip(view, pos)
+        if key == b'info':
+            info_span = (start, pos)
+    if pos >= len(view):
+        raise BencodeError('unterminated dictionary')
+    if info_span is None:
+        raise BencodeError('torrent file has no info dictionary')
+    
+    info, _ = decode_at(view, info_span[0], skip_keys={b'pieces', b'piece layers'})
+    if not isinstance(info, dict):
+        raise BencodeError('info must be a dictionary')
+    name = info.get(b'name.utf-8') or info.get(b'name') or b''
+    if not isinstance(name, bytes):
+        raise BencodeError('name must be a string')
+    if b'files' in info:
+        files = info[b'files']
+        if not isinstance(files, list) or not all(isinstance(f, dict) for f in files):
+            raise BencodeError('files must be a list of dictionaries')
+        size = sum(_length(f) for f in files)
+    else:
+        size = _length(info)
+    
+    return {
+        'info_hash': hashlib.sha1(view[info_span[0]:info_span[1]]).hexdigest().upper(),
+        'name': name.decode('utf-8', 'replace'),
+        'size': size
+    }
+
+
+def parse_magnet(uri: str) -> Optional[Dict]:
+    """Get the infohash and display name of a magnet link, or None if it has no btih"""
+    parsed = urlparse(uri)
+    if parsed.scheme != 'magnet':
+        return None
+    params = parse_qs(parsed.query)
+    for xt in params.get('xt', []):
+        if not xt.lower().startswith('urn:btih:'):
+            continue
+        value = xt[9:]
+        try:
+            if len(value) == 40:
+                info_hash = bytes.fromhex(value).hex().upper()
+            elif len(value) == 32:
+                info_hash = base64.b32decode(value.upper()).hex().upper()
+            else:
+                continue
+        except ValueError:
+            continue
+        return {
+            'info_hash': info_hash,
+            'name': params.get('dn', [''])[0],
+            'size': None
+        }
+    return None
@@ -0,0 +1,123 @@
+"""
+Radarr/Sonarr calendar cache
+Keeps trimmed calendar windows in memory, refreshed in the background with
+conditional requests, so dashboard polling never reaches upstream
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def window_dates(past_days: int, days: int, today=None) -> Tuple[str, str]:
+    """Calendar start and end dates for a window around today (UTC)"""
+    today = today or datetime.utcnow().date()
+    return (today - timedelta(days=past_days)).isoformat(), (today + timedelta(days=days)).isoformat()
+
+
+class CalendarCache:
+    """Calendar windows keyed by (past days, days ahead)
+    
+    A window is fetched on first request and then refreshed every
+    refresh_interval by the background thread, sending the upstream ETag
+    (if any) so unchanged calendars cost a 304. Each window also carries
+    its own ETag for conditional requests from the panel. Windows nobody
+    has asked for within idle_expiry are dropped.
+    """
+    
+    def __init__(self, fetch: Callable[[str, str, Optional[str]], Tuple[Optional[List[Dict]], Optional[str]]],
+                 trim: Callable[[Dict], Dict], name: str, refresh_interval: float = 1800.0,
+                 max_windows: int = 8, idle_expiry: float = 86400.0):
+        self.fetch = fetch  # (start, end, etag) -> (items or None if unchanged, etag)
+        self.trim = trim
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self.max_windows = max_windows
+        self.idle_expiry = idle_expiry
+        self._windows = {}  # (past_days, days) -> window entry
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _refresh(self, key: Tuple[int, int], entry: Optional[Dict]) -> Dict:
+        """Fetch one window, reusing the cached items when upstream reports no change"""
+        start, end = window_dates(*key)
+        same_dates = entry is not None and entry['start'] == start and entry['end'] == end
+        items, upstream_etag = self.fetch(start, end, entry['upstream_etag'] if same_dates else None)
+        now = time.time()
+        
+        if items is None and same_dates:
+            entry['fetched_at'] = now
+            return entry
+        
+        items = [self.trim(item) for item in items or []]
+        body = json.dumps([start, end, items], sort_keys=True, default=str).encode()
+        return {
+            'start': start,
+            'end': end,
+            'items': items,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'upstream_etag': upstream_etag,
+            'fetched_at': now,
+            'accessed_at': entry['accessed_at'] if entry else now
+        }
+    
+    def get(self, past_days: int, days: int) -> Dict:
+        """Get a window from memory, fetching it the first time it is asked for (raises on error)"""
+        key = (past_days, days)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is not None:
+                entry['accessed_at'] = time.time()
+                return entry
+        
+        # Fetched outside the lock so a slow upstream never blocks other windows
+        entry = self._refresh(key, None)
+        with self._lock:
+            entry = self._windows.setdefault(key, entry)
+            entry['accessed_at'] = time.time()
+            while len(self._windows) > self.max_windows:
+                oldest = min(self._windows, key=lambda k: self._windows[k]['accessed_at'])
+                del self._windows[oldest]
+        return entry
+    
+    def refresh_all(self):
+        """Refresh every window still in use and drop idle ones"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, e in self._windows.items() if now - e['accessed_at'] > self.idle_expiry]:
+                del self._windows[key]
+            windows = list(self._windows.items())
+        for key, entry in windows:
+            try:
+                refreshed = self._refresh(key, entry)
+            except Exception as e:
+                # Keep serving the last good copy
+                logger.error(f"Error refreshing {self.name} calendar {key}: {e}")
+                continue
+            with self._lock:
+                current = self._windows.get(key)
+                if current is not None:
+                    # Keep reads that landed while the refresh was in flight
+                    refreshed['accessed_at'] = max(refreshed['accessed_at'], current['accessed_at'])
+                    self._windows[key] = refreshed
+    
+    def start(self):
+        """Refresh cached windows in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-calendar', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_all()
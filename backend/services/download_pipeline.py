@@ -0,0 +1,176 @@
+"""
+Download pipeline
+Joins the Radarr and Sonarr queues with the torrent clients' tables by
+infohash, so each queued release shows the client's real transfer state
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INACTIVE_STATES = {'paused', 'stopped', 'queued', 'checking', 'error'}
+
+
+def queue_media(app: str, item: Dict) -> Optional[str]:
+    """Human name of what a queue record is downloading"""
+    if app == 'radarr':
+        movie = item.get('movie') or {}
+        return movie.get('title')
+    series = (item.get('series') or {}).get('title')
+    episode = item.get('episode') or {}
+    if series and episode:
+        return f"{series} S{episode.get('seasonNumber', 0):02d}E{episode.get('episodeNumber', 0):02d}"
+    return series
+
+
+class DownloadPipeline:
+    """*arr queue records matched to torrent records in one pass each
+    
+    Torrent rows come from the clients' cached snapshots, so building the
+    view costs no extra client calls; the *arr queues are cached for
+    queue_ttl seconds. A torrent counts as stalled once its downloaded
+    bytes have not moved for stall_after seconds.
+    """
+    
+    def __init__(self, aggregator, arr_services: Dict, queue_ttl: float = 5.0, stall_after: float = 600.0):
+        self.aggregator = aggregator
+        self.arr_services = arr_services  # app name -> Radarr/Sonarr service
+        self.queue_ttl = queue_ttl
+        self.stall_after = stall_after
+        self._queues = {}  # app -> (fetched_at, records)
+        self._progress = {}  # hash -> (downloaded bytes, time they last changed)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(arr_services)), thread_name_prefix='arr-queue'
+        )
+    
+    def _fetch_queue(self, app: str, now: float) -> List[Dict]:
+        """Get an app's queue records, refetching after queue_ttl"""
+        cached = self._queues.get(app)
+        if cached is not None and now - cached[0] < self.queue_ttl:
+            return cached[1]
+        records = self.arr_services[app].fetch_queue()
+        self._queues[app] = (now, records)
+        return records
+    
+    def _idle_seconds(self, hash_id: str, downloaded: int, now: float) -> float:
+        """Seconds since this torrent's downloaded bytes last changed"""
+        last = self._progress.get(hash_id)
+        if last is None or last[0] != downloaded:
+            self._progress[hash_id] = (downloaded, now)
+            return 0.0
+        return now - last[1]
+    
+    def stall_state(self, torrent: Dict, idle: float) -> str:
+        """Classify a matched torrent as complete, active, idle, stalled, no_seeds or its inactive state"""
+        if torrent['progress'] >= 1:
+            return 'complete'
+        if torrent['state'] in INACTIVE_STATES:
+            return torrent['state']
+        if torrent['download_speed'] > 0:
+            return 'active'
+        if idle >= self.stall_after:
+            return 'stalled' if torrent['seeds'] else 'no_seeds'
+        return 'idle'
+    
+    def _torrent_index(self, polled: Dict) -> Dict[str, Dict]:
+        """Merge every client's records into one dict per infohash"""
+        index = {}
+        for records in polled['records'].values():
+            for r in records:
+                entry = index.get(r.hash)
+                if entry is None:
+                    index[r.hash] = {
+                        'clients': [r.client],
+                        'state': r.state,
+                        'progress': r.progress,
+                        'size': r.size,
+                        'downloaded': r.downloaded,
+                        'download_speed': r.download_speed,
+                        'upload_speed': r.upload_speed,
+                        'peers': r.peers,
+                        'seeds': r.seeds
+                    }
+                else:
+                    entry['clients'].append(r.client)
+                    entry['progress'] = max(entry['progress'], r.progress)
+                    entry['downloaded'] = max(entry['downloaded'], r.downloaded)
+                    entry['download_speed'] += r.download_speed
+                    entry['upload_speed'] += r.upload_speed
+                    entry['peers'] += r.peers
+                    entry['seeds'] += r.seeds
+        return index
+    
+    def get_pipeline(self) -> Dict:
+        """Get every *arr queue record with its matched torrent's speed, peers and stall state"""
+        started = time.perf_counter()
+        now = time.time()
+        errors = {}
+        
+        queue_futures = {app: self._executor.submit(self._fetch_queue, app, now) for app in self.arr_services}
+        polled = self.aggregator.poll()
+        errors.update(polled['errors'])
+        torrents = self._torrent_index(polled)
+        
+        items = []
+        matched = set()
+        with self._lock:
+            for app, future in queue_futures.items():
+                try:
+                    queue = future.result()
+                except Exception as e:
+                    logger.error(f"Error fetching {app} queue: {e}")
+                    errors[app] = str(e)
+                    continue
+                
+                for record in queue:
+                    hash_id = (record.get('downloadId') or '').upper()
+                    torrent = torrents.get(hash_id) if record.get('protocol') == 'torrent' else None
+                    item = {
+                        'app': app,
+                        'queue_id': record.get('id'),
+                        'media': queue_media(app, record),
+                        'release': record.get('title'),
+                        'hash': hash_id or None,
+                        'arr_status': record.get('status'),
+                        'tracked_state': record.get('trackedDownloadState'),
+                        'tracked_status': record.get('trackedDownloadStatus'),
+                        'download_client': record.get('downloadClient'),
+                        'error': record.get('errorMessage'),
+                        'size': record.get('size', 0),
+                        'sizeleft': record.get('sizeleft', 0),
+                        'torrent': None,
+                        'stall_state': 'not_in_client' if record.get('protocol') == 'torrent' else None
+                    }
+                    if torrent is not None:
+                        matched.add(hash_id)
+                        idle = self._idle_seconds(hash_id, torrent['downloaded'], now)
+                        remaining = torrent['size'] - torrent['downloaded']
+                        item['torrent'] = dict(torrent, idle_seconds=round(idle), eta_seconds=(
+                            int(remaining / torrent['download_speed']) if torrent['download_speed'] else None
+                        ))
+                        item['stall_state'] = self.stall_state(torrent, idle)
+                    items.append(item)
+            
+            # Forget progress for torrents that left every queue, unless a failed
+            # fetch is hiding them
+            if not errors:
+                for hash_id in list(self._progress):
+                    if hash_id not in matched:
+                        del self._progress[hash_id]
+        
+        counts = {}
+        for item in items:
+            if item['stall_state']:
+                counts[item['stall_state']] = counts.get(item['stall_state'], 0) + 1
+        return {
+            'items': items,
+            'count': len(items),
+            'matched': len(matched),
+            'states': counts,
+            'errors': errors,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
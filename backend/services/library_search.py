@@ -0,0 +1,202 @@
+"""
+Radarr/Sonarr title search
+Keeps titles, alternate titles and years of the synced libraries in a search
+table; SQLite mirrors it into an FTS5 index, other databases fall back to LIKE
+"""
+import re
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import case, delete, func, select, text
+from sqlalchemy.exc import OperationalError
+from ..models import db, MediaLibrary, MediaSearchEntry
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+FTS_TABLE = 'media_search_fts'
+
+# External-content FTS5 table over media_search, kept current by triggers so
+# bulk writes from the library sync need no extra work
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, alt_titles, year,
+        content='media_search', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS media_search_ai AFTER INSERT ON media_search BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, alt_titles, year)
+        VALUES (new.id, new.title, new.alt_titles, new.year);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS media_search_ad AFTER DELETE ON media_search BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, alt_titles, year)
+        VALUES ('delete', old.id, old.title, old.alt_titles, old.year);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS media_search_au AFTER UPDATE ON media_search BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, alt_titles, year)
+        VALUES ('delete', old.id, old.title, old.alt_titles, old.year);
+        INSERT INTO {FTS_TABLE}(rowid, title, alt_titles, year)
+        VALUES (new.id, new.title, new.alt_titles, new.year);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# Title matches weigh most, then alternate titles, then the year
+FTS_QUERY = f"""
+    SELECT s.app_type, s.remote_id, s.title, s.year, m.status, m.file_size,
+           bm25({FTS_TABLE}, 10.0, 4.0, 1.0) AS rank
+    FROM {FTS_TABLE}
+    JOIN media_search s ON s.id = {FTS_TABLE}.rowid
+    LEFT JOIN media_libraries m ON m.app_type = s.app_type AND m.remote_id = s.remote_id
+    WHERE {FTS_TABLE} MATCH :query AND (:app_type IS NULL OR s.app_type = :app_type)
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+
+def search_tokens(query: str) -> List[str]:
+    """Split a search string into lowercase word tokens"""
+    return re.findall(r'\w+', query.lower())
+
+
+def search_entry(app_type: str, item: Dict) -> Dict:
+    """Build the search row for an upstream Radarr movie or Sonarr series"""
+    title = item.get('title') or ''
+    alternates = dict.fromkeys(
+        t['title'] for t in item.get('alternateTitles') or []
+        if t.get('title') and t['title'] != title
+    )
+    alt_titles = ' '.join(alternates)
+    year = item.get('year') or None
+    return {
+        'app_type': app_type,
+        'remote_id': item['id'],
+        'title': title,
+        'alt_titles': alt_titles,
+        'year': year,
+        'search_text': ' '.join(filter(None, [title, alt_titles, str(year or '')])).lower()
+    }
+
+
+class LibrarySearchIndex:
+    """Title search over the synced Radarr/Sonarr libraries"""
+    
+    def __init__(self):
+        self._fts = None  # unknown until the schema is checked
+        self._lock = threading.Lock()
+    
+    @property
+    def engine(self) -> str:
+        return 'fts5' if self.ensure_schema() else 'like'
+    
+    def ensure_schema(self) -> bool:
+        """Create the FTS5 table and triggers on SQLite, returning whether FTS5 is in use
+        
+        Runs on the caller's session and commits, so it must be called
+        before the session has pending writes; the library sync calls it at
+        the start of every sync. Only a SQLite build without FTS5 falls back
+        to LIKE for good; other errors (a locked database) are retried on
+        the next call.
+        """
+        if self._fts is not None:
+            return self._fts
+        with self._lock:
+            if self._fts is not None:
+                return self._fts
+            if db.engine.dialect.name != 'sqlite':
+                self._fts = False
+                return False
+            try:
+                exists = db.session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+                if not exists:
+                    for statement in FTS_SCHEMA:
+                        db.session.execute(text(statement))
+                db.session.commit()
+                self._fts = True
+            except OperationalError as e:
+                db.session.rollback()
+                if 'no such module' not in str(e):
+                    logger.warning(f"Could not create the library search index, retrying later: {e}")
+                    return False
+                logger.warning(f"SQLite FTS5 unavailable, library search falls back to LIKE: {e}")
+                self._fts = False
+            return self._fts
+    
+    def count(self, app_type: str) -> int:
+        """Number of indexed titles for one library"""
+        return db.session.query(func.count(MediaSearchEntry.id)) \
+            .filter(MediaSearchEntry.app_type == app_type).scalar()
+    
+    def replace(self, app_type: str, entries: Iterable[Dict], remote_ids: Optional[Iterable[int]] = None):
+        """Replace a library's search rows, or only those for remote_ids
+        
+        Runs in the caller's session; the library sync commits it together
+        with the MediaLibrary rows. The FTS5 triggers mirror the changes once
+        ensure_schema has created them.
+        """
+        if remote_ids is None:
+            db.session.execute(delete(MediaSearchEntry).where(MediaSearchEntry.app_type == app_type))
+        else:
+            remote_ids = list(remote_ids)
+            for start in range(0, len(remote_ids), CHUNK_SIZE):
+                db.session.execute(delete(MediaSearchEntry).where(
+                    MediaSearchEntry.app_type == app_type,
+                    MediaSearchEntry.remote_id.in_(remote_ids[start:start + CHUNK_SIZE])
+                ))
+        db.session.bulk_insert_mappings(MediaSearchEntry, list(entries))
+    
+    def _search_fts(self, tokens: List[str], app_type: Optional[str], limit: int) -> List[Dict]:
+        """Ranked prefix match against the FTS5 index"""
+        # Every token must match as a word prefix in some column
+        query = ' '.join(f'"{token}"*' for token in tokens)
+        rows = db.session.execute(text(FTS_QUERY), {'query': query, 'app_type': app_type, 'limit': limit})
+        return [dict(row._mapping) for row in rows]
+    
+    def _search_like(self, tokens: List[str], app_type: Optional[str], limit: int) -> List[Dict]:
+        """Substring match with titles starting with the first token ranked first"""
+        title = func.lower(MediaSearchEntry.title)
+        stmt = select(
+            MediaSearchEntry.app_type, MediaSearchEntry.remote_id, MediaSearchEntry.title,
+            MediaSearchEntry.year, MediaLibrary.status, MediaLibrary.file_size
+        ).outerjoin(MediaLibrary, (MediaLibrary.app_type == MediaSearchEntry.app_type) &
+                    (MediaLibrary.remote_id == MediaSearchEntry.remote_id))
+        for token in tokens:
+            pattern = token.replace('_', '\\_')
+            stmt = stmt.where(MediaSearchEntry.search_text.like(f'%{pattern}%', escape='\\'))
+        if app_type:
+            stmt = stmt.where(MediaSearchEntry.app_type == app_type)
+        first = tokens[0].replace('_', '\\_')
+        stmt = stmt.order_by(
+            case((title.like(f'{first}%', escape='\\'), 0),
+                 (title.like(f'%{first}%', escape='\\'), 1), else_=2),
+            func.length(MediaSearchEntry.title),
+            MediaSearchEntry.title
+        ).limit(limit)
+        return [dict(row._mapping) for row in db.session.execute(stmt)]
+    
+    def search(self, query: str, app_type: Optional[str] = None, limit: int = 20) -> Dict:
+        """Search titles, alternate titles and years by word prefix"""
+        started = time.perf_counter()
+        tokens = search_tokens(query)
+        results = []
+        if tokens:
+            if self.ensure_schema():
+                results = self._search_fts(tokens, app_type, limit)
+            else:
+                results = self._search_like(tokens, app_type, limit)
+        
+        for result in results:
+            result['id'] = result.pop('remote_id')
+            result.pop('rank', None)
+        return {
+            'query': query,
+            'results': results,
+            'count': len(results),
+            'engine': self.engine,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
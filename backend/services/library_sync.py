@@ -0,0 +1,403 @@
+"""
+Radarr/Sonarr library sync
+Imports the full library into MediaLibrary once, then keeps it current
+from the upstream history feed so library views read a local table
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from ..models import db, MediaLibrary, LibrarySyncState
+from .library_search import search_entry
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = 500
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an *arr ISO timestamp into a naive UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def utc_cursor() -> str:
+    """Current time as an ISO history cursor"""
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class LibrarySync(ABC):
+    """Full import plus history-driven incremental refresh of one *arr library
+    
+    With a ProcessLock only the holder runs the background refresh; other
+    workers read the table and take over if the holder exits.
+    """
+    
+    app_type = None
+    history_key = None  # history record field holding the item id
+    
+    def __init__(self, service, interval: int = 300, full_sync_interval: int = 86400,
+                 max_incremental: int = 100, search_index=None, lock=None):
+        self.service = service
+        self.lock = lock
+        self.search_index = search_index
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+        self.max_incremental = max_incremental
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Running stats totals, adjusted by each sync's deltas, and the history
+        # cursor they reflect
+        self._totals = None
+        self._totals_updated = None
+        self._totals_cursor = None
+        self._synced = False
+    
+    @abstractmethod
+    def fetch_all(self) -> List[Dict]:
+        """Fetch every item from upstream"""
+    
+    @abstractmethod
+    def fetch_one(self, remote_id: int) -> Optional[Dict]:
+        """Fetch one item, or None if it was deleted upstream"""
+    
+    @abstractmethod
+    def format(self, item: Dict) -> Dict:
+        """Reduce an upstream item to the stored panel fields"""
+    
+    @abstractmethod
+    def item_status(self, item: Dict) -> str:
+        """Derive unmonitored, wanted or downloaded for an upstream item"""
+    
+    @abstractmethod
+    def item_counts(self, formatted: Dict) -> Dict[str, int]:
+        """One stored item's contribution to the stats totals"""
+    
+    @abstractmethod
+    def format_stats(self, totals: Counter) -> Dict:
+        """Shape the stats totals like the service's live stats"""
+    
+    def normalize(self, item: Dict, now: datetime) -> Dict:
+        """Map an upstream item onto MediaLibrary columns"""
+        formatted = self.format(item)
+        return {
+            'app_type': self.app_type,
+            'remote_id': item['id'],
+            'title': item.get('title') or '',
+            'year': item.get('year') or None,
+            'status': self.item_status(item),
+            'file_size': formatted.get('sizeOnDisk') or 0,
+            'date_added': parse_datetime(item.get('added')),
+            'last_sync': now,
+            'extra': formatted
+        }
+    
+    def _state(self) -> LibrarySyncState:
+        state = LibrarySyncState.query.filter_by(app_type=self.app_type).first()
+        if state is None:
+            state = LibrarySyncState(app_type=self.app_type, items=0)
+            db.session.add(state)
+        return state
+    
+    def _existing_ids(self, remote_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        """Map remote id -> row id, for the given remote ids or the whole app"""
+        query = db.session.query(MediaLibrary.remote_id, MediaLibrary.id) \
+            .filter(MediaLibrary.app_type == self.app_type)
+        if remote_ids is not None:
+            query = query.filter(MediaLibrary.remote_id.in_(remote_ids))
+        return dict(query.all())
+    
+    def _upsert(self, rows: Iterable[Dict], existing: Dict[int, int]) -> int:
+        """Insert new rows and update existing ones with two bulk statements"""
+        inserts, updates = [], []
+        for row in rows:
+            row_id = existing.get(row['remote_id'])
+            if row_id is None:
+                inserts.append(row)
+            else:
+                updates.append({**row, 'id': row_id})
+        if inserts:
+            db.session.bulk_insert_mappings(MediaLibrary, inserts)
+        if updates:
+            db.session.bulk_update_mappings(MediaLibrary, updates)
+        return len(inserts) + len(updates)
+    
+    def _delete(self, remote_ids: Iterable[int]) -> int:
+        """Delete rows by remote id in bounded IN batches"""
+        remote_ids = list(remote_ids)
+        deleted = 0
+        for start in range(0, len(remote_ids), DELETE_CHUNK_SIZE):
+            deleted += MediaLibrary.query.filter(
+                MediaLibrary.app_type == self.app_type,
+                MediaLibrary.remote_id.in_(remote_ids[start:start + DELETE_CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+        return deleted
+    
+    def _stored_extras(self, remote_ids: List[int]):
+        """Yield (remote id, stored panel fields) for the given ids"""
+        for start in range(0, len(remote_ids), DELETE_CHUNK_SIZE):
+            yield from db.session.query(MediaLibrary.remote_id, MediaLibrary.extra).filter(
+                MediaLibrary.app_type == self.app_type,
+                MediaLibrary.remote_id.in_(remote_ids[start:start + DELETE_CHUNK_SIZE])
+            )
+    
+    def _load_totals(self, cursor: Optional[str]):
+        """Rebuild the stats totals from the stored library as of cursor"""
+        totals = Counter()
+        query = db.session.query(MediaLibrary.extra) \
+            .filter(MediaLibrary.app_type == self.app_type).yield_per(1000)
+        for (extra,) in query:
+            totals.update(self.item_counts(extra or {}))
+        self._totals, self._totals_updated = totals, datetime.utcnow()
+        self._totals_cursor = cursor
+    
+    def get_stats(self) -> Optional[Dict]:
+        """Get library stats from the running totals, or None before the initial import
+        
+        Syncs in this process adjust the totals by their own changes. The
+        history cursor is shared through the database, so when it differs
+        from the one the totals reflect, another process has synced and the
+        totals are rebuilt from the table.
+        """
+        state = LibrarySyncState.query.filter_by(app_type=self.app_type).first()
+        if state is None or state.last_full_sync is None:
+            return None
+        if self._totals is None or self._totals_cursor != state.history_cursor:
+            with self._lock:
+                if self._totals is None or self._totals_cursor != state.history_cursor:
+                    self._load_totals(state.history_cursor)
+        stats = self.format_stats(self._totals)
+        stats['updated_at'] = self._totals_updated.isoformat()
+        return stats
+    
+    def full_sync(self) -> Dict:
+        """Import the whole library and drop rows that no longer exist upstream"""
+        # Take the cursor first so changes made during the fetch are replayed later
+        cursor = utc_cursor()
+        now = datetime.utcnow()
+        items = self.fetch_all()
+        existing = self._existing_ids()
+        written = self._upsert((self.normalize(item, now) for item in items), existing)
+        removed = self._delete(set(existing) - {item['id'] for item in items})
+        if self.search_index is not None:
+            self.search_index.replace(self.app_type, (search_entry(self.app_type, item) for item in items))
+        
+        state = self._state()
+        state.last_full_sync = state.last_sync = now
+        state.history_cursor = cursor
+        state.items = len(items)
+        db.session.commit()
+        
+        totals = Counter()
+        for item in items:
+            totals.update(self.item_counts(self.format(item)))
+        self._totals, self._totals_updated, self._totals_cursor = totals, now, cursor
+        return {'mode': 'full', 'written': written, 'removed': removed, 'items': len(items)}
+    
+    def incremental_sync(self, state: LibrarySyncState) -> Dict:
+        """Refetch only the items that appear in history since the cursor"""
+        records = self.service.fetch_history_since(state.history_cursor)
+        changed = {r[self.history_key] for r in records if r.get(self.history_key)}
+        if len(changed) > self.max_incremental:
+            return self.full_sync()
+        
+        now = datetime.utcnow()
+        rows, entries, removed = [], [], []
+        for remote_id in changed:
+            item = self.fetch_one(remote_id)
+            if item is None:
+                removed.append(remote_id)
+            else:
+                rows.append(self.normalize(item, now))
+                entries.append(search_entry(self.app_type, item))
+        
+        # Stats delta: drop the stored rows' contribution, add the new rows'.
+        # Totals behind the stored cursor are rebuilt after the commit instead
+        current = self._totals is not None and self._totals_cursor == state.history_cursor
+        delta = Counter()
+        if current:
+            for remote_id, extra in self._stored_extras(list(changed)):
+                delta.subtract(self.item_counts(extra or {}))
+            for row in rows:
+                delta.update(self.item_counts(row['extra']))
+        
+        written = 0
+        if rows:
+            written = self._upsert(rows, self._existing_ids([row['remote_id'] for row in rows]))
+        deleted = self._delete(removed)
+        if self.search_index is not None:
+            self.search_index.replace(self.app_type, entries, remote_ids=changed)
+        dates = [r['date'] for r in records if r.get('date')]
+        if dates:
+            state.history_cursor = max(dates)
+        state.last_sync = now
+        state.items = MediaLibrary.query.filter_by(app_type=self.app_type).count()
+        db.session.commit()
+        
+        if current:
+            self._totals.update(delta)
+            self._totals_updated, self._totals_cursor = now, state.history_cursor
+        else:
+            self._load_totals(state.history_cursor)
+        return {'mode': 'incremental', 'history_records': len(records),
+                'written': written, 'removed': deleted}
+    
+    def sync(self, full: bool = False) -> Dict:
+        """Run a full import when needed, otherwise an incremental refresh"""
+        with self._lock:
+            try:
+                # DDL commits, so it has to run before this sync writes anything
+                if self.search_index is not None:
+                    self.search_index.ensure_schema()
+                state = LibrarySyncState.query.filter_by(app_type=self.app_type).first()
+                due = (
+                    state is None or state.history_cursor is None or state.last_full_sync is None or
+                    (datetime.utcnow() - state.last_full_sync).total_seconds() > self.full_sync_interval or
+                    # Library synced before the search index existed
+                    (self.search_index is not None and state.items and not self.search_index.count(self.app_type))
+                )
+                if full or due:
+                    return self.full_sync()
+                return self.incremental_sync(state)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error syncing {self.app_type} library: {e}")
+                return {'error': str(e)}
+    
+    def is_synced(self) -> bool:
+        """Whether the initial import has finished, so the table can be served"""
+        if not self._synced:
+            state = LibrarySyncState.query.filter_by(app_type=self.app_type).first()
+            self._synced = state is not None and state.last_full_sync is not None
+        return self._synced
+    
+    def get_state(self) -> Dict:
+        """Get sync progress for this library"""
+        state = LibrarySyncState.query.filter_by(app_type=self.app_type).first()
+        return state.to_dict() if state else {'app_type': self.app_type, 'items': 0}
+    
+    def start(self, app):
+        """Refresh the library in a background thread bound to the app context"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(app,), name=f'{self.app_type}-library-sync', daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresh"""
+        self._stop.set()
+    
+    def _run(self, app):
+        # The worker that wins the lock imports a never-synced library right
+        # away rather than after the first interval; until then the routes
+        # serve upstream
+        if self.lock is None or self.lock.acquire():
+            with app.app_context():
+                if not self.is_synced():
+                    self.sync(full=True)
+        while not self._stop.wait(self.interval):
+            if self.lock is not None and not self.lock.acquire():
+                continue
+            with app.app_context():
+                self.sync()
+
+
+class RadarrLibrarySync(LibrarySync):
+    """Radarr movies -> MediaLibrary"""
+    
+    app_type = 'radarr'
+    history_key = 'movieId'
+    
+    def fetch_all(self) -> List[Dict]:
+        return self.service.fetch_movies()
+    
+    def fetch_one(self, remote_id: int) -> Optional[Dict]:
+        return self.service.fetch_movie(remote_id)
+    
+    def format(self, item: Dict) -> Dict:
+        return self.service.format_movie(item)
+    
+    def item_status(self, item: Dict) -> str:
+        if not item.get('monitored'):
+            return 'unmonitored'
+        return 'downloaded' if item.get('hasFile') else 'wanted'
+    
+    def item_counts(self, formatted: Dict) -> Dict[str, int]:
+        monitored = bool(formatted.get('monitored'))
+        has_file = bool(formatted.get('hasFile'))
+        return {
+            'total_movies': 1,
+            'monitored': monitored,
+            'unmonitored': not monitored,
+            'with_files': has_file,
+            'missing': monitored and not has_file,
+            'total_size': formatted.get('sizeOnDisk') or 0
+        }
+    
+    def format_stats(self, totals: Counter) -> Dict:
+        return {
+            'total_movies': totals['total_movies'],
+            'monitored': totals['monitored'],
+            'unmonitored': totals['unmonitored'],
+            'with_files': totals['with_files'],
+            'missing': totals['missing'],
+            'total_size_gb': round(totals['total_size'] / (1024**3), 2)
+        }
+
+
+class SonarrLibrarySync(LibrarySync):
+    """Sonarr series -> MediaLibrary"""
+    
+    app_type = 'sonarr'
+    history_key = 'seriesId'
+    
+    def fetch_all(self) -> List[Dict]:
+        return self.service.fetch_series()
+    
+    def fetch_one(self, remote_id: int) -> Optional[Dict]:
+        return self.service.fetch_series_item(remote_id)
+    
+    def format(self, item: Dict) -> Dict:
+        return self.service.format_series(item)
+    
+    def item_status(self, item: Dict) -> str:
+        if not item.get('monitored'):
+            return 'unmonitored'
+        stats = item.get('statistics', {})
+        complete = stats.get('episodeFileCount', 0) >= stats.get('episodeCount', 0)
+        return 'downloaded' if complete else 'wanted'
+    
+    def item_counts(self, formatted: Dict) -> Dict[str, int]:
+        monitored = bool(formatted.get('monitored'))
+        return {
+            'total_series': 1,
+            'monitored': monitored,
+            'unmonitored': not monitored,
+            'total_episodes': formatted.get('episodeProgress') or 0,
+            'total_size': formatted.get('sizeOnDisk') or 0,
+            'active': formatted.get('status') == 'continuing'
+        }
+    
+    def format_stats(self, totals: Counter) -> Dict:
+        return {
+            'total_series': totals['total_series'],
+            'monitored': totals['monitored'],
+            'unmonitored': totals['unmonitored'],
+            'total_episodes': totals['total_episodes'],
+            'total_size_gb': round(totals['total_size'] / (1024**3), 2),
+            'active': totals['active']
+        }
+
@@ -0,0 +1,263 @@
+"""
+Shared-memory metrics snapshot
+A single collector process publishes system and container metrics into a
+multiprocessing.shared_memory segment that every request worker reads
+"""
+import json
+import time
+import struct
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, Optional
+from .process_lock import ProcessLock
+
+logger = logging.getLogger(__name__)
+
+# version (seqlock counter), published timestamp, payload length
+HEADER = struct.Struct('<QdI')
+VERSION = struct.Struct('<Q')
+META = struct.Struct('<dI')  # the header after the version
+
+# Top processes kept in the snapshot; larger requests read psutil directly
+SNAPSHOT_PROCESS_LIMIT = 50
+
+
+class SharedMetricsSnapshot:
+    """Seqlock-protected JSON snapshot stored in shared memory
+    
+    The writer makes the version odd before touching the payload and even
+    again once it is complete. Readers retry while the version is odd or
+    changed underneath them, so they never see a torn snapshot and never
+    take a lock.
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self._cached_version = None
+        self._cached_data = None
+    
+    @classmethod
+    def create(cls, name: str, size: int) -> 'SharedMetricsSnapshot':
+        """Create the segment; raises FileExistsError if it already exists"""
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, 0, 0.0, 0)
+        return cls(shm, owner=True)
+    
+    @classmethod
+    def attach(cls, name: str) -> Optional['SharedMetricsSnapshot']:
+        """Map an existing segment for reading, or None if it does not exist"""
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        # Readers must not unlink the segment when they exit
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return cls(shm)
+    
+    def publish(self, data: Dict) -> bool:
+        """Write a new snapshot (single writer only)"""
+        payload = json.dumps(data, default=str).encode()
+        if HEADER.size + len(payload) > self.shm.size:
+            logger.warning(f"Metrics snapshot too large ({len(payload)} bytes), skipping")
+            return False
+        
+        buf = self.shm.buf
+        version = VERSION.unpack_from(buf, 0)[0]
+        VERSION.pack_into(buf, 0, version + 1)
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        META.pack_into(buf, VERSION.size, time.time(), len(payload))
+        # Only an even version publishes, so it must be the last write
+        VERSION.pack_into(buf, 0, version + 2)
+        return True
+    
+    def read(self, retries: int = 100) -> Optional[Dict]:
+        """Read the latest consistent snapshot, or None if nothing is published"""
+        buf = self.shm.buf
+        for _ in range(retries):
+            version = VERSION.unpack_from(buf, 0)[0]
+            if version == 0:
+                return None
+            if version & 1:
+                time.sleep(0)
+                continue
+            if version == self._cached_version:
+                return self._cached_data
+            
+            _, published, length = HEADER.unpack_from(buf, 0)
+            payload = bytes(buf[HEADER.size:HEADER.size + length])
+            if VERSION.unpack_from(buf, 0)[0] != version:
+                continue
+            
+            data = json.loads(payload)
+            data['published_at'] = published
+            self._cached_version = version
+            self._cached_data = data
+            return data
+        logger.warning("Gave up reading metrics snapshot after repeated writer races")
+        return None
+    
+    def read_section(self, section: str, max_age: float = 30):
+        """Get one section of the snapshot if it is fresher than max_age seconds"""
+        data = self.read()
+        if not data or time.time() - data.get('published_at', 0) > max_age:
+            return None
+        return data.get(section)
+    
+    def close(self):
+        """Unmap the segment, unlinking it if this side created it"""
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedMetricsReader:
+    """Lazily attached, read-only view shared by a worker's request threads
+    
+    Attaching, reading and closing are serialized by a lock, since closing
+    the mapping while another thread reads it would fail. Reads are cheap
+    (the parsed snapshot is cached per version), so the lock is short.
+    """
+    
+    def __init__(self, name: str, max_age: float = 30):
+        self.name = name
+        self.max_age = max_age
+        self.snapshot = None
+        self._lock = threading.Lock()
+    
+    def _detach(self):
+        """Drop the mapping so the next call re-attaches"""
+        try:
+            self.snapshot.close()
+        except Exception as e:
+            logger.debug(f"Error closing metrics snapshot: {e}")
+        self.snapshot = None
+    
+    def get(self, section: str):
+        """Get a fresh snapshot section, or None so callers fall back to a direct read"""
+        with self._lock:
+            if self.snapshot is None:
+                self.snapshot = SharedMetricsSnapshot.attach(self.name)
+                if self.snapshot is None:
+                    return None
+            try:
+                data = self.snapshot.read()
+            except Exception as e:
+                logger.warning(f"Could not read metrics snapshot: {e}")
+                self._detach()
+                return None
+            if not data or time.time() - data.get('published_at', 0) > self.max_age:
+                # Stale: the collector may have been restarted with a new
+                # segment, so re-attach on the next call
+                self._detach()
+                return None
+            # A section missing from a fresh snapshot is simply absent
+            return data.get(section)
+
+
+def collect_metrics(docker_service=None) -> Dict:
+    """Collect one snapshot of system and container metrics"""
+    from .system_service import SystemService
+    
+    data = {
+        'system': SystemService.get_system_stats(),
+        'cpu': SystemService.get_cpu_stats(),
+        'memory': SystemService.get_memory_stats(),
+        'disk': SystemService.get_disk_stats('/'),
+        'network': SystemService.get_network_stats(),
+        'processes': SystemService.get_process_list(limit=SNAPSHOT_PROCESS_LIMIT)
+    }
+    if docker_service is not None:
+        data['containers'] = docker_service.get_containers(all=True)
+    return data
+
+
+def collector_lock(name: str) -> ProcessLock:
+    """Lock whose holder is the live collector"""
+    return ProcessLock(f"{name}.collector")
+
+
+def run_collector(name: str, size: int, interval: float = 5, docker_host: str = None):
+    """Collector process main loop: publish a fresh snapshot every interval"""
+    from .docker_service import DockerService
+    
+    # Held until this process exits; a second collector that lost the race stops here
+    if not collector_lock(name).acquire():
+        return
+    
+    try:
+        snapshot = SharedMetricsSnapshot.create(name, size)
+    except FileExistsError:
+        # Left over from a previous run: reuse it as the writer
+        snapshot = SharedMetricsSnapshot(shared_memory.SharedMemory(name=name), owner=True)
+    
+    docker_service = DockerService(docker_host)
+    if docker_service.client is None:
+        docker_service = None
+    
+    logger.info(f"Metrics collector publishing to shared memory '{name}' every {interval}s")
+    try:
+        while True:
+            started = time.time()
+            try:
+                snapshot.publish(collect_metrics(docker_service=docker_service))
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+            time.sleep(max(0, interval - (time.time() - started)))
+    finally:
+        snapshot.close()
+
+
+def start_collector(name: str, size: int, interval: float = 5,
+                    docker_host: str = None) -> Optional[multiprocessing.Process]:
+    """Start the collector unless a live one already holds the collector lock
+    
+    The probe lock is released before spawning and the collector takes it
+    for its lifetime, so if two workers probe at once the second collector
+    exits immediately and only one publishes.
+    """
+    probe = collector_lock(name)
+    if not probe.acquire():
+        return None
+    probe.release()
+    
+    process = multiprocessing.Process(
+        target=run_collector,
+        args=(name, size, interval, docker_host),
+        name='metrics-collector',
+        daemon=True
+    )
+    process.start()
+    return process
+
+
+def supervise_collector(name: str, size: int, interval: float = 5,
+                        docker_host: str = None, check_every: float = None) -> threading.Thread:
+    """Start the collector now and re-elect one whenever it dies
+    
+    The collector is a child of the worker that started it, so it goes
+    away when that worker is recycled; every worker keeps probing the lock
+    and the first to find it free starts a replacement.
+    """
+    check_every = check_every or max(10.0, interval * 2)
+    start_collector(name, size, interval, docker_host)
+    
+    def watch():
+        while True:
+            time.sleep(check_every)
+            try:
+                start_collector(name, size, interval, docker_host)
+            except Exception as e:
+                logger.error(f"Error checking metrics collector: {e}")
+    
+    thread = threading.Thread(target=watch, name='metrics-collector-watch', daemon=True)
+    thread.start()
+    return thread
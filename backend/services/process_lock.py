@@ -0,0 +1,60 @@
+"""
+Cross-process election
+Lets exactly one process per host run a background job, with every other
+worker ready to take over when that process exits
+"""
+import os
+import fcntl
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessLock:
+    """Non-blocking flock on a named lock file
+    
+    The kernel releases an flock when its holder exits however it exits,
+    so a dead holder never leaves the lock behind. Once acquired the lock
+    is kept until release() or process exit.
+    """
+    
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self.path = os.path.join(directory or tempfile.gettempdir(), f"{name}.lock")
+        self._fd = None
+        self._lock = threading.Lock()
+    
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+    
+    def acquire(self) -> bool:
+        """Take the lock if it is free, returning whether this process holds it"""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError as e:
+                logger.error(f"Cannot open lock file {self.path}: {e}")
+                return False
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            logger.info(f"Process {os.getpid()} holds {self.name}")
+            return True
+    
+    def release(self):
+        """Give the lock up so another process can take it"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
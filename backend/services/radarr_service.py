@@ -3,11 +3,16 @@ Radarr API integration service
 """
 import requests
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from functools import lru_cache
+from .arr_paging import fetch_page, iter_pages
+from .calendar_cache import window_dates
 
 logger = logging.getLogger(__name__)
 
+HISTORY_PARAMS = {'sortKey': 'date', 'sortDirection': 'descending'}
+QUEUE_PARAMS = {'includeMovie': 'true'}
+
 
 class RadarrService:
     """Wrapper for Radarr API"""
@@ -38,27 +43,83 @@ class RadarrService:
             logger.error(f"Error getting Radarr status: {e}")
             return {}
     
-    def get_movies(self, limit: int = 100) -> List[Dict]:
-        """Get movies from library"""
+    @staticmethod
+    def format_movie(m: Dict) -> Dict:
+        """Reduce a Radarr movie resource to the fields the panel shows"""
+        return {
+            'id': m.get('id'),
+            'title': m.get('title'),
+            'year': m.get('year'),
+            'status': m.get('status'),
+            'monitored': m.get('monitored'),
+            'fileQuality': m.get('movieFile', {}).get('quality', {}).get('quality', {}).get('name'),
+            'sizeOnDisk': m.get('movieFile', {}).get('size', 0),
+            'releaseDate': m.get('digitalRelease'),
+            'hasFile': m.get('hasFile'),
+            'added': m.get('added')
+        }
+    
+    def fetch_movies(self) -> List[Dict]:
+        """Fetch the whole library in one request (raises on error, for the library sync)"""
+        response = self.session.get(f"{self.base_url}/api/v3/movie", timeout=60)
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_movie(self, movie_id: int) -> Optional[Dict]:
+        """Fetch one movie, or None if it no longer exists (raises on other errors)"""
+        response = self.session.get(f"{self.base_url}/api/v3/movie/{movie_id}", timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_history_since(self, date: str) -> List[Dict]:
+        """Fetch history records newer than an ISO date (raises on error)"""
+        response = self.session.get(
+            f"{self.base_url}/api/v3/history/since",
+            params={'date': date},
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def search_commands(kind: str, ids: List[int]) -> List[Tuple[List[int], Dict]]:
+        """Build (ids, command body) pairs that search a batch of movies"""
+        return [(ids, {'name': 'MoviesSearch', 'movieIds': ids})]
+    
+    def fetch_indexers(self) -> List[Dict]:
+        """Fetch configured indexers (raises on error, for the search scheduler)"""
+        response = self.session.get(f"{self.base_url}/api/v3/indexer", timeout=10)
+        response.raise_for_status()
+        return response.json()
+    
+    def post_command(self, body: Dict) -> Dict:
+        """Queue a command, returning its command resource (raises on error)"""
+        response = self.session.post(f"{self.base_url}/api/v3/command", json=body, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_command(self, command_id: int) -> Optional[Dict]:
+        """Fetch a command's status, or None once Radarr has forgotten it (raises on other errors)"""
+        response = self.session.get(f"{self.base_url}/api/v3/command/{command_id}", timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    def get_movies(self, limit: Optional[int] = 100) -> List[Dict]:
+        """Get movies from library
+        
+        /api/v3/movie is not paged and always returns the whole library, so
+        the limit is applied here (None returns everything).
+        """
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v3/movie",
-                params={'pageSize': limit}
-            )
+            response = self.session.get(f"{self.base_url}/api/v3/movie")
             response.raise_for_status()
             movies = response.json()
             
-            return [{
-                'id': m.get('id'),
-                'title': m.get('title'),
-                'year': m.get('year'),
-                'status': m.get('status'),
-                'monitored': m.get('monitored'),
-                'fileQuality': m.get('movieFile', {}).get('quality', {}).get('quality', {}).get('name'),
-                'sizeOnDisk': m.get('movieFile', {}).get('size', 0),
-                'releaseDate': m.get('digitalRelease'),
-                'hasFile': m.get('hasFile')
-            } for m in movies]
+            return [self.format_movie(m) for m in movies[:limit]]
         except Exception as e:
             logger.error(f"Error getting Radarr movies: {e}")
             return []
@@ -66,7 +127,7 @@ class RadarrService:
     def get_movie_stats(self) -> Dict:
         """Get movie statistics"""
         try:
-            movies = self.get_movies(limit=1000)
+            movies = self.get_movies(limit=None)
             
             total_size = sum(m.get('sizeOnDisk', 0) for m in movies)
             
@@ -82,26 +143,60 @@ class RadarrService:
             logger.error(f"Error getting Radarr stats: {e}")
             return {}
     
+    @staticmethod
+    def format_calendar_movie(m: Dict) -> Dict:
+        """Reduce a calendar movie to the fields the upcoming view shows"""
+        poster = next((i.get('remoteUrl') for i in m.get('images', []) if i.get('coverType') == 'poster'), None)
+        return {
+            'id': m.get('id'),
+            'title': m.get('title'),
+            'year': m.get('year'),
+            'monitored': m.get('monitored'),
+            'hasFile': m.get('hasFile'),
+            'inCinemas': m.get('inCinemas'),
+            'physicalRelease': m.get('physicalRelease'),
+            'digitalRelease': m.get('digitalRelease'),
+            'poster': poster
+        }
+    
+    def fetch_calendar(self, start: str, end: str, etag: Optional[str] = None) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """Fetch calendar entries between two dates, conditionally if an ETag is given
+        
+        Returns (None, etag) when Radarr answers 304 Not Modified (raises on error).
+        """
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self.session.get(
+            f"{self.base_url}/api/v3/calendar",
+            params={'start': start, 'end': end},
+            headers=headers,
+            timeout=30
+        )
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get('ETag')
+    
     def get_upcoming(self, days: int = 7) -> List[Dict]:
-        """Get upcoming movie releases"""
+        """Get upcoming movie releases (the last 30 days through days ahead)"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v3/calendar",
-                params={'start': '-30d', 'end': f'+{days}d'}
-            )
-            response.raise_for_status()
-            return response.json()
+            items, _ = self.fetch_calendar(*window_dates(30, days))
+            return items
         except Exception as e:
             logger.error(f"Error getting Radarr calendar: {e}")
             return []
     
+    def fetch_queue(self, page_size: int = 250) -> List[Dict]:
+        """Fetch every queue record across pages (raises on error)"""
+        return [
+            record
+            for page in iter_pages(self.session, f"{self.base_url}/api/v3/queue", QUEUE_PARAMS, page_size=page_size)
+            for record in page['records']
+        ]
+    
     def get_queue(self) -> List[Dict]:
         """Get download queue"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v3/queue")
-            response.raise_for_status()
-            
-            queue = response.json()
+            queue = self.fetch_queue()
             return [{
                 'id': item.get('id'),
                 'title': item.get('movie', {}).get('title'),
@@ -130,6 +225,15 @@ class RadarrService:
             logger.error(f"Error getting Radarr history: {e}")
             return []
     
+    def get_history_page(self, page: int = 1, page_size: int = 50) -> Dict:
+        """Get one page of history, newest first (raises on error)"""
+        return fetch_page(self.session, f"{self.base_url}/api/v3/history", HISTORY_PARAMS, page, page_size)
+    
+    def iter_history(self, start_page: int = 1, page_size: int = 250, max_workers: int = 4) -> Iterator[Dict]:
+        """Yield every page of history from start_page on (raises on error)"""
+        return iter_pages(self.session, f"{self.base_url}/api/v3/history", HISTORY_PARAMS,
+                          start_page, page_size, max_workers)
+    
     def get_config(self) -> Dict:
         """Get Radarr configuration"""
         try:
@@ -4,19 +4,169 @@ Manages torrent downloads via ruTorrent (web interface)
 """
 import requests
 import logging
-from typing import Dict, List
-from urllib.parse import urljoin
+import xmlrpc.client
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urljoin, unquote
+from .scgi_transport import SCGITransport
+from .torrent_details import TorrentDetailCache
+from .torrent_snapshot import SnapshotCache
+from .torrent_store import TorrentStore
 
 logger = logging.getLogger(__name__)
 
 
+class RTorrentRecord(NamedTuple):
+    """One row of a d.multicall2 torrent fetch"""
+    hash: str
+    name: str
+    size: int
+    downloaded: int
+    uploaded: int
+    ratio: float
+    upload_speed: int
+    download_speed: int
+    label: str
+    base_path: str
+    state: int
+    is_active: int
+    complete: int
+    hashing: int
+    peers: int
+    seeds: int
+    finished_on: int
+    
+    @property
+    def status(self) -> str:
+        """Derive a status string from rtorrent's state flags"""
+        if self.hashing:
+            return 'checking'
+        if not self.state:
+            return 'stopped'
+        if not self.is_active:
+            return 'paused'
+        return 'seeding' if self.complete else 'downloading'
+    
+    def to_dict(self) -> Dict:
+        """Convert to the dict shape returned by get_torrents"""
+        result = self._asdict()
+        result['status'] = self.status
+        return result
+    
+    @classmethod
+    def from_btlist(cls, torrent: Dict) -> 'RTorrentRecord':
+        """Build a record from a getbtlist.php torrent, deriving the flags from its status"""
+        state, is_active, hashing = BTLIST_FLAGS.get(torrent['status'], (0, 0, 0))
+        size, downloaded = torrent['size'], torrent['downloaded']
+        return cls(
+            torrent['hash'], torrent['name'], size, downloaded, int(downloaded * torrent['ratio']),
+            torrent['ratio'], torrent['upload_speed'], torrent['download_speed'], '', '',
+            state, is_active, int(size > 0 and downloaded >= size), hashing, 0, 0, 0
+        )
+
+
+# getbtlist.php status -> (state, is_active, hashing); anything else counts as stopped
+BTLIST_FLAGS = {
+    'downloading': (1, 1, 0),
+    'seeding': (1, 1, 0),
+    'paused': (1, 0, 0),
+    'checking': (1, 0, 1),
+}
+
+
+# (d.multicall2 command, converter) in RTorrentRecord field order
+MULTICALL_FIELDS = (
+    ('d.hash=', str),
+    ('d.name=', str),
+    ('d.size_bytes=', int),
+    ('d.completed_bytes=', int),
+    ('d.up.total=', int),
+    ('d.ratio=', lambda v: int(v) / 1000),
+    ('d.up.rate=', int),
+    ('d.down.rate=', int),
+    ('d.custom1=', unquote),  # ruTorrent stores labels URL-encoded
+    ('d.base_path=', str),
+    ('d.state=', int),
+    ('d.is_active=', int),
+    ('d.complete=', int),
+    ('d.hashing=', int),
+    ('d.peers_connected=', int),
+    ('d.peers_complete=', int),
+    ('d.timestamp.finished=', int),
+)
+
+# Torrents per system.multicall when fetching tracker URLs
+TRACKER_CHUNK_SIZE = 200
+
+# Torrents per system.multicall when streaming the torrent list
+STREAM_PAGE_SIZE = 200
+
+# (command, field name) for the per-torrent f./t./p.multicall detail fetches
+FILE_FIELDS = (
+    ('f.path=', 'name'),
+    ('f.size_bytes=', 'size'),
+    ('f.completed_chunks=', 'completed_chunks'),
+    ('f.size_chunks=', 'size_chunks'),
+    ('f.priority=', 'priority'),
+)
+TRACKER_FIELDS = (
+    ('t.url=', 'url'),
+    ('t.group=', 'tier'),
+    ('t.is_enabled=', 'enabled'),
+    ('t.scrape_complete=', 'seeds'),
+    ('t.scrape_incomplete=', 'leechers'),
+    ('t.scrape_downloaded=', 'downloaded'),
+    ('t.success_counter=', 'success_count'),
+    ('t.failed_counter=', 'failed_count'),
+)
+PEER_FIELDS = (
+    ('p.address=', 'ip'),
+    ('p.port=', 'port'),
+    ('p.client_version=', 'client'),
+    ('p.completed_percent=', 'progress'),
+    ('p.down_rate=', 'download_speed'),
+    ('p.up_rate=', 'upload_speed'),
+    ('p.is_encrypted=', 'encrypted'),
+    ('p.is_incoming=', 'incoming'),
+)
+
+# rtorrent commands used for each action when talking XML-RPC directly
+RPC_ACTIONS = {
+    'start': [('d.open',), ('d.start',)],
+    'stop': [('d.stop',), ('d.close',)],
+    'pause': [('d.pause',)],
+    'resume': [('d.resume',)],
+    'remove': [('d.erase',)],
+    # erasedata plugin convention: custom5=1 deletes data when erased
+    'remove-all': [('d.custom5.set', '1'), ('d.erase',)],
+}
+
+
 class RuTorrentService:
     """Wrapper for ruTorrent API via XMLRPC/HTTP"""
     
-    def __init__(self, base_url: str, username: str = None, password: str = None):
+    def __init__(self, base_url: str, username: str = None, password: str = None,
+                 rpc_path: str = '/plugins/httprpc/action.php',
+                 scgi_address: str = None, scgi_pool_size: int = 4,
+                 snapshot_ttl: float = 2.0, detail_ttl: float = 10.0):
         self.base_url = base_url.rstrip('/')
+        self.rpc_path = rpc_path
         self.session = requests.Session()
         
+        # Optional direct XML-RPC over SCGI to rtorrent
+        self.scgi = SCGITransport(scgi_address, scgi_pool_size) if scgi_address else None
+        
+        # Shared list snapshot for the list and stats endpoints
+        self.snapshots = SnapshotCache(
+            self._fetch_records, TorrentStore.from_rutorrent, self._aggregate_torrents,
+            RTorrentRecord.to_dict, snapshot_ttl
+        )
+        
+        # Files/peers/trackers, fetched only for torrents that are opened
+        self.details = TorrentDetailCache(
+            {'files': self._fetch_files, 'peers': self._fetch_peers, 'trackers': self._fetch_trackers},
+            self._detail_fingerprint, detail_ttl
+        )
+        
         # Setup auth if provided
         if username and password:
             self.session.auth = (username, password)
@@ -24,6 +174,8 @@ class RuTorrentService:
     def is_connected(self) -> bool:
         """Check if ruTorrent is accessible"""
         try:
+            if self.scgi is not None:
+                return bool(self._xmlrpc_call('system.client_version'))
             response = self.session.get(
                 urljoin(self.base_url, '/'),
                 timeout=10
@@ -36,6 +188,8 @@ class RuTorrentService:
     def get_server_status(self) -> Dict:
         """Get ruTorrent server status"""
         try:
+            if self.scgi is not None:
+                return self._get_rpc_server_status()
             response = self.session.get(
                 urljoin(self.base_url, '/php/getglobalstat.php'),
                 timeout=10
@@ -54,54 +208,274 @@ class RuTorrentService:
             logger.error(f"Error getting ruTorrent status: {e}")
             return {'status': 'error', 'message': str(e)}
     
+    def _xmlrpc_call(self, method: str, *params):
+        """Send one XML-RPC call to rtorrent, directly over SCGI or through ruTorrent's RPC mount"""
+        if self.scgi is not None:
+            return self.scgi.call(method, *params)
+        response = self.session.post(
+            urljoin(self.base_url, self.rpc_path),
+            data=xmlrpc.client.dumps(params, method).encode(),
+            headers={'Content-Type': 'text/xml'},
+            timeout=10
+        )
+        response.raise_for_status()
+        return xmlrpc.client.loads(response.content)[0][0]
+    
+    def fetch_torrent_records(self, view: str = 'main') -> List[RTorrentRecord]:
+        """Fetch every torrent in a single d.multicall2 round trip"""
+        commands = [command for command, _ in MULTICALL_FIELDS]
+        rows = self._xmlrpc_call('d.multicall2', '', view, *commands)
+        converters = [convert for _, convert in MULTICALL_FIELDS]
+        return [
+            RTorrentRecord(*(convert(value) for convert, value in zip(converters, row)))
+            for row in rows
+        ]
+    
+    def _get_rpc_server_status(self) -> Dict:
+        """Get global rates and active count straight from rtorrent"""
+        calls = [
+            {'methodName': 'throttle.global_up.rate', 'params': ['']},
+            {'methodName': 'throttle.global_down.rate', 'params': ['']},
+            {'methodName': 'd.multicall2', 'params': ['', 'active', 'd.hash=']},
+        ]
+        up_rate, down_rate, active = self._xmlrpc_call('system.multicall', calls)
+        return {
+            'status': 'ok',
+            'upload_speed': up_rate[0],
+            'download_speed': down_rate[0],
+            'active_torrents': len(active[0])
+        }
+    
+    def _fetch_records(self) -> List[RTorrentRecord]:
+        """Get the torrent records for a snapshot, from getbtlist.php if XML-RPC fails"""
+        try:
+            return self.fetch_torrent_records()
+        except Exception as e:
+            logger.warning(f"d.multicall2 fetch failed, falling back to getbtlist: {e}")
+        try:
+            return [RTorrentRecord.from_btlist(t) for t in self.iter_torrents_btlist()]
+        except Exception as e:
+            logger.error(f"Error getting torrents: {e}")
+            return []
+    
     def get_torrents(self) -> List[Dict]:
         """Get list of all torrents"""
+        return self.get_snapshot().to_dicts()
+    
+    def iter_torrent_records(self, view: str = 'main',
+                             page_size: int = STREAM_PAGE_SIZE) -> Iterator[RTorrentRecord]:
+        """Yield torrents a page at a time (raises on error)
+        
+        d.multicall2 has no offset or limit, so this lists the view's hashes
+        once and then fetches the fields for page_size torrents per
+        system.multicall; only one page of rows is held at a time. Torrents
+        removed between the two calls fault and are skipped.
+        """
+        methods = [command.rstrip('=') for command, _ in MULTICALL_FIELDS]
+        converters = [convert for _, convert in MULTICALL_FIELDS]
+        hashes = self._xmlrpc_call('download_list', '', view)
+        for start in range(0, len(hashes), page_size):
+            chunk = hashes[start:start + page_size]
+            calls = [
+                {'methodName': method, 'params': [hash_id]}
+                for hash_id in chunk for method in methods
+            ]
+            results = self._xmlrpc_call('system.multicall', calls)
+            for i in range(len(chunk)):
+                row = results[i * len(methods):(i + 1) * len(methods)]
+                if any(isinstance(result, dict) for result in row):
+                    continue
+                yield RTorrentRecord(*(convert(result[0]) for convert, result in zip(converters, row)))
+    
+    def iter_torrents(self) -> Iterator[Dict]:
+        """Yield torrents a page at a time, streaming getbtlist.php when XML-RPC is unavailable
+        
+        The fallback only applies before the first torrent is yielded; a
+        failure after that is raised to the caller.
+        """
+        records = self.iter_torrent_records()
         try:
-            response = self.session.get(
-                urljoin(self.base_url, '/php/getbtlist.php'),
-                timeout=10
-            )
+            first = next(records, None)
+        except Exception as e:
+            logger.warning(f"XML-RPC fetch failed, streaming getbtlist: {e}")
+            yield from self.iter_torrents_btlist()
+            return
+        if first is None:
+            return
+        yield first.to_dict()
+        for record in records:
+            yield record.to_dict()
+    
+    @staticmethod
+    def _parse_btlist_line(line: str) -> Optional[Dict]:
+        """Parse one tab-separated getbtlist.php line, or None if it is blank or short"""
+        parts = line.split('\t')
+        if len(parts) < 8:
+            return None
+        return {
+            'hash': parts[0],
+            'name': parts[1],
+            'type': parts[2],
+            'size': int(parts[3]) if parts[3].isdigit() else 0,
+            'downloaded': int(parts[4]) if parts[4].isdigit() else 0,
+            'ratio': float(parts[5]) if parts[5] else 0,
+            'upload_speed': int(parts[6]) if parts[6].isdigit() else 0,
+            'download_speed': int(parts[7]) if parts[7].isdigit() else 0,
+            'status': parts[9] if len(parts) > 9 else 'unknown'
+        }
+    
+    def iter_torrents_btlist(self) -> Iterator[Dict]:
+        """Stream getbtlist.php and yield one torrent per line
+        
+        The response is read incrementally with iter_lines, so memory stays
+        bounded by one line regardless of session size.
+        """
+        with self.session.get(
+            urljoin(self.base_url, '/php/getbtlist.php'),
+            timeout=10,
+            stream=True
+        ) as response:
             response.raise_for_status()
-            
-            torrents = []
-            lines = response.text.strip().split('\n')
-            
-            for line in lines:
-                if line.strip():
-                    parts = line.split('\t')
-                    if len(parts) >= 8:
-                        torrents.append({
-                            'hash': parts[0],
-                            'name': parts[1],
-                            'type': parts[2],
-                            'size': int(parts[3]) if parts[3].isdigit() else 0,
-                            'downloaded': int(parts[4]) if parts[4].isdigit() else 0,
-                            'ratio': float(parts[5]) if parts[5] else 0,
-                            'upload_speed': int(parts[6]) if parts[6].isdigit() else 0,
-                            'download_speed': int(parts[7]) if parts[7].isdigit() else 0,
-                            'status': parts[9] if len(parts) > 9 else 'unknown'
-                        })
-            return torrents
+            # Without a charset header requests would decode as ISO-8859-1
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                torrent = self._parse_btlist_line(line) if line else None
+                if torrent is not None:
+                    yield torrent
+    
+    def _detail_fingerprint(self, hash_id: str):
+        """Status and completion of a torrent in the last snapshot, or None if absent
+        
+        Reads whatever snapshot is held, expired or not, so opening a detail
+        never refetches the whole list; only a cold start fetches one.
+        """
+        store = (self.snapshots.peek() or self.get_snapshot()).store
+        index = store.find(hash_id)
+        if index is None:
+            return None
+        return store.columns['state'][index], store.columns['progress'][index] >= 1
+    
+    def _detail_multicall(self, method: str, hash_id: str, fields) -> List[Dict]:
+        """Run an f./t./p.multicall for one torrent and name the columns"""
+        rows = self._xmlrpc_call(method, hash_id, '', *(command for command, _ in fields))
+        names = [name for _, name in fields]
+        return [dict(zip(names, row)) for row in rows]
+    
+    def _fetch_files(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's file list with f.multicall"""
+        files = self._detail_multicall('f.multicall', hash_id, FILE_FIELDS)
+        for f in files:
+            chunks = f.pop('size_chunks')
+            f['progress'] = f.pop('completed_chunks') / chunks if chunks else 1.0
+        return files
+    
+    def _fetch_peers(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's connected peers with p.multicall"""
+        peers = self._detail_multicall('p.multicall', hash_id, PEER_FIELDS)
+        for p in peers:
+            p['progress'] = p['progress'] / 100
+        return peers
+    
+    def _fetch_trackers(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's trackers and scrape counts with t.multicall"""
+        return self._detail_multicall('t.multicall', hash_id, TRACKER_FIELDS)
+    
+    def get_tracker_urls(self, hashes: List[str]) -> Dict[str, List[str]]:
+        """Get tracker URLs for many torrents, one t.multicall per hash in a system.multicall
+        
+        Hashes whose call faulted are left out so a later run retries them.
+        """
+        urls = {}
+        for start in range(0, len(hashes), TRACKER_CHUNK_SIZE):
+            chunk = hashes[start:start + TRACKER_CHUNK_SIZE]
+            calls = [
+                {'methodName': 't.multicall', 'params': [hash_id, '', 't.url=']}
+                for hash_id in chunk
+            ]
+            try:
+                results = self._xmlrpc_call('system.multicall', calls)
+            except Exception as e:
+                logger.error(f"Error fetching tracker URLs: {e}")
+                continue
+            for hash_id, result in zip(chunk, results):
+                if isinstance(result, dict):
+                    continue
+                urls[hash_id] = [row[0] for row in result[0]]
+        return urls
+    
+    def get_torrent_detail(self, hash_id: str, kind: str) -> Optional[Dict]:
+        """Get files, peers or trackers for one torrent (None if not in the list)"""
+        try:
+            return self.details.get(hash_id, kind)
+        except ValueError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting torrents: {e}")
-            return []
+            logger.error(f"Error getting torrent {kind}: {e}")
+            return {}
+    
+    def _rpc_action(self, action: str, hash_id: str) -> bool:
+        """Run an action's rtorrent commands in one system.multicall"""
+        return self.bulk_action(action, [hash_id]).get(hash_id, False)
+    
+    def bulk_action(self, action: str, hashes: List[str]) -> Dict[str, bool]:
+        """Apply an action to many torrents in a single system.multicall
+        
+        Returns a success flag per hash; a fault in any of a hash's
+        commands marks that hash as failed without affecting the others.
+        """
+        commands = RPC_ACTIONS[action]
+        calls = [
+            {'methodName': command[0], 'params': [hash_id, *command[1:]]}
+            for hash_id in hashes
+            for command in commands
+        ]
+        if not calls:
+            return {}
+        try:
+            results = self._xmlrpc_call('system.multicall', calls)
+        except Exception as e:
+            logger.error(f"Error running bulk {action}: {e}")
+            return {hash_id: False for hash_id in hashes}
+        finally:
+            self.snapshots.invalidate()
+        
+        per_hash = len(commands)
+        return {
+            hash_id: not any(
+                isinstance(r, dict) and 'faultCode' in r
+                for r in results[i * per_hash:(i + 1) * per_hash]
+            )
+            for i, hash_id in enumerate(hashes)
+        }
+    
+    @staticmethod
+    def _aggregate_torrents(store: TorrentStore) -> Dict:
+        """Compute torrent stats and bandwidth totals from the store columns"""
+        columns = store.columns
+        count = len(store)
+        return {
+            'stats': {
+                'total_torrents': count,
+                'total_size': sum(columns['size']),
+                'total_downloaded': sum(columns['downloaded']),
+                'total_uploaded': sum(columns['uploaded']),
+                'average_ratio': sum(columns['ratio']) / count if count else 0
+            },
+            'bandwidth': {
+                'upload_speed': sum(columns['upload_speed']),
+                'download_speed': sum(columns['download_speed']),
+                'active_torrents': sum(columns['active'])
+            }
+        }
+    
+    def get_snapshot(self):
+        """Get the shared short-lived torrent list snapshot"""
+        return self.snapshots.get()
     
     def get_torrent_stats(self) -> Dict:
         """Get torrent statistics"""
         try:
-            torrents = self.get_torrents()
-            
-            total_size = sum(t['size'] for t in torrents)
-            total_downloaded = sum(t['downloaded'] for t in torrents)
-            total_uploaded = sum(int(t['downloaded'] * t['ratio']) for t in torrents)
-            
-            return {
-                'total_torrents': len(torrents),
-                'total_size': total_size,
-                'total_downloaded': total_downloaded,
-                'total_uploaded': total_uploaded,
-                'average_ratio': sum(t['ratio'] for t in torrents) / len(torrents) if torrents else 0
-            }
+            return self.get_snapshot().aggregates['stats']
         except Exception as e:
             logger.error(f"Error getting torrent stats: {e}")
             return {}
@@ -109,11 +483,14 @@ class RuTorrentService:
     def start_torrent(self, hash_id: str) -> bool:
         """Start a torrent"""
         try:
+            if self.scgi is not None:
+                return self._rpc_action('start', hash_id)
             response = self.session.post(
                 urljoin(self.base_url, '/php/action.php'),
                 data={'action': 'start', 'hash': hash_id},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error starting torrent: {e}")
@@ -122,11 +499,14 @@ class RuTorrentService:
     def stop_torrent(self, hash_id: str) -> bool:
         """Stop a torrent"""
         try:
+            if self.scgi is not None:
+                return self._rpc_action('stop', hash_id)
             response = self.session.post(
                 urljoin(self.base_url, '/php/action.php'),
                 data={'action': 'stop', 'hash': hash_id},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error stopping torrent: {e}")
@@ -135,11 +515,14 @@ class RuTorrentService:
     def pause_torrent(self, hash_id: str) -> bool:
         """Pause a torrent"""
         try:
+            if self.scgi is not None:
+                return self._rpc_action('pause', hash_id)
             response = self.session.post(
                 urljoin(self.base_url, '/php/action.php'),
                 data={'action': 'pause', 'hash': hash_id},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error pausing torrent: {e}")
@@ -148,11 +531,14 @@ class RuTorrentService:
     def resume_torrent(self, hash_id: str) -> bool:
         """Resume a torrent"""
         try:
+            if self.scgi is not None:
+                return self._rpc_action('resume', hash_id)
             response = self.session.post(
                 urljoin(self.base_url, '/php/action.php'),
                 data={'action': 'resume', 'hash': hash_id},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error resuming torrent: {e}")
@@ -162,16 +548,55 @@ class RuTorrentService:
         """Remove a torrent"""
         try:
             action = 'remove-all' if delete_files else 'remove'
+            if self.scgi is not None:
+                return self._rpc_action(action, hash_id)
             response = self.session.post(
                 urljoin(self.base_url, '/php/action.php'),
                 data={'action': action, 'hash': hash_id},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error removing torrent: {e}")
             return False
     
+    def add_torrent_url(self, url: str) -> bool:
+        """Add torrent from URL or magnet link"""
+        try:
+            if self.scgi is not None:
+                self._xmlrpc_call('load.start', '', url)
+                self.snapshots.invalidate()
+                return True
+            response = self.session.post(
+                urljoin(self.base_url, '/php/addtorrent.php'),
+                data={'url': url},
+                timeout=10
+            )
+            self.snapshots.invalidate()
+            return response.status_code == 200 and 'result[]=Failed' not in response.url
+        except Exception as e:
+            logger.error(f"Error adding torrent: {e}")
+            return False
+    
+    def add_torrent_file(self, filename: str, data: bytes) -> bool:
+        """Add torrent from .torrent file contents"""
+        try:
+            if self.scgi is not None:
+                self._xmlrpc_call('load.raw_start', '', xmlrpc.client.Binary(data))
+                self.snapshots.invalidate()
+                return True
+            response = self.session.post(
+                urljoin(self.base_url, '/php/addtorrent.php'),
+                files={'torrent_file': (filename, data, 'application/x-bittorrent')},
+                timeout=30
+            )
+            self.snapshots.invalidate()
+            return response.status_code == 200 and 'result[]=Failed' not in response.url
+        except Exception as e:
+            logger.error(f"Error adding torrent file: {e}")
+            return False
+    
     def get_bandwidth_stats(self) -> Dict:
         """Get bandwidth statistics"""
         try:
@@ -194,6 +619,7 @@ class RuTorrentService:
                 data={'action': 'restart'},
                 timeout=10
             )
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error restarting rtorrent: {e}")
@@ -0,0 +1,81 @@
+"""
+SCGI transport for rtorrent XML-RPC
+Talks to rtorrent's scgi_port / scgi_local socket directly, bypassing ruTorrent's PHP layer
+"""
+import socket
+import logging
+import threading
+import xmlrpc.client
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SCGITransport:
+    """XML-RPC over SCGI to a Unix or TCP socket
+    
+    rtorrent answers one request per connection and then closes it, so
+    sockets cannot be kept alive; the pool bounds how many connections are
+    open at once so bursts of calls cannot exhaust rtorrent's listener.
+    """
+    
+    def __init__(self, address: str, pool_size: int = 4, timeout: int = 10):
+        self.address = address
+        self.family, self.target = self.parse_address(address)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(pool_size)
+    
+    @staticmethod
+    def parse_address(address: str) -> Tuple[int, object]:
+        """Parse unix:///path, /path, scgi://host:port or host:port"""
+        if address.startswith('unix://'):
+            return socket.AF_UNIX, address[len('unix://'):]
+        if address.startswith('/'):
+            return socket.AF_UNIX, address
+        if address.startswith('scgi://'):
+            address = address[len('scgi://'):]
+        host, _, port = address.rpartition(':')
+        return socket.AF_INET, (host or 'localhost', int(port))
+    
+    @staticmethod
+    def encode_request(body: bytes) -> bytes:
+        """Wrap an XML-RPC body in an SCGI netstring header"""
+        headers = b'CONTENT_LENGTH\x00%d\x00SCGI\x001\x00' % len(body)
+        return b'%d:%s,%s' % (len(headers), headers, body)
+    
+    @staticmethod
+    def decode_response(response: bytes) -> bytes:
+        """Strip the CGI-style headers from an SCGI response"""
+        header, sep, payload = response.partition(b'\r\n\r\n')
+        if not sep:
+            header, sep, payload = response.partition(b'\n\n')
+        if not sep:
+            raise ValueError('Malformed SCGI response')
+        for line in header.splitlines():
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'status' and not value.strip().startswith(b'200'):
+                raise ValueError(f"SCGI error status: {value.strip().decode(errors='replace')}")
+        return payload
+    
+    def request(self, body: bytes) -> bytes:
+        """Send one SCGI request and return the response body"""
+        with self._slots:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect(self.target)
+                sock.sendall(self.encode_request(body))
+                chunks = []
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            finally:
+                sock.close()
+        return self.decode_response(b''.join(chunks))
+    
+    def call(self, method: str, *params):
+        """Call an rtorrent XML-RPC method and return its result"""
+        body = xmlrpc.client.dumps(params, method).encode()
+        return xmlrpc.client.loads(self.request(body))[0][0]
@@ -0,0 +1,392 @@
+"""
+Radarr/Sonarr search scheduler
+Queues search requests, coalesces them into batched commands within
+per-indexer rate limits, and follows each command to completion
+"""
+import heapq
+import itertools
+import time
+import logging
+import threading
+from collections import deque
+from datetime import timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+from ..models import db, IndexerBudget
+from .library_sync import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = {'completed', 'failed', 'aborted', 'cancelled', 'orphaned'}
+
+
+def recency(*values: Optional[str]) -> float:
+    """Newest past *arr timestamp among values as unix seconds, 0 if none
+    
+    Future dates (unreleased movies, unaired episodes) are ignored so they
+    do not jump the queue.
+    """
+    now = time.time()
+    stamps = [
+        parsed.replace(tzinfo=timezone.utc).timestamp()
+        for parsed in map(parse_datetime, values) if parsed is not None
+    ]
+    return max((t for t in stamps if t <= now), default=0.0)
+
+
+class IndexerBudgets:
+    """Hourly query budgets of one *arr instance's indexers, shared through the database
+    
+    Tokens refill continuously up to the hourly limit. A take is one
+    conditional UPDATE per indexer in a single transaction, so workers
+    drawing on the same budget can never spend the same tokens twice.
+    """
+    
+    def __init__(self, app_type: str):
+        self.app_type = app_type
+    
+    @staticmethod
+    def _available(now: float):
+        """SQL expression for a row's tokens refilled up to now"""
+        refilled = IndexerBudget.tokens + (now - IndexerBudget.updated) * IndexerBudget.capacity / 3600.0
+        return case((refilled > IndexerBudget.capacity, IndexerBudget.capacity), else_=refilled)
+    
+    def sync(self, limits: Dict[str, int], now: float):
+        """Create or resize the budget rows for the given indexer -> hourly limit"""
+        rows = {row.name: row for row in IndexerBudget.query.filter_by(app_type=self.app_type)}
+        for name, limit in limits.items():
+            row = rows.get(name)
+            if row is None:
+                db.session.add(IndexerBudget(app_type=self.app_type, name=name, capacity=limit,
+                                             tokens=float(limit), updated=now))
+            elif row.capacity != limit:
+                row.capacity = limit
+                row.tokens = min(row.tokens, float(limit))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the rows first
+            db.session.rollback()
+    
+    def available(self, names: List[str], now: float) -> Dict[str, Dict]:
+        """Remaining queries and hourly limit per indexer"""
+        if not names:
+            return {}
+        rows = db.session.execute(
+            select(IndexerBudget.name, IndexerBudget.capacity, self._available(now))
+            .where(IndexerBudget.app_type == self.app_type, IndexerBudget.name.in_(names))
+        )
+        return {name: {'available': int(tokens), 'hourly_limit': capacity} for name, capacity, tokens in rows}
+    
+    def take(self, names: List[str], cost: int, now: float) -> bool:
+        """Spend cost queries on every indexer, or nothing if any of them is short"""
+        available = self._available(now)
+        try:
+            for name in names:
+                result = db.session.execute(
+                    update(IndexerBudget)
+                    .where(IndexerBudget.app_type == self.app_type, IndexerBudget.name == name,
+                           available >= cost)
+                    .values(tokens=available - cost, updated=now)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    db.session.rollback()
+                    return False
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    def refund(self, names: List[str], cost: int):
+        """Give back queries taken for a command that was never sent"""
+        db.session.execute(
+            update(IndexerBudget)
+            .where(IndexerBudget.app_type == self.app_type, IndexerBudget.name.in_(names))
+            .values(tokens=IndexerBudget.tokens + cost)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+class SearchScheduler:
+    """Prioritized, rate-limited search queue for one *arr instance
+    
+    Each queued id gets a recency timestamp (air/release date or the time it
+    was requested) and the newest are searched first. A command costs
+    cost(kind, ids) queries (one per id by default) on every indexer enabled
+    for automatic search, taken from budgets every worker shares, and
+    nothing is sent until the indexers are known. Ids whose
+    command could not be posted go back in at their original priority after
+    an exponential backoff, and are dropped after max_retries failures.
+    """
+    
+    def __init__(self, service, name: str, kinds: Tuple[str, ...], batch_size: int = 20,
+                 max_inflight: int = 2, indexer_limit: int = 60, indexer_limits: Dict[str, int] = None,
+                 interval: float = 5.0, indexer_refresh: float = 600.0, history_size: int = 50,
+                 max_retries: int = 5, max_backoff: float = 600.0,
+                 cost: Callable[[str, List[int]], int] = None):
+        self.service = service
+        self.name = name
+        self.kinds = kinds
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.indexer_limit = indexer_limit
+        self.indexer_limits = {k.lower(): v for k, v in (indexer_limits or {}).items()}
+        self.interval = interval
+        self.indexer_refresh = indexer_refresh
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.cost = cost or (lambda kind, ids: len(ids))
+        self.budgets = IndexerBudgets(name)
+        
+        self._heap = []  # (-recency, seq, kind, id)
+        self._pending = {}  # (kind, id) -> (recency, seq) of the live heap entry
+        self._seq = itertools.count()
+        self._indexers = None  # indexer name -> hourly limit, None until fetched
+        self._indexers_at = None
+        self._inflight = {}  # command id -> command info
+        self._history = deque(maxlen=history_size)
+        self._attempts = {}  # (kind, id) -> failed posts so far
+        self._post_failures = 0
+        self._retry_at = 0.0
+        self._loading = set()  # labels of background enqueues still running
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def enqueue(self, kind: str, ids: Iterable[int], recency: Optional[float] = None) -> int:
+        """Queue ids for searching, returning how many were not already queued
+        
+        Re-queuing an id only moves it up if the new recency is newer.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"unknown search kind: {kind}")
+        recency = time.time() if recency is None else recency
+        added = 0
+        with self._lock:
+            for item_id in ids:
+                key = (kind, item_id)
+                current = self._pending.get(key)
+                if current is not None and current[0] >= recency:
+                    continue
+                added += current is None
+                seq = next(self._seq)
+                # Older heap entries for the key become stale and are skipped on pop
+                self._pending[key] = (recency, seq)
+                heapq.heappush(self._heap, (-recency, seq, kind, item_id))
+        return added
+    
+    def enqueue_many(self, kind: str, items: Iterable[Tuple[int, float]]) -> int:
+        """Queue (id, recency) pairs"""
+        return sum(self.enqueue(kind, [item_id], recency) for item_id, recency in items)
+    
+    def enqueue_background(self, kind: str, pages: Iterable[List[Tuple[int, float]]], label: str) -> bool:
+        """Queue (id, recency) pairs from pages in a background thread
+        
+        Each page is queued as soon as it arrives, so searching starts before
+        a long list has been read. Returns False if a load with the same
+        label is still running.
+        """
+        with self._lock:
+            if label in self._loading:
+                return False
+            self._loading.add(label)
+        
+        def load():
+            queued = 0
+            try:
+                for items in pages:
+                    queued += self.enqueue_many(kind, items)
+                logger.info(f"Queued {queued} {self.name} {label} searches")
+            except Exception as e:
+                logger.error(f"Error queuing {self.name} {label} searches after {queued}: {e}")
+            finally:
+                with self._lock:
+                    self._loading.discard(label)
+        
+        threading.Thread(target=load, name=f'{self.name}-{label}', daemon=True).start()
+        return True
+    
+    def _refresh_indexers(self, now: float):
+        """Track the indexers enabled for automatic search, keeping existing budgets"""
+        if self._indexers_at is not None and now - self._indexers_at < self.indexer_refresh:
+            return
+        try:
+            indexers = self.service.fetch_indexers()
+        except Exception as e:
+            logger.error(f"Error fetching {self.name} indexers: {e}")
+            return
+        limits = {}
+        for indexer in indexers:
+            if not indexer.get('enableAutomaticSearch', True):
+                continue
+            name = (indexer.get('name') or str(indexer.get('id'))).lower()
+            limits[name] = self.indexer_limits.get(name, self.indexer_limit)
+        self.budgets.sync(limits, now)
+        self._indexers = limits
+        self._indexers_at = now
+    
+    def _budget(self, now: float) -> int:
+        """Ids that may be searched right now; none until the indexers are known"""
+        if not self._indexers:
+            return 0
+        budgets = self.budgets.available(list(self._indexers), now)
+        if len(budgets) < len(self._indexers):
+            return 0
+        return min(self.batch_size, min(b['available'] for b in budgets.values()))
+    
+    def _pop_batch(self, budget: int) -> Dict[str, List[Tuple[int, float]]]:
+        """Take up to budget of the newest queued (id, recency) pairs, grouped by kind"""
+        batch = {}
+        taken = 0
+        while self._heap and taken < budget:
+            neg_recency, seq, kind, item_id = heapq.heappop(self._heap)
+            if self._pending.get((kind, item_id), (None, None))[1] != seq:
+                continue
+            del self._pending[(kind, item_id)]
+            batch.setdefault(kind, []).append((item_id, -neg_recency))
+            taken += 1
+        return batch
+    
+    def _poll_commands(self, now: float):
+        """Update in-flight commands and retire the finished ones"""
+        for command_id, info in list(self._inflight.items()):
+            try:
+                command = self.service.fetch_command(command_id)
+            except Exception as e:
+                logger.error(f"Error polling {self.name} command {command_id}: {e}")
+                continue
+            with self._lock:
+                info['status'] = command.get('status') if command else 'unknown'
+                if command is None or info['status'] in FINISHED_STATES:
+                    info['finished'] = now
+                    if command and command.get('message'):
+                        info['message'] = command['message']
+                    self._history.appendleft(self._inflight.pop(command_id))
+    
+    def _restore(self, commands: List[Tuple], recencies: Dict[Tuple[str, int], float]):
+        """Put the ids of unsent commands back at their original priority"""
+        for kind, ids, _ in commands:
+            for item_id in ids:
+                self.enqueue(kind, [item_id], recencies[(kind, item_id)])
+    
+    def _requeue(self, commands: List[Tuple], recencies: Dict[Tuple[str, int], float], now: float):
+        """Put the ids of unsent commands back at their original priority and back off"""
+        self._post_failures += 1
+        self._retry_at = now + min(self.max_backoff, self.interval * 2 ** self._post_failures)
+        dropped = 0
+        for kind, ids, _ in commands:
+            for item_id in ids:
+                key = (kind, item_id)
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts > self.max_retries:
+                    self._attempts.pop(key, None)
+                    dropped += 1
+                    continue
+                self._attempts[key] = attempts
+                self.enqueue(kind, [item_id], recencies[key])
+        if dropped:
+            logger.warning(f"Dropped {dropped} {self.name} searches after {self.max_retries} failed attempts")
+    
+    def _dispatch(self, now: float):
+        """Send batches while the command queue and indexer budgets allow"""
+        if now < self._retry_at:
+            return
+        while len(self._inflight) < self.max_inflight:
+            budget = self._budget(now)
+            if budget <= 0:
+                return
+            with self._lock:
+                batch = self._pop_batch(budget)
+            if not batch:
+                return
+            recencies = {}
+            commands = []
+            for kind, items in batch.items():
+                recencies.update(((kind, item_id), item_recency) for item_id, item_recency in items)
+                commands.extend((kind, ids, body) for ids, body in
+                                self.service.search_commands(kind, [item_id for item_id, _ in items]))
+            indexers = list(self._indexers)
+            for i, (kind, ids, body) in enumerate(commands):
+                # A single command can never cost more than the smallest budget holds
+                cost = min(self.cost(kind, ids), min(self._indexers.values()))
+                if not self.budgets.take(indexers, cost, now):
+                    # Spent by another worker since the budget was read
+                    self._restore(commands[i:], recencies)
+                    return
+                try:
+                    command = self.service.post_command(body)
+                except Exception as e:
+                    logger.error(f"Error queuing {self.name} {body['name']}: {e}")
+                    self.budgets.refund(indexers, cost)
+                    self._requeue(commands[i:], recencies, now)
+                    return
+                self._post_failures = 0
+                for item_id in ids:
+                    self._attempts.pop((kind, item_id), None)
+                with self._lock:
+                    self._inflight[command['id']] = {
+                        'id': command['id'],
+                        'name': body['name'],
+                        'kind': kind,
+                        'ids': ids,
+                        'cost': cost,
+                        'status': command.get('status', 'queued'),
+                        'started': now
+                    }
+    
+    def tick(self, now: Optional[float] = None):
+        """Poll in-flight commands and dispatch whatever the limits allow"""
+        now = time.time() if now is None else now
+        self._refresh_indexers(now)
+        self._poll_commands(now)
+        self._dispatch(now)
+    
+    def get_status(self) -> Dict:
+        """Get queue depth, indexer budgets and in-flight/recent commands"""
+        now = time.time()
+        with self._lock:
+            queued = {kind: 0 for kind in self.kinds}
+            for kind, _ in self._pending:
+                queued[kind] += 1
+            upcoming = [
+                {'kind': kind, 'id': item_id, 'recency': -neg_recency}
+                for neg_recency, seq, kind, item_id in heapq.nsmallest(10, self._heap)
+                if self._pending.get((kind, item_id), (None, None))[1] == seq
+            ]
+            inflight = list(self._inflight.values())
+            recent = list(self._history)
+            loading = sorted(self._loading)
+        indexers = self.budgets.available(list(self._indexers or ()), now)
+        return {
+            'queued': queued,
+            'next': upcoming,
+            'loading': loading,
+            'retry_in': max(0, round(self._retry_at - now)),
+            'indexers': indexers,
+            'inflight': inflight,
+            'recent': recent
+        }
+    
+    def start(self, app):
+        """Run the scheduler in a background thread bound to the app context"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(app,), name=f'{self.name}-search', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self, app):
+        while not self._stop.wait(self.interval):
+            with app.app_context():
+                try:
+                    self.tick()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error in {self.name} search scheduler: {e}")
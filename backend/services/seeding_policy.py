@@ -0,0 +1,301 @@
+"""
+Seeding policy engine
+Evaluates declarative ratio, seed-time and disk rules against one fetched
+torrent list per client and turns the matches into batched client actions
+"""
+import json
+import time
+import logging
+import operator
+import psutil
+from array import array
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ('start', 'stop', 'pause', 'resume', 'remove', 'remove-all')
+
+OPERATORS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda value, options: value in options,
+    'not in': lambda value, options: value not in options,
+}
+
+NUMERIC_FIELDS = ('ratio', 'seed_days', 'size', 'uploaded', 'downloaded', 'progress',
+                  'upload_speed', 'download_speed', 'peers', 'seeds')
+TEXT_FIELDS = ('state', 'label', 'name')
+# Text fields only compare for equality or membership
+TEXT_OPERATORS = ('==', '!=', 'in', 'not in')
+
+
+def _is_number(value) -> bool:
+    """Check for an int or float (bools are not numbers here)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Torrents already in these states are left out of the action
+NOOP_STATES = {
+    'start': {'seeding', 'downloading'},
+    'resume': {'seeding', 'downloading'},
+    'stop': {'stopped', 'finished'},
+    'pause': {'paused', 'stopped', 'finished'},
+}
+
+
+class SeedingPolicy:
+    """One declarative rule: conditions over torrent fields plus an action
+    
+    Example:
+        {"name": "ratio-cleanup", "action": "remove",
+         "conditions": [{"field": "ratio", "op": ">=", "value": 2.0},
+                        {"field": "seed_days", "op": ">=", "value": 14}],
+         "match": "any", "clients": ["rutorrent"],
+         "disk": {"path": "/data", "above_percent": 90}}
+    """
+    
+    def __init__(self, name: str, action: str, conditions: List[Dict], match: str = 'all',
+                 clients: Optional[List[str]] = None, disk: Optional[Dict] = None):
+        if action not in ACTIONS:
+            raise ValueError(f"policy {name}: unknown action {action}")
+        if match not in ('all', 'any'):
+            raise ValueError(f"policy {name}: match must be all or any")
+        if not conditions and not disk:
+            raise ValueError(f"policy {name}: needs conditions or a disk threshold")
+        if not isinstance(conditions, list):
+            raise ValueError(f"policy {name}: conditions must be a list")
+        if clients is not None and (
+            not isinstance(clients, list) or not all(isinstance(c, str) for c in clients)
+        ):
+            raise ValueError(f"policy {name}: clients must be a list of client names")
+        if disk and (not isinstance(disk, dict) or not _is_number(disk.get('above_percent'))
+                     or not isinstance(disk.get('path', '/'), str)):
+            raise ValueError(f"policy {name}: disk needs a path and a numeric above_percent")
+        
+        self.name = name
+        self.action = action
+        self.match = match
+        self.clients = set(clients) if clients else None
+        self.conditions = [self._parse_condition(c) for c in conditions]
+        self.disk = None
+        if disk:
+            self.disk = (disk.get('path', '/'), float(disk['above_percent']))
+    
+    def _parse_condition(self, condition: Dict):
+        """Validate a condition and return (field, operator function, value)
+        
+        Operators and values must suit the field's type, so evaluation
+        never compares text with numbers.
+        """
+        if not isinstance(condition, dict):
+            raise ValueError(f"policy {self.name}: each condition must be an object")
+        field, op, value = condition.get('field'), condition.get('op', '=='), condition.get('value')
+        if field not in NUMERIC_FIELDS and field not in TEXT_FIELDS:
+            raise ValueError(f"policy {self.name}: unknown field {field}")
+        if op not in OPERATORS:
+            raise ValueError(f"policy {self.name}: unknown operator {op}")
+        
+        if field in TEXT_FIELDS:
+            if op not in TEXT_OPERATORS:
+                raise ValueError(f"policy {self.name}: {field} only supports {', '.join(TEXT_OPERATORS)}")
+            valid, expected = (lambda v: isinstance(v, str)), 'text'
+        else:
+            valid, expected = _is_number, 'numeric'
+        
+        if op in ('in', 'not in'):
+            if not isinstance(value, list) or not all(valid(v) for v in value):
+                raise ValueError(f"policy {self.name}: {op} on {field} needs a list of {expected} values")
+            return field, OPERATORS[op], frozenset(value)
+        if not valid(value):
+            raise ValueError(f"policy {self.name}: {field} needs a {expected} value")
+        return field, OPERATORS[op], float(value) if field in NUMERIC_FIELDS else value
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SeedingPolicy':
+        """Build a policy from its JSON form"""
+        if not isinstance(data, dict) or not isinstance(data.get('name'), str) \
+                or not isinstance(data.get('action'), str):
+            raise ValueError('each policy needs a name and an action')
+        return cls(
+            data['name'],
+            data['action'],
+            data.get('conditions', []),
+            data.get('match', 'all'),
+            data.get('clients'),
+            data.get('disk')
+        )
+    
+    def to_dict(self) -> Dict:
+        """Convert back to a JSON-friendly summary"""
+        ops = {fn: op for op, fn in OPERATORS.items()}
+        return {
+            'name': self.name,
+            'action': self.action,
+            'match': self.match,
+            'clients': sorted(self.clients) if self.clients else None,
+            'conditions': [
+                {'field': field, 'op': ops[fn],
+                 'value': sorted(value) if isinstance(value, frozenset) else value}
+                for field, fn, value in self.conditions
+            ],
+            'disk': {'path': self.disk[0], 'above_percent': self.disk[1]} if self.disk else None
+        }
+
+
+def load_policies(path: str) -> List[SeedingPolicy]:
+    """Load policies from a JSON file holding a list of policy objects"""
+    if not path:
+        return []
+    try:
+        with open(path) as f:
+            return [SeedingPolicy.from_dict(p) for p in json.load(f)]
+    except Exception as e:
+        logger.error(f"Error loading seeding policies from {path}: {e}")
+        return []
+
+
+class PolicyFrame:
+    """Column arrays for one client's records, built once per evaluation"""
+    
+    def __init__(self, records: List, now: float):
+        self.hashes = [r.hash for r in records]
+        self.names = [r.name for r in records]
+        self.columns = {
+            'ratio': array('d', (r.ratio for r in records)),
+            'progress': array('d', (r.progress for r in records)),
+            # Seed time counts from completion; incomplete torrents have none
+            'seed_days': array('d', (
+                (now - r.completed_on) / 86400 if r.completed_on else -1.0 for r in records
+            )),
+            'state': [r.state for r in records],
+            'label': [r.label for r in records],
+            'name': self.names,
+        }
+        for field in ('size', 'uploaded', 'downloaded', 'upload_speed',
+                      'download_speed', 'peers', 'seeds'):
+            self.columns[field] = array('q', (int(getattr(r, field) or 0) for r in records))
+    
+    def __len__(self) -> int:
+        return len(self.hashes)
+    
+    def select(self, policy: SeedingPolicy, candidates: List[int]) -> List[int]:
+        """Return the candidate row indices the policy's conditions match
+        
+        "all" narrows the index list one condition at a time; "any" unions
+        the per-condition matches.
+        """
+        if policy.match == 'all':
+            indices = candidates
+            for field, fn, value in policy.conditions:
+                column = self.columns[field]
+                indices = [i for i in indices if fn(column[i], value)]
+            return indices
+        
+        if not policy.conditions:
+            return list(candidates)
+        matched = set()
+        for field, fn, value in policy.conditions:
+            column = self.columns[field]
+            matched.update(i for i in candidates if i not in matched and fn(column[i], value))
+        return [i for i in candidates if i in matched]
+
+
+class SeedingPolicyEngine:
+    """Evaluate seeding policies across every client and apply them in batches"""
+    
+    def __init__(self, aggregator, policies: List[SeedingPolicy] = None):
+        self.aggregator = aggregator
+        self.policies = policies or []
+    
+    @staticmethod
+    def _disk_percent(path: str, cache: Dict) -> Optional[float]:
+        """Get used-space percent for a path, once per evaluation"""
+        if path not in cache:
+            try:
+                cache[path] = psutil.disk_usage(path).percent
+            except Exception as e:
+                logger.error(f"Error reading disk usage for {path}: {e}")
+                cache[path] = None
+        return cache[path]
+    
+    def evaluate(self, policies: List[SeedingPolicy] = None, now: float = None) -> Dict:
+        """Build the action plan without touching any client
+        
+        Policies are tried in order and each torrent is claimed by the first
+        policy that matches it, so one torrent never gets two actions.
+        """
+        policies = self.policies if policies is None else policies
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        polled = self.aggregator.poll()
+        disk_cache = {}
+        
+        actions = []
+        evaluated = 0
+        for client, records in polled['records'].items():
+            frame = PolicyFrame(records, now)
+            evaluated += len(frame)
+            unclaimed = list(range(len(frame)))
+            
+            for policy in policies:
+                if not unclaimed:
+                    break
+                if policy.clients is not None and client not in policy.clients:
+                    continue
+                if policy.disk is not None:
+                    percent = self._disk_percent(policy.disk[0], disk_cache)
+                    if percent is None or percent < policy.disk[1]:
+                        continue
+                
+                matched = frame.select(policy, unclaimed)
+                # Torrents already in the action's end state are left for later policies
+                noop = NOOP_STATES.get(policy.action)
+                if noop:
+                    states = frame.columns['state']
+                    matched = [i for i in matched if states[i] not in noop]
+                if matched:
+                    claimed = set(matched)
+                    unclaimed = [i for i in unclaimed if i not in claimed]
+                    actions.append({
+                        'client': client,
+                        'policy': policy.name,
+                        'action': policy.action,
+                        'hashes': [frame.hashes[i] for i in matched],
+                        'names': [frame.names[i] for i in matched]
+                    })
+        
+        return {
+            'actions': actions,
+            'evaluated': evaluated,
+            'matched': sum(len(a['hashes']) for a in actions),
+            'disk': disk_cache,
+            'errors': polled['errors'],
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def apply(self, plan: Dict) -> List[Dict]:
+        """Send each planned action to its client as one bulk call"""
+        clients = {client.name: client for client in self.aggregator.clients}
+        results = []
+        for entry in plan['actions']:
+            client = clients.get(entry['client'])
+            if client is None:
+                continue
+            try:
+                outcome = client.bulk_action(entry['action'], entry['hashes'])
+            except Exception as e:
+                logger.error(f"Error applying policy {entry['policy']} on {entry['client']}: {e}")
+                outcome = {h: False for h in entry['hashes']}
+            results.append({**entry, 'results': outcome})
+        return results
+    
+    def run(self, dry_run: bool = True, policies: List[SeedingPolicy] = None) -> Dict:
+        """Evaluate policies and, unless dry_run, apply the resulting actions"""
+        plan = self.evaluate(policies)
+        plan['dry_run'] = dry_run
+        if not dry_run:
+            plan['actions'] = self.apply(plan)
+        return plan
@@ -3,10 +3,16 @@ Sonarr API integration service
 """
 import requests
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from .arr_paging import fetch_page, iter_pages
+from .calendar_cache import window_dates
 
 logger = logging.getLogger(__name__)
 
+WANTED_PARAMS = {'sortKey': 'airDateUtc', 'sortDirection': 'descending', 'includeSeries': 'true'}
+HISTORY_PARAMS = {'sortKey': 'date', 'sortDirection': 'descending'}
+QUEUE_PARAMS = {'includeSeries': 'true', 'includeEpisode': 'true'}
+
 
 class SonarrService:
     """Wrapper for Sonarr API"""
@@ -37,27 +43,89 @@ class SonarrService:
             logger.error(f"Error getting Sonarr status: {e}")
             return {}
     
-    def get_series(self, limit: int = 100) -> List[Dict]:
-        """Get series from library"""
+    @staticmethod
+    def format_series(s: Dict) -> Dict:
+        """Reduce a Sonarr series resource to the fields the panel shows"""
+        return {
+            'id': s.get('id'),
+            'title': s.get('title'),
+            'year': s.get('year'),
+            'status': s.get('status'),
+            'monitored': s.get('monitored'),
+            'seasonCount': s.get('seasonCount'),
+            'episodeCount': s.get('episodeFileCount'),
+            'episodesToDownload': s.get('episodsToAir'),
+            'sizeOnDisk': s.get('statistics', {}).get('sizeOnDisk', 0),
+            'episodeProgress': s.get('statistics', {}).get('episodeFileCount'),
+            'added': s.get('added')
+        }
+    
+    def fetch_series(self) -> List[Dict]:
+        """Fetch every series in one request (raises on error, for the library sync)"""
+        response = self.session.get(f"{self.base_url}/api/v3/series", timeout=60)
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_series_item(self, series_id: int) -> Optional[Dict]:
+        """Fetch one series, or None if it no longer exists (raises on other errors)"""
+        response = self.session.get(f"{self.base_url}/api/v3/series/{series_id}", timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_history_since(self, date: str) -> List[Dict]:
+        """Fetch history records newer than an ISO date (raises on error)"""
+        response = self.session.get(
+            f"{self.base_url}/api/v3/history/since",
+            params={'date': date},
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def search_commands(kind: str, ids: List[int]) -> List[Tuple[List[int], Dict]]:
+        """Build (ids, command body) pairs that search a batch of episodes or series
+        
+        EpisodeSearch takes a list of episodes; SeriesSearch takes one series.
+        """
+        if kind == 'episode':
+            return [(ids, {'name': 'EpisodeSearch', 'episodeIds': ids})]
+        return [([series_id], {'name': 'SeriesSearch', 'seriesId': series_id}) for series_id in ids]
+    
+    def fetch_indexers(self) -> List[Dict]:
+        """Fetch configured indexers (raises on error, for the search scheduler)"""
+        response = self.session.get(f"{self.base_url}/api/v3/indexer", timeout=10)
+        response.raise_for_status()
+        return response.json()
+    
+    def post_command(self, body: Dict) -> Dict:
+        """Queue a command, returning its command resource (raises on error)"""
+        response = self.session.post(f"{self.base_url}/api/v3/command", json=body, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_command(self, command_id: int) -> Optional[Dict]:
+        """Fetch a command's status, or None once Sonarr has forgotten it (raises on other errors)"""
+        response = self.session.get(f"{self.base_url}/api/v3/command/{command_id}", timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    def get_series(self, limit: Optional[int] = 100) -> List[Dict]:
+        """Get series from library
+        
+        /api/v3/series is not paged and always returns the whole library, so
+        the limit is applied here (None returns everything).
+        """
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v3/series",
-                params={'pageSize': limit}
-            )
+            response = self.session.get(f"{self.base_url}/api/v3/series")
             response.raise_for_status()
             series = response.json()
             
-            return [{
-                'id': s.get('id'),
-                'title': s.get('title'),
-                'status': s.get('status'),
-                'monitored': s.get('monitored'),
-                'seasonCount': s.get('seasonCount'),
-                'episodeCount': s.get('episodeFileCount'),
-                'episodesToDownload': s.get('episodsToAir'),
-                'sizeOnDisk': s.get('statistics', {}).get('sizeOnDisk', 0),
-                'episodeProgress': s.get('statistics', {}).get('episodeFileCount')
-            } for s in series]
+            return [self.format_series(s) for s in series[:limit]]
         except Exception as e:
             logger.error(f"Error getting Sonarr series: {e}")
             return []
@@ -65,7 +133,7 @@ class SonarrService:
     def get_series_stats(self) -> Dict:
         """Get series statistics"""
         try:
-            series = self.get_series(limit=1000)
+            series = self.get_series(limit=None)
             
             total_size = sum(s.get('sizeOnDisk', 0) for s in series)
             
@@ -81,26 +149,59 @@ class SonarrService:
             logger.error(f"Error getting Sonarr stats: {e}")
             return {}
     
+    @staticmethod
+    def format_calendar_episode(e: Dict) -> Dict:
+        """Reduce a calendar episode to the fields the calendar view shows"""
+        return {
+            'id': e.get('id'),
+            'seriesId': e.get('seriesId'),
+            'series': (e.get('series') or {}).get('title'),
+            'seasonNumber': e.get('seasonNumber'),
+            'episodeNumber': e.get('episodeNumber'),
+            'title': e.get('title'),
+            'airDateUtc': e.get('airDateUtc'),
+            'monitored': e.get('monitored'),
+            'hasFile': e.get('hasFile')
+        }
+    
+    def fetch_calendar(self, start: str, end: str, etag: Optional[str] = None) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """Fetch calendar entries between two dates, conditionally if an ETag is given
+        
+        Returns (None, etag) when Sonarr answers 304 Not Modified (raises on error).
+        """
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self.session.get(
+            f"{self.base_url}/api/v3/calendar",
+            params={'start': start, 'end': end, 'includeSeries': 'true'},
+            headers=headers,
+            timeout=30
+        )
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get('ETag')
+    
     def get_calendar(self, days: int = 7) -> List[Dict]:
-        """Get upcoming episodes"""
+        """Get upcoming episodes (the last 30 days through days ahead)"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v3/calendar",
-                params={'start': '-30d', 'end': f'+{days}d'}
-            )
-            response.raise_for_status()
-            return response.json()
+            items, _ = self.fetch_calendar(*window_dates(30, days))
+            return items
         except Exception as e:
             logger.error(f"Error getting Sonarr calendar: {e}")
             return []
     
+    def fetch_queue(self, page_size: int = 250) -> List[Dict]:
+        """Fetch every queue record across pages (raises on error)"""
+        return [
+            record
+            for page in iter_pages(self.session, f"{self.base_url}/api/v3/queue", QUEUE_PARAMS, page_size=page_size)
+            for record in page['records']
+        ]
+    
     def get_queue(self) -> List[Dict]:
         """Get download queue"""
         try:
-            response = self.session.get(f"{self.base_url}/api/v3/queue")
-            response.raise_for_status()
-            
-            queue = response.json()
+            queue = self.fetch_queue()
             return [{
                 'id': item.get('id'),
                 'title': item.get('series', {}).get('title'),
@@ -129,21 +230,33 @@ class SonarrService:
             logger.error(f"Error getting Sonarr history: {e}")
             return []
     
-    def get_wanted(self) -> List[Dict]:
-        """Get wanted episodes"""
+    def get_wanted_page(self, page: int = 1, page_size: int = 100) -> Dict:
+        """Get one page of missing episodes, most recently aired first (raises on error)"""
+        return fetch_page(self.session, f"{self.base_url}/api/v3/wanted/missing",
+                          WANTED_PARAMS, page, page_size)
+    
+    def iter_wanted(self, start_page: int = 1, page_size: int = 250, max_workers: int = 4) -> Iterator[Dict]:
+        """Yield every page of missing episodes from start_page on (raises on error)"""
+        return iter_pages(self.session, f"{self.base_url}/api/v3/wanted/missing", WANTED_PARAMS,
+                          start_page, page_size, max_workers)
+    
+    def get_wanted(self, page_size: int = 100) -> List[Dict]:
+        """Get the first page of wanted episodes (use iter_wanted for the full list)"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v3/wanted/missing",
-                params={'pageSize': 100}
-            )
-            response.raise_for_status()
-            
-            wanted = response.json()
-            return wanted.get('records', []) if isinstance(wanted, dict) else wanted
+            return self.get_wanted_page(1, page_size)['records']
         except Exception as e:
             logger.error(f"Error getting Sonarr wanted: {e}")
             return []
     
+    def get_history_page(self, page: int = 1, page_size: int = 50) -> Dict:
+        """Get one page of history, newest first (raises on error)"""
+        return fetch_page(self.session, f"{self.base_url}/api/v3/history", HISTORY_PARAMS, page, page_size)
+    
+    def iter_history(self, start_page: int = 1, page_size: int = 250, max_workers: int = 4) -> Iterator[Dict]:
+        """Yield every page of history from start_page on (raises on error)"""
+        return iter_pages(self.session, f"{self.base_url}/api/v3/history", HISTORY_PARAMS,
+                          start_page, page_size, max_workers)
+    
     def get_config(self) -> Dict:
         """Get Sonarr configuration"""
         try:
@@ -0,0 +1,337 @@
+"""
+Storage analysis service
+Detects hardlinked, duplicated and orphaned data between downloads and media
+"""
+import os
+import time
+import bisect
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start, middle and end of a file to fingerprint it
+SAMPLE_BLOCK = 64 * 1024
+
+
+def iter_files(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (path, stat) for every regular file below root
+    
+    Uses an explicit directory stack over os.scandir so only the current
+    directory listing is held in memory, never the whole tree.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        logger.debug(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Cannot scan {current}: {e}")
+
+
+def sample_digest(path: str, size: int) -> Optional[str]:
+    """Hash the size and three sampled blocks of a file, or None if unreadable
+    
+    Cheap enough to confirm that two equally sized files are copies without
+    reading either in full.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for offset in sorted({0, max(0, size // 2 - SAMPLE_BLOCK // 2), max(0, size - SAMPLE_BLOCK)}):
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_BLOCK))
+    except OSError as e:
+        logger.debug(f"Cannot sample {path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+class StorageService:
+    """Hardlink-aware duplicate and orphan detector"""
+    
+    def __init__(self, download_paths: List[str], media_paths: List[str],
+                 min_size: int = 1024 * 1024, max_items: int = 100, index_ttl: int = 600):
+        self.download_paths = [p for p in download_paths if p]
+        self.media_paths = [p for p in media_paths if p]
+        self.min_size = min_size
+        self.max_items = max_items
+        self.index_ttl = index_ttl
+        self.last_report = None
+        self.last_label_report = None
+        self._scan_lock = threading.Lock()  # held for the one scan in flight
+        self._path_index = None  # (built_at, sorted paths, [(dev, ino, size)])
+    
+    def index_downloads(self) -> Dict[Tuple[int, int], Tuple[int, str]]:
+        """Build the (device, inode) -> (size, path) index of the download side"""
+        index = {}
+        for root in self.download_paths:
+            for path, st in iter_files(root):
+                key = (st.st_dev, st.st_ino)
+                if key not in index:
+                    index[key] = (st.st_size, path)
+        return index
+    
+    def scan(self) -> Dict:
+        """Scan configured paths and report hardlinks, duplicates and orphans
+        
+        The download side is indexed by (device, inode); the media side is
+        streamed once and probed against that index. Media files that are not
+        hardlinks are bucketed by size so full copies of orphaned downloads
+        can be matched afterwards without a second walk; a size match only
+        counts as a duplicate when the sampled contents match too.
+        """
+        started = time.time()
+        downloads = self.index_downloads()
+        download_bytes = sum(size for size, _ in downloads.values())
+        
+        linked = set()
+        media_files = media_bytes = 0
+        media_only_files = media_only_bytes = 0
+        media_only_sizes = {}
+        seen_media = set()
+        
+        for root in self.media_paths:
+            for path, st in iter_files(root):
+                key = (st.st_dev, st.st_ino)
+                if key in seen_media:
+                    continue
+                seen_media.add(key)
+                media_files += 1
+                media_bytes += st.st_size
+                
+                if key in downloads:
+                    linked.add(key)
+                    continue
+                
+                media_only_files += 1
+                media_only_bytes += st.st_size
+                if st.st_size >= self.min_size:
+                    media_only_sizes.setdefault(st.st_size, []).append(path)
+        
+        duplicates = []
+        orphans = []
+        digests = {}
+        linked_bytes = 0
+        wasted_bytes = orphan_bytes = 0
+        
+        for key, (size, path) in downloads.items():
+            if key in linked:
+                linked_bytes += size
+                continue
+            copy_path = self._match_copy(path, size, media_only_sizes.get(size), digests)
+            if copy_path is not None:
+                wasted_bytes += size
+                duplicates.append({'download': path, 'media': copy_path, 'size': size})
+            else:
+                orphan_bytes += size
+                orphans.append({'path': path, 'size': size})
+        
+        duplicates.sort(key=lambda d: d['size'], reverse=True)
+        orphans.sort(key=lambda o: o['size'], reverse=True)
+        
+        report = {
+            'download_paths': self.download_paths,
+            'media_paths': self.media_paths,
+            'downloads': {'files': len(downloads), 'bytes': download_bytes},
+            'media': {'files': media_files, 'bytes': media_bytes},
+            'hardlinked': {'files': len(linked), 'bytes': linked_bytes},
+            'media_only': {'files': media_only_files, 'bytes': media_only_bytes},
+            'duplicates': {
+                'files': len(duplicates),
+                'wasted_bytes': wasted_bytes,
+                'wasted_gb': round(wasted_bytes / (1024**3), 2),
+                'items': duplicates[:self.max_items]
+            },
+            'orphaned_downloads': {
+                'files': len(orphans),
+                'bytes': orphan_bytes,
+                'gb': round(orphan_bytes / (1024**3), 2),
+                'items': orphans[:self.max_items]
+            },
+            'scanned_at': started,
+            'scan_seconds': round(time.time() - started, 3)
+        }
+        self.last_report = report
+        return report
+    
+    @staticmethod
+    def _match_copy(path: str, size: int, copies: Optional[List[str]], digests: Dict) -> Optional[str]:
+        """Take the media copy whose sampled contents match a download, if any
+        
+        Each media copy pairs with at most one download; digests caches the
+        media side's samples across downloads of the same size.
+        """
+        if not copies:
+            return None
+        digest = sample_digest(path, size)
+        if digest is None:
+            return None
+        for i, copy_path in enumerate(copies):
+            if copy_path not in digests:
+                digests[copy_path] = sample_digest(copy_path, size)
+            if digests[copy_path] == digest:
+                return copies.pop(i)
+        return None
+    
+    def _refresh_report(self):
+        """Rescan in the background, releasing the scan lock when done"""
+        try:
+            self.scan()
+        except Exception as e:
+            logger.error(f"Error scanning storage: {e}")
+        finally:
+            self._scan_lock.release()
+    
+    def get_report(self, refresh: bool = False) -> Dict:
+        """Return the last scan report, rescanning after index_ttl or on refresh
+        
+        Only one scan runs at a time. Callers wait for the first report;
+        after that an expired report is served, flagged refreshing, while a
+        single background scan replaces it.
+        """
+        try:
+            cached = self.last_report
+            if cached is None:
+                with self._scan_lock:
+                    return self.last_report or self.scan()
+            if refresh or time.time() - cached['scanned_at'] > self.index_ttl:
+                if self._scan_lock.acquire(blocking=False):
+                    try:
+                        threading.Thread(
+                            target=self._refresh_report, name='storage-scan', daemon=True
+                        ).start()
+                    except Exception:
+                        self._scan_lock.release()
+                        raise
+                return {**cached, 'refreshing': True}
+            return cached
+        except Exception as e:
+            logger.error(f"Error scanning storage: {e}")
+            return {}
+    
+    def get_path_index(self, refresh: bool = False) -> Tuple[List[str], List[Tuple[int, int, int]]]:
+        """Get sorted download file paths with their (device, inode, size), rebuilt after index_ttl"""
+        cached = self._path_index
+        if refresh or cached is None or time.time() - cached[0] > self.index_ttl:
+            files = sorted(
+                (path, (st.st_dev, st.st_ino, st.st_size))
+                for root in map(os.path.normpath, self.download_paths)
+                for path, st in iter_files(root)
+            )
+            cached = (time.time(), [f[0] for f in files], [f[1] for f in files])
+            self._path_index = cached
+        return cached[1], cached[2]
+    
+    def files_under(self, path: str, refresh: bool = False) -> List[Tuple[int, int, int]]:
+        """Get (device, inode, size) for a file, or every file below a directory
+        
+        Paths inside the download roots are answered from the sorted path
+        index with a prefix range lookup; anything else is walked directly.
+        """
+        path = os.path.normpath(path)
+        paths, entries = self.get_path_index(refresh)
+        if any(path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+               for root in map(os.path.normpath, self.download_paths)):
+            i = bisect.bisect_left(paths, path)
+            if i < len(paths) and paths[i] == path:
+                return [entries[i]]
+            prefix = path.rstrip(os.sep) + os.sep
+            start = bisect.bisect_left(paths, prefix)
+            end = bisect.bisect_left(paths, prefix[:-1] + chr(ord(os.sep) + 1))
+            return entries[start:end]
+        
+        try:
+            if os.path.isfile(path):
+                st = os.stat(path)
+                return [(st.st_dev, st.st_ino, st.st_size)]
+        except OSError:
+            return []
+        return [(st.st_dev, st.st_ino, st.st_size) for _, st in iter_files(path)]
+    
+    def label_usage(self, torrents: Iterable[Tuple[str, Optional[str], int]],
+                    refresh: bool = False) -> Dict:
+        """Account disk usage per label from (label, data path, size) torrent tuples
+        
+        Every file is identified by (device, inode), so hardlinks and
+        cross-seeded copies of the same data count once. Bytes only one
+        label references are unique to it; bytes several labels reference
+        are shared and listed under each of them.
+        """
+        started = time.time()
+        inode_labels = {}  # (dev, ino) -> set of labels
+        inode_sizes = {}
+        labels = {}
+        seen_paths = {}
+        
+        for label, path, size in torrents:
+            label = label or 'unlabeled'
+            entry = labels.setdefault(label, {'torrents': 0, 'missing': 0, 'naive_bytes': 0})
+            entry['torrents'] += 1
+            entry['naive_bytes'] += size or 0
+            if not path:
+                entry['missing'] += 1
+                continue
+            
+            # Cross-seeds often point at the same data path; resolve it once
+            files = seen_paths.get(path)
+            if files is None:
+                files = seen_paths[path] = self.files_under(path, refresh)
+                refresh = False
+            if not files:
+                entry['missing'] += 1
+                continue
+            for dev, ino, file_size in files:
+                key = (dev, ino)
+                inode_sizes[key] = file_size
+                inode_labels.setdefault(key, set()).add(label)
+        
+        for entry in labels.values():
+            entry['unique_bytes'] = entry['shared_bytes'] = 0
+        for key, owners in inode_labels.items():
+            size = inode_sizes[key]
+            field = 'unique_bytes' if len(owners) == 1 else 'shared_bytes'
+            for label in owners:
+                labels[label][field] += size
+        
+        for entry in labels.values():
+            entry['disk_bytes'] = entry['unique_bytes'] + entry['shared_bytes']
+            entry['disk_gb'] = round(entry['disk_bytes'] / (1024**3), 2)
+        
+        total = sum(inode_sizes.values())
+        report = {
+            'labels': dict(sorted(labels.items(), key=lambda kv: kv[1]['disk_bytes'], reverse=True)),
+            'total_bytes': total,
+            'total_gb': round(total / (1024**3), 2),
+            'naive_bytes': sum(e['naive_bytes'] for e in labels.values()),
+            'scanned_at': started,
+            'scan_seconds': round(time.time() - started, 3)
+        }
+        self.last_label_report = report
+        return report
+    
+    def get_label_report(self, get_torrents, refresh: bool = False) -> Dict:
+        """Return the cached label report, rebuilding it after index_ttl or on refresh
+        
+        get_torrents returns (label, data path, size) tuples and is only
+        called when the report is rebuilt.
+        """
+        try:
+            cached = self.last_label_report
+            if refresh or cached is None or time.time() - cached['scanned_at'] > self.index_ttl:
+                return self.label_usage(get_torrents(), refresh)
+            return cached
+        except Exception as e:
+            logger.error(f"Error building label usage: {e}")
+            return {}
+
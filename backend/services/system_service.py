@@ -2,8 +2,11 @@
 System monitoring service
 """
 import psutil
+import time
 import logging
-from typing import Dict
+import threading
+from collections import deque
+from typing import Dict, List, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -209,3 +212,71 @@ class SystemService:
         except Exception as e:
             logger.error(f"Error getting sensor stats: {e}")
             return {}
+
+
+class SensorPoller:
+    """Poll hardware sensors on a slow cadence and serve cached snapshots
+    
+    psutil sensor reads walk hwmon sysfs and can take hundreds of
+    milliseconds, so requests read the last snapshot instead of the hardware.
+    """
+    
+    def __init__(self, interval: int = 30, history_size: int = 20):
+        self.interval = interval
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the background polling thread if it is not running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sensor-poller', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the background polling thread"""
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+    
+    def poll(self) -> Dict:
+        """Read the sensors once and record the snapshot"""
+        snapshot = {'timestamp': time.time(), 'sensors': SystemService.get_sensor_stats()}
+        with self._lock:
+            self.history.append(snapshot)
+        return snapshot
+    
+    def latest(self) -> Optional[Dict]:
+        """Get the most recent snapshot, if any"""
+        with self._lock:
+            return self.history[-1] if self.history else None
+    
+    def get_snapshot(self, include_history: bool = False) -> Dict:
+        """Get the cached sensor snapshot with its age in seconds"""
+        snapshot = self.latest()
+        if snapshot is None:
+            # First request before the poller has run: read synchronously once
+            snapshot = self.poll()
+        
+        result = dict(snapshot['sensors'])
+        result['timestamp'] = datetime.fromtimestamp(snapshot['timestamp']).isoformat()
+        result['age_seconds'] = round(time.time() - snapshot['timestamp'], 1)
+        result['poll_interval'] = self.interval
+        if include_history:
+            result['history'] = self.get_history()
+        return result
+    
+    def get_history(self) -> List[Dict]:
+        """Get the short sensor history, oldest first"""
+        with self._lock:
+            return [{
+                'timestamp': datetime.fromtimestamp(s['timestamp']).isoformat(),
+                **s['sensors']
+            } for s in self.history]
@@ -0,0 +1,176 @@
+"""
+Unified torrent client layer
+Normalizes uTorrent and rtorrent torrents into one record type and merges
+all configured clients into a single view
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+from .torrent_store import TorrentStore
+
+logger = logging.getLogger(__name__)
+
+
+class TorrentRecord(NamedTuple):
+    """Client-independent torrent record"""
+    hash: str
+    name: str
+    size: int
+    progress: float
+    downloaded: int
+    uploaded: int
+    ratio: float
+    upload_speed: int
+    download_speed: int
+    state: str
+    label: str
+    peers: int
+    seeds: int
+    save_path: Optional[str]
+    client: str
+    completed_on: Optional[int] = None  # unix seconds, None while incomplete
+    
+    def to_dict(self) -> Dict:
+        """Convert to a JSON-friendly dict"""
+        return self._asdict()
+
+
+# TorrentStore columns in TorrentRecord field order (client is inserted before completed_on)
+RECORD_COLUMNS = ('hash', 'name', 'size', 'progress', 'downloaded', 'uploaded', 'ratio',
+                  'upload_speed', 'download_speed', 'state', 'label', 'peers', 'seeds',
+                  'save_path', 'completed_on')
+
+
+class TorrentClient:
+    """One configured torrent client service under a name
+    
+    The services already normalize their rows into a TorrentStore (rates
+    in bytes/s, progress 0-1, state names), so records are read straight
+    from the snapshot's columns whatever the client, once per snapshot.
+    """
+    
+    def __init__(self, name: str, service):
+        self.name = name
+        self.service = service
+        self._records = (None, [])
+    
+    def get_snapshot(self):
+        """Get the client's shared list snapshot"""
+        return self.service.get_snapshot()
+    
+    def records(self, snapshot) -> List[TorrentRecord]:
+        """Build normalized records from a snapshot's store columns, reusing them per snapshot"""
+        cached_snapshot, records = self._records
+        if cached_snapshot is snapshot:
+            return records
+        columns = snapshot.store.columns
+        records = []
+        for hash_id, *fields, save_path, completed_on in zip(*(columns[c] for c in RECORD_COLUMNS)):
+            records.append(TorrentRecord(
+                hash_id.upper(), *fields, save_path, self.name, completed_on or None
+            ))
+        self._records = (snapshot, records)
+        return records
+    
+    def get_records(self) -> List[TorrentRecord]:
+        """Get normalized records from the client's shared snapshot"""
+        return self.records(self.get_snapshot())
+    
+    def bulk_action(self, action: str, hashes: List[str]) -> Dict[str, bool]:
+        """Apply an action to many torrents on this client"""
+        return self.service.bulk_action(action, hashes)
+    
+    def get_tracker_urls(self, hashes: List[str]) -> Dict[str, List[str]]:
+        """Get tracker URLs for the given hashes"""
+        return self.service.get_tracker_urls(hashes)
+
+
+class TorrentAggregator:
+    """Poll every configured client concurrently and merge by infohash"""
+    
+    def __init__(self, clients: List[TorrentClient]):
+        self.clients = clients
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(clients)), thread_name_prefix='torrent-poll'
+        )
+        self._merged = ((), None)
+    
+    def poll(self) -> Dict:
+        """Fetch records from all clients at once; failures are reported per client"""
+        futures = {
+            client.name: self._executor.submit(client.get_records)
+            for client in self.clients
+        }
+        records, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                records[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error polling torrent client {name}: {e}")
+                errors[name] = str(e)
+                records[name] = []
+        return {'records': records, 'errors': errors}
+    
+    def get_merged(self) -> Dict:
+        """Get one deduplicated torrent view with combined bandwidth totals
+        
+        A torrent seeded from several clients appears once, listing every
+        client; its rates and uploaded bytes are summed across them and
+        the ratio is recomputed from the combined upload. The merged view
+        and its TorrentStore are rebuilt only when a client's snapshot
+        changes, so requests within the snapshot TTL share them.
+        """
+        polled = self.poll()
+        key = tuple(polled['records'].values())
+        cached_key, cached = self._merged
+        if cached is not None and not polled['errors'] and len(key) == len(cached_key) and all(
+            a is b for a, b in zip(key, cached_key)
+        ):
+            return cached
+        
+        merged = {}
+        bandwidth = {'upload_speed': 0, 'download_speed': 0, 'clients': {}}
+        
+        for name, records in polled['records'].items():
+            up = down = 0
+            for record in records:
+                up += record.upload_speed
+                down += record.download_speed
+                
+                existing = merged.get(record.hash)
+                if existing is None:
+                    entry = record.to_dict()
+                    entry['clients'] = [record.client]
+                    del entry['client']
+                    merged[record.hash] = entry
+                else:
+                    existing['clients'].append(record.client)
+                    existing['upload_speed'] += record.upload_speed
+                    existing['download_speed'] += record.download_speed
+                    existing['uploaded'] += record.uploaded
+                    if existing['size']:
+                        existing['ratio'] = existing['uploaded'] / existing['size']
+            
+            bandwidth['clients'][name] = {
+                'upload_speed': up,
+                'download_speed': down,
+                'torrents': len(records)
+            }
+            bandwidth['upload_speed'] += up
+            bandwidth['download_speed'] += down
+        
+        torrents = list(merged.values())
+        result = {
+            'torrents': torrents,
+            'store': TorrentStore.from_records(torrents),
+            'bandwidth': bandwidth,
+            'errors': polled['errors']
+        }
+        if not polled['errors']:
+            self._merged = (key, result)
+        return result
+    
+    def get_records(self) -> List[TorrentRecord]:
+        """Get all normalized records from every client, without merging"""
+        polled = self.poll()
+        return [r for records in polled['records'].values() for r in records]
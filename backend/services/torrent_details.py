@@ -0,0 +1,66 @@
+"""
+On-demand torrent details
+Files, peers and trackers are fetched only for torrents someone opens and
+cached per hash until they expire or the torrent changes state
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TorrentDetailCache:
+    """Per-hash TTL cache for detail lookups, keyed by a state fingerprint
+    
+    Each entry remembers the fingerprint of the torrent's snapshot row when
+    it was fetched (e.g. status and completion); a later lookup that sees a
+    different fingerprint refetches even if the TTL has not run out.
+    """
+    
+    def __init__(self, fetchers: Dict[str, Callable[[str], List[Dict]]],
+                 fingerprint: Callable[[str], Optional[Hashable]],
+                 ttl: float = 10.0, max_entries: int = 256):
+        self.fetchers = fetchers
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (hash, kind) -> (fetched_at, fingerprint, data)
+        self._lock = threading.Lock()
+    
+    def get(self, hash_id: str, kind: str) -> Optional[Dict]:
+        """Get one kind of detail for a torrent, or None if the torrent is unknown"""
+        if kind not in self.fetchers:
+            raise ValueError(f"unknown detail: {kind}")
+        hash_id = hash_id.upper()
+        fingerprint = self.fingerprint(hash_id)
+        if fingerprint is None:
+            return None
+        
+        key = (hash_id, kind)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl and entry[1] == fingerprint:
+                self._entries.move_to_end(key)
+                return {'hash': hash_id, kind: entry[2], 'age': round(now - entry[0], 2), 'cached': True}
+        
+        data = self.fetchers[kind](hash_id)
+        with self._lock:
+            self._entries[key] = (now, fingerprint, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return {'hash': hash_id, kind: data, 'age': 0, 'cached': False}
+    
+    def invalidate(self, hash_id: str = None):
+        """Drop cached details for one torrent, or for all of them"""
+        with self._lock:
+            if hash_id is None:
+                self._entries.clear()
+                return
+            hash_id = hash_id.upper()
+            for kind in self.fetchers:
+                self._entries.pop((hash_id, kind), None)
@@ -0,0 +1,109 @@
+"""
+Short-lived torrent list snapshots
+One fetched torrent list per client, shared by the list, stats and
+bandwidth endpoints, with aggregates computed once per snapshot
+"""
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class TorrentSnapshot:
+    """Raw client rows plus the columnar store and aggregates derived from them
+    
+    The rows are kept exactly as the client returned them (uTorrent arrays,
+    RTorrentRecord tuples); every reader goes through the store, and dicts
+    are only built for the rows a caller asks for.
+    """
+    
+    def __init__(self, rows: Sequence, build_store: Callable, aggregate: Callable[..., Dict],
+                 format_row: Callable[..., Dict]):
+        self.rows = rows
+        self.fetched_at = time.time()
+        self._build_store = build_store
+        self._aggregate = aggregate
+        self._format_row = format_row
+        self._store = None
+        self._aggregates = None
+        self._lock = threading.Lock()
+    
+    @property
+    def age(self) -> float:
+        """Seconds since the list was fetched"""
+        return time.time() - self.fetched_at
+    
+    def expire(self):
+        """Mark the snapshot as out of date so the cache refetches it"""
+        self.fetched_at = 0.0
+    
+    @property
+    def store(self):
+        """Columnar TorrentStore for the list, built on first use"""
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._build_store(self.rows)
+        return self._store
+    
+    @property
+    def aggregates(self) -> Dict:
+        """Stats and bandwidth totals, computed from the store on first use"""
+        if self._aggregates is None:
+            store = self.store
+            with self._lock:
+                if self._aggregates is None:
+                    self._aggregates = self._aggregate(store)
+        return self._aggregates
+    
+    def to_dicts(self) -> List[Dict]:
+        """Build the client's full torrent dicts, for callers that want the whole list"""
+        return [self._format_row(row) for row in self.rows]
+
+
+class SnapshotCache:
+    """Short-TTL, single-flight cache of TorrentSnapshot objects
+    
+    Concurrent callers that find the snapshot expired wait for the one
+    thread doing the fetch and then share its result, so a dashboard load
+    costs one upstream list call per client instead of one per endpoint.
+    """
+    
+    def __init__(self, fetch: Callable[[], Sequence], build_store: Callable,
+                 aggregate: Callable[..., Dict], format_row: Callable[..., Dict], ttl: float = 2.0):
+        self.fetch = fetch
+        self.build_store = build_store
+        self.aggregate = aggregate
+        self.format_row = format_row
+        self.ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+    
+    def _fresh(self, snapshot: TorrentSnapshot) -> bool:
+        """Check whether a snapshot is still within the TTL"""
+        return snapshot is not None and snapshot.age < self.ttl
+    
+    def get(self) -> TorrentSnapshot:
+        """Get the current snapshot, fetching a new one if it has expired"""
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot
+            snapshot = TorrentSnapshot(self.fetch(), self.build_store, self.aggregate, self.format_row)
+            self._snapshot = snapshot
+            return snapshot
+    
+    def peek(self) -> Optional[TorrentSnapshot]:
+        """Get the last snapshot without fetching, even if it has expired"""
+        return self._snapshot
+    
+    def invalidate(self):
+        """Expire the current snapshot so the next get() refetches; peek() still returns it"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            snapshot.expire()
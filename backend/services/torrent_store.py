@@ -0,0 +1,195 @@
+"""
+Columnar torrent store
+Holds torrent lists as parallel arrays and answers filter/sort/page queries
+without building a dict for every torrent
+"""
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fields returned by default; the rest are selectable with fields=
+DEFAULT_FIELDS = ('hash', 'name', 'size', 'downloaded', 'uploaded',
+                  'upload_speed', 'download_speed', 'ratio', 'state', 'label')
+COLUMNS = DEFAULT_FIELDS + ('progress', 'peers', 'seeds', 'save_path', 'completed_on', 'active')
+INT_COLUMNS = ('size', 'downloaded', 'uploaded', 'upload_speed', 'download_speed',
+               'peers', 'seeds', 'completed_on')
+FLOAT_COLUMNS = ('ratio', 'progress')
+# save_path may be None, so it can be selected but not sorted on
+SORT_COLUMNS = tuple(column for column in COLUMNS if column != 'save_path')
+
+# uTorrent status bitfield
+UT_STARTED = 1
+UT_CHECKING = 2
+UT_ERROR = 16
+UT_PAUSED = 32
+UT_QUEUED = 64
+
+
+def utorrent_state(status: int, progress: int) -> str:
+    """Map a uTorrent status bitfield and per-mille progress to a state name"""
+    if status & UT_ERROR:
+        return 'error'
+    if status & UT_CHECKING:
+        return 'checking'
+    if status & UT_PAUSED:
+        return 'paused'
+    complete = progress >= 1000
+    if status & UT_STARTED:
+        return 'seeding' if complete else 'downloading'
+    if status & UT_QUEUED:
+        return 'queued'
+    return 'finished' if complete else 'stopped'
+
+
+class TorrentRow:
+    """Lightweight row materialized on demand from a TorrentStore"""
+    __slots__ = COLUMNS
+    
+    def __init__(self, store: 'TorrentStore', index: int):
+        for column in COLUMNS:
+            setattr(self, column, store.columns[column][index])
+        self.completed_on = self.completed_on or None
+        self.active = bool(self.active)
+    
+    def to_dict(self, fields: Iterable[str] = DEFAULT_FIELDS) -> Dict:
+        """Convert the selected fields to a dict"""
+        return {field: getattr(self, field) for field in fields}
+
+
+class TorrentStore:
+    """Parallel arrays of hash, name, sizes, rates, ratio, state, label and peers"""
+    
+    def __init__(self):
+        self.columns = {column: [] for column in COLUMNS}
+        for column in INT_COLUMNS:
+            self.columns[column] = array('q')
+        for column in FLOAT_COLUMNS:
+            self.columns[column] = array('d')
+        self.columns['active'] = array('b')
+        self._positions = None
+    
+    def __len__(self) -> int:
+        return len(self.columns['hash'])
+    
+    def append(self, hash_id: str, name: str, size: int, downloaded: int, uploaded: int,
+               upload_speed: int, download_speed: int, ratio: float, state: str, label: str,
+               progress: float = 0.0, peers: int = 0, seeds: int = 0, save_path: str = None,
+               completed_on: int = None, active: bool = False):
+        """Add one torrent (progress is 0-1, completed_on is unix seconds or None)"""
+        columns = self.columns
+        columns['hash'].append(hash_id)
+        columns['name'].append(name)
+        columns['size'].append(int(size or 0))
+        columns['downloaded'].append(int(downloaded or 0))
+        columns['uploaded'].append(int(uploaded or 0))
+        columns['upload_speed'].append(int(upload_speed or 0))
+        columns['download_speed'].append(int(download_speed or 0))
+        columns['ratio'].append(float(ratio or 0))
+        # States and labels repeat heavily; share one string object per value
+        columns['state'].append(sys.intern(state or 'unknown'))
+        columns['label'].append(sys.intern(label or ''))
+        columns['progress'].append(float(progress or 0))
+        columns['peers'].append(int(peers or 0))
+        columns['seeds'].append(int(seeds or 0))
+        columns['save_path'].append(save_path or None)
+        columns['completed_on'].append(int(completed_on or 0))
+        columns['active'].append(1 if active else 0)
+    
+    @classmethod
+    def from_utorrent(cls, rows: Iterable[list]) -> 'TorrentStore':
+        """Build a store straight from uTorrent WebUI torrent rows
+        
+        Rows are the list=1 arrays: status bitfield at 1, per-mille
+        progress and ratio at 4 and 7, completion time at 24 and the save
+        path at 26 on builds that send them.
+        """
+        store = cls()
+        for t in rows:
+            store.append(
+                t[0], t[2], t[3], t[5], t[6], t[8], t[9], t[7] / 1000,
+                utorrent_state(t[1], t[4]), t[11],
+                progress=t[4] / 1000, peers=t[12], seeds=t[14],
+                save_path=t[26] if len(t) > 26 else None,
+                completed_on=t[24] if len(t) > 24 else None,
+                active=t[1] != 0
+            )
+        return store
+    
+    @classmethod
+    def from_rutorrent(cls, records: Iterable) -> 'TorrentStore':
+        """Build a store straight from RTorrentRecord rows"""
+        store = cls()
+        for r in records:
+            store.append(
+                r.hash, r.name, r.size, r.downloaded, r.uploaded,
+                r.upload_speed, r.download_speed, r.ratio, r.status, r.label,
+                progress=r.downloaded / r.size if r.size else 0, peers=r.peers, seeds=r.seeds,
+                save_path=r.base_path, completed_on=r.finished_on, active=r.is_active
+            )
+        return store
+    
+    @classmethod
+    def from_records(cls, torrents: Iterable[Dict]) -> 'TorrentStore':
+        """Build a store from normalized TorrentRecord dicts"""
+        store = cls()
+        for t in torrents:
+            store.append(
+                t['hash'], t['name'], t['size'], t['downloaded'], t['uploaded'],
+                t['upload_speed'], t['download_speed'], t['ratio'],
+                t['state'], t['label'],
+                progress=t['progress'], peers=t['peers'], seeds=t['seeds'],
+                save_path=t['save_path'], completed_on=t['completed_on']
+            )
+        return store
+    
+    def find(self, hash_id: str) -> Optional[int]:
+        """Get the row index of a hash (case-insensitive), or None if absent"""
+        if self._positions is None:
+            self._positions = {h.upper(): i for i, h in enumerate(self.columns['hash'])}
+        return self._positions.get(hash_id.upper())
+    
+    def row(self, index: int) -> TorrentRow:
+        """Materialize a single row"""
+        return TorrentRow(self, index)
+    
+    def query(self, state: str = None, label: str = None, name: str = None,
+              sort: str = None, descending: bool = False, offset: int = 0,
+              limit: Optional[int] = None, fields: List[str] = None) -> Tuple[int, List[Dict]]:
+        """Filter, sort and page the store, returning (total matches, page rows)
+        
+        Filters and sorting run over row indices and the column arrays;
+        dicts are only built for the rows in the requested page.
+        """
+        fields = fields or list(DEFAULT_FIELDS)
+        unknown = [f for f in fields if f not in COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+        if sort is not None and sort not in SORT_COLUMNS:
+            raise ValueError(f"cannot sort by {sort}")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError('offset and limit must not be negative')
+        
+        indices = range(len(self))
+        if state:
+            wanted = set(state.split(','))
+            states = self.columns['state']
+            indices = [i for i in indices if states[i] in wanted]
+        if label is not None:
+            labels = self.columns['label']
+            indices = [i for i in indices if labels[i] == label]
+        if name:
+            needle = name.lower()
+            names = self.columns['name']
+            indices = [i for i in indices if needle in names[i].lower()]
+        
+        indices = list(indices)
+        if sort is not None:
+            column = self.columns[sort]
+            if sort == 'name':
+                indices.sort(key=lambda i: column[i].lower(), reverse=descending)
+            else:
+                indices.sort(key=column.__getitem__, reverse=descending)
+        
+        end = offset + limit if limit is not None else None
+        page = indices[offset:end]
+        return len(indices), [TorrentRow(self, i).to_dict(fields) for i in page]
@@ -0,0 +1,121 @@
+"""
+Bulk torrent upload
+Parses uploaded .torrent files and magnet links, drops torrents the client
+already has, and submits the rest concurrently
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from .bencode import BencodeError, parse_magnet, parse_torrent
+
+logger = logging.getLogger(__name__)
+
+
+class UploadItem:
+    """One uploaded .torrent file or magnet link and its outcome"""
+    __slots__ = ('source', 'kind', 'data', 'info_hash', 'name', 'size', 'status', 'error')
+    
+    def __init__(self, source: str, kind: str, data=None):
+        self.source = source
+        self.kind = kind  # file or magnet
+        self.data = data
+        self.info_hash = None
+        self.name = None
+        self.size = None
+        self.status = 'pending'
+        self.error = None
+    
+    def to_dict(self) -> Dict:
+        """Convert the outcome to a JSON-friendly dict"""
+        return {
+            'source': self.source,
+            'type': self.kind,
+            'hash': self.info_hash,
+            'name': self.name,
+            'size': self.size,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+class TorrentUploader:
+    """Add many torrents to one client with infohash dedupe"""
+    
+    def __init__(self, service, max_workers: int = 4):
+        self.service = service
+        self.max_workers = max_workers
+    
+    @staticmethod
+    def parse(item: UploadItem) -> UploadItem:
+        """Fill in the infohash, name and size, or mark the item invalid"""
+        try:
+            if item.kind == 'magnet':
+                parsed = parse_magnet(item.data)
+                if parsed is None:
+                    raise BencodeError('magnet link has no btih infohash')
+            else:
+                parsed = parse_torrent(item.data)
+        except Exception as e:
+            # Any malformed upload fails only its own item
+            item.status = 'invalid'
+            item.error = str(e) if isinstance(e, BencodeError) else f'unreadable torrent: {e}'
+            return item
+        item.info_hash = parsed['info_hash']
+        item.name = parsed['name'] or item.source
+        item.size = parsed['size']
+        return item
+    
+    def _existing_hashes(self) -> Optional[set]:
+        """Get the hashes already in the client, or None if the list is unavailable"""
+        try:
+            return {h.upper() for h in self.service.get_snapshot().store.columns['hash']}
+        except Exception as e:
+            logger.error(f"Error reading client torrent list for dedupe: {e}")
+            return None
+    
+    def _submit(self, item: UploadItem) -> UploadItem:
+        """Send one item to the client"""
+        if item.kind == 'magnet':
+            success = self.service.add_torrent_url(item.data)
+        else:
+            success = self.service.add_torrent_file(item.source, item.data)
+        item.status = 'added' if success else 'failed'
+        if not success:
+            item.error = 'client rejected the torrent'
+        item.data = None
+        return item
+    
+    def upload(self, items: List[UploadItem]) -> List[UploadItem]:
+        """Parse, dedupe and submit items, returning each one with its status
+        
+        Items are deduplicated against each other and against the client's
+        current torrent table, so only new infohashes reach the client.
+        """
+        for item in items:
+            self.parse(item)
+        
+        existing = self._existing_hashes() or set()
+        seen = set()
+        pending = []
+        for item in items:
+            if item.status != 'pending':
+                continue
+            if item.info_hash in existing:
+                item.status = 'exists'
+            elif item.info_hash in seen:
+                item.status = 'duplicate'
+            else:
+                seen.add(item.info_hash)
+                pending.append(item)
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                    thread_name_prefix='torrent-upload') as executor:
+                for item, future in [(i, executor.submit(self._submit, i)) for i in pending]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Error adding torrent {item.source}: {e}")
+                        item.status = 'failed'
+                        item.error = str(e)
+        return items
@@ -0,0 +1,101 @@
+"""
+Per-tracker statistics
+Groups torrents from every client by announce domain and totals upload,
+download and ratio per tracker
+"""
+import time
+import logging
+import threading
+from typing import Dict, List
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_TRACKER = 'unknown'
+
+
+def announce_domain(urls: List[str]) -> str:
+    """Get the host of a torrent's primary (first) tracker"""
+    for url in urls:
+        host = urlparse(url.strip()).hostname
+        if host:
+            return host.lower()
+    return UNKNOWN_TRACKER
+
+
+class TrackerStats:
+    """Tracker domains cached per torrent, aggregated over the current torrent lists
+    
+    Tracker URLs rarely change, so each torrent's domain is fetched once
+    and kept; a run only asks the clients about hashes it has not seen.
+    """
+    
+    def __init__(self, aggregator):
+        self.aggregator = aggregator
+        self._domains = {}  # client -> {hash: domain}
+        self._lock = threading.Lock()
+    
+    def _refresh_domains(self, client, records) -> Dict[str, str]:
+        """Fetch tracker URLs for this client's new torrents and forget removed ones"""
+        known = self._domains.get(client.name, {})
+        current = {r.hash for r in records}
+        domains = {h: d for h, d in known.items() if h in current}
+        
+        new = [h for h in current if h not in domains]
+        if new:
+            try:
+                fetched = client.get_tracker_urls(new)
+            except Exception as e:
+                logger.error(f"Error fetching trackers from {client.name}: {e}")
+                fetched = {}
+            for hash_id, urls in fetched.items():
+                domains[hash_id.upper()] = announce_domain(urls)
+        
+        self._domains[client.name] = domains
+        return domains
+    
+    def get_stats(self) -> Dict:
+        """Get upload, download, ratio and torrent counts per tracker domain"""
+        started = time.perf_counter()
+        clients = {client.name: client for client in self.aggregator.clients}
+        polled = self.aggregator.poll()
+        totals = {}
+        pending = 0
+        
+        with self._lock:
+            for name, records in polled['records'].items():
+                if name in polled['errors']:
+                    # Keep the cached domains through a failed poll
+                    continue
+                domains = self._refresh_domains(clients[name], records)
+                for r in records:
+                    domain = domains.get(r.hash)
+                    if domain is None:
+                        pending += 1
+                        continue
+                    entry = totals.get(domain)
+                    if entry is None:
+                        entry = totals[domain] = {
+                            'tracker': domain, 'torrents': 0, 'seeding': 0, 'size': 0,
+                            'uploaded': 0, 'downloaded': 0, 'upload_speed': 0, 'clients': set()
+                        }
+                    entry['torrents'] += 1
+                    entry['seeding'] += r.state == 'seeding'
+                    entry['size'] += r.size
+                    entry['uploaded'] += r.uploaded
+                    entry['downloaded'] += r.downloaded
+                    entry['upload_speed'] += r.upload_speed
+                    entry['clients'].add(name)
+        
+        trackers = sorted(totals.values(), key=lambda t: t['uploaded'], reverse=True)
+        for entry in trackers:
+            entry['ratio'] = round(entry['uploaded'] / entry['downloaded'], 3) if entry['downloaded'] else None
+            entry['clients'] = sorted(entry['clients'])
+        
+        return {
+            'trackers': trackers,
+            'count': len(trackers),
+            'pending': pending,
+            'errors': polled['errors'],
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
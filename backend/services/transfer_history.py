@@ -0,0 +1,221 @@
+"""
+Per-torrent transfer history
+Samples uploaded/downloaded counters on a schedule, stores compact deltas
+and daily rollups, and answers top-earner queries
+"""
+import time
+import logging
+import threading
+from typing import Dict, List
+from sqlalchemy import select, insert, delete, func, literal, union_all, or_, and_
+from ..models import db, TrackedTorrent, TorrentTransferSample, TorrentTransferDaily
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+class TransferSampler:
+    """Record per-torrent transfer deltas from the torrent aggregator
+    
+    Every worker may start a sampler, but with a ProcessLock only the
+    holder samples; the others wait to take over if it exits, so deltas
+    are recorded once per deployment.
+    """
+    
+    def __init__(self, aggregator, interval: int = 300, retention_days: int = 2, lock=None):
+        self.aggregator = aggregator
+        self.lock = lock
+        self.interval = interval
+        self.retention_days = retention_days
+        self._ids = {}  # (client, hash) -> tracked torrent id
+        self._last = {}  # (client, hash) -> (uploaded, downloaded)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self, app):
+        """Start sampling in a background thread bound to the app context"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(app,), name='transfer-sampler', daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background sampler"""
+        self._stop.set()
+    
+    def _run(self, app):
+        while not self._stop.is_set():
+            if self.lock is not None and not self.lock.acquire():
+                self._stop.wait(self.interval)
+                continue
+            with app.app_context():
+                try:
+                    self.sample()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error sampling torrent transfers: {e}")
+            self._stop.wait(self.interval)
+    
+    def _resolve_ids(self, records) -> Dict:
+        """Map (client, hash) to tracked torrent ids, creating unknown torrents in bulk"""
+        missing = {(r.client, r.hash): r.name for r in records if (r.client, r.hash) not in self._ids}
+        if not missing:
+            return self._ids
+        
+        hashes = list({h for _, h in missing})
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            for row in TrackedTorrent.query.filter(TrackedTorrent.info_hash.in_(chunk)):
+                self._ids[(row.client, row.info_hash)] = row.id
+        
+        new = [key for key in missing if key not in self._ids]
+        if new:
+            db.session.add_all([
+                TrackedTorrent(client=client, info_hash=info_hash, name=missing[(client, info_hash)])
+                for client, info_hash in new
+            ])
+            db.session.commit()
+            for start in range(0, len(new), 500):
+                chunk = [h for _, h in new[start:start + 500]]
+                for row in TrackedTorrent.query.filter(TrackedTorrent.info_hash.in_(chunk)):
+                    self._ids[(row.client, row.info_hash)] = row.id
+        return self._ids
+    
+    def sample(self, now: float = None) -> int:
+        """Take one sample; returns the number of torrents that changed
+        
+        The first sighting of a torrent only records its counters as a
+        baseline. A counter that went backwards (client restart, torrent
+        re-added) counts from zero.
+        """
+        now = int(now or time.time())
+        with self._lock:
+            records = self.aggregator.get_records()
+            ids = self._resolve_ids(records)
+            
+            rows = []
+            for r in records:
+                key = (r.client, r.hash)
+                previous = self._last.get(key)
+                self._last[key] = (r.uploaded, r.downloaded)
+                if previous is None:
+                    continue
+                uploaded = r.uploaded - previous[0]
+                downloaded = r.downloaded - previous[1]
+                if uploaded < 0:
+                    uploaded = r.uploaded
+                if downloaded < 0:
+                    downloaded = r.downloaded
+                if uploaded or downloaded:
+                    rows.append({
+                        'torrent_id': ids[key],
+                        'ts': now,
+                        'uploaded': uploaded,
+                        'downloaded': downloaded
+                    })
+            
+            if rows:
+                db.session.execute(insert(TorrentTransferSample), rows)
+                db.session.commit()
+            self.rollup(now)
+            return len(rows)
+    
+    def rollup(self, now: float = None):
+        """Roll completed days of samples into daily rows and prune old samples"""
+        today = int(now or time.time()) // DAY
+        rolled_through = db.session.scalar(select(func.max(TorrentTransferDaily.day)))
+        if rolled_through is None:
+            first_ts = db.session.scalar(select(func.min(TorrentTransferSample.ts)))
+            if first_ts is None:
+                return
+            next_day = first_ts // DAY
+        else:
+            next_day = rolled_through + 1
+        
+        for day in range(next_day, today):
+            db.session.execute(
+                insert(TorrentTransferDaily).from_select(
+                    ['torrent_id', 'day', 'uploaded', 'downloaded'],
+                    select(
+                        TorrentTransferSample.torrent_id,
+                        literal(day, db.Integer),
+                        func.sum(TorrentTransferSample.uploaded),
+                        func.sum(TorrentTransferSample.downloaded)
+                    ).where(
+                        TorrentTransferSample.ts >= day * DAY,
+                        TorrentTransferSample.ts < (day + 1) * DAY
+                    ).group_by(TorrentTransferSample.torrent_id)
+                )
+            )
+        
+        db.session.execute(
+            delete(TorrentTransferSample).where(
+                TorrentTransferSample.ts < (today - self.retention_days) * DAY
+            )
+        )
+        db.session.commit()
+
+
+def top_earners(hours: int = 24, limit: int = 20, order_by: str = 'uploaded',
+                now: float = None) -> List[Dict]:
+    """Get the torrents that transferred the most over the last `hours`
+    
+    Whole days already rolled up are read from the daily table and the
+    rest from raw samples; both feed one grouped, indexed aggregation.
+    """
+    if order_by not in ('uploaded', 'downloaded'):
+        raise ValueError('order_by must be uploaded or downloaded')
+    now = int(now or time.time())
+    start = now - hours * 3600
+    first_full_day = -(-start // DAY)
+    rolled_through = db.session.scalar(select(func.max(TorrentTransferDaily.day)))
+    
+    samples = select(
+        TorrentTransferSample.torrent_id,
+        TorrentTransferSample.uploaded,
+        TorrentTransferSample.downloaded
+    ).where(TorrentTransferSample.ts >= start)
+    
+    if rolled_through is not None and rolled_through >= first_full_day:
+        samples = samples.where(or_(
+            TorrentTransferSample.ts < first_full_day * DAY,
+            TorrentTransferSample.ts >= (rolled_through + 1) * DAY
+        ))
+        daily = select(
+            TorrentTransferDaily.torrent_id,
+            TorrentTransferDaily.uploaded,
+            TorrentTransferDaily.downloaded
+        ).where(and_(
+            TorrentTransferDaily.day >= first_full_day,
+            TorrentTransferDaily.day <= rolled_through
+        ))
+        combined = union_all(samples, daily).subquery()
+    else:
+        combined = samples.subquery()
+    
+    uploaded = func.sum(combined.c.uploaded).label('uploaded')
+    downloaded = func.sum(combined.c.downloaded).label('downloaded')
+    totals = select(combined.c.torrent_id, uploaded, downloaded) \
+        .group_by(combined.c.torrent_id) \
+        .order_by((uploaded if order_by == 'uploaded' else downloaded).desc()) \
+        .limit(limit) \
+        .subquery()
+    
+    rows = db.session.execute(
+        select(TrackedTorrent, totals.c.uploaded, totals.c.downloaded)
+        .join(totals, TrackedTorrent.id == totals.c.torrent_id)
+        .order_by(getattr(totals.c, order_by).desc())
+    ).all()
+    
+    return [{
+        'hash': torrent.info_hash,
+        'name': torrent.name,
+        'client': torrent.client,
+        'uploaded': int(up or 0),
+        'downloaded': int(down or 0)
+    } for torrent, up, down in rows]
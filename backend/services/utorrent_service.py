@@ -2,35 +2,115 @@
 uTorrent service wrapper
 Manages torrent downloads via uTorrent RPC API
 """
+import re
 import requests
 import base64
 import logging
+import threading
 from typing import Dict, List, Optional
-from urllib.parse import urljoin
+from urllib.parse import quote, urljoin
+from .torrent_details import TorrentDetailCache
+from .torrent_snapshot import SnapshotCache
+from .torrent_store import TorrentStore
 
 logger = logging.getLogger(__name__)
 
+# Hashes per bulk WebUI request, keeping the query string a safe length
+BULK_CHUNK_SIZE = 100
+BULK_ACTIONS = {
+    'start': 'start',
+    'stop': 'stop',
+    'pause': 'pause',
+    'resume': 'resume',
+    'remove': 'remove',
+    'remove-all': 'removedata',
+}
+
+TOKEN_PATTERN = re.compile(r"<div[^>]*id=['\"]token['\"][^>]*>([^<]+)</div>")
+
 
 class UTorrentService:
     """Wrapper for uTorrent RPC API"""
     
-    def __init__(self, base_url: str, username: str, password: str):
+    def __init__(self, base_url: str, username: str, password: str, snapshot_ttl: float = 2.0,
+                 detail_ttl: float = 10.0):
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
         self.session = requests.Session()
         
+        # Delta-synced table of raw WebUI torrent rows keyed by hash
+        self._torrent_table = {}
+        self._cache_id = None
+        self._table_lock = threading.Lock()
+        
+        # Shared list snapshot for the list, stats and bandwidth endpoints
+        self.snapshots = SnapshotCache(
+            self._fetch_rows, TorrentStore.from_utorrent, self._aggregate_torrents,
+            self._format_torrent, snapshot_ttl
+        )
+        
+        # Files/peers/trackers, fetched only for torrents that are opened
+        self.details = TorrentDetailCache(
+            {'files': self._fetch_files, 'peers': self._fetch_peers, 'trackers': self._fetch_trackers},
+            self._detail_fingerprint, detail_ttl
+        )
+        
+        # CSRF token from /gui/token.html, reused with the GUID cookie
+        self._token = None
+        self._token_lock = threading.Lock()
+        
         # Setup basic auth
         auth_string = base64.b64encode(f"{username}:{password}".encode()).decode()
         self.session.headers.update({'Authorization': f'Basic {auth_string}'})
     
-    def is_connected(self) -> bool:
-        """Check if uTorrent is accessible"""
-        try:
+    def _fetch_token(self, stale_token: str = None) -> str:
+        """Fetch a new WebUI token unless another thread already replaced stale_token"""
+        with self._token_lock:
+            if self._token is not None and self._token != stale_token:
+                return self._token
             response = self.session.get(
-                urljoin(self.base_url, '/gui/?list=1'),
+                urljoin(self.base_url, '/gui/token.html'),
                 timeout=10
             )
+            response.raise_for_status()
+            match = TOKEN_PATTERN.search(response.text)
+            if not match:
+                raise ValueError('uTorrent token not found in token.html')
+            self._token = match.group(1).strip()
+            return self._token
+    
+    def _gui_request(self, method: str, query: str, **kwargs) -> requests.Response:
+        """Send a /gui/ request with the cached token
+        
+        The token and GUID cookie are reused for every call; a new token is
+        only fetched when uTorrent rejects the current one with 400 or 401.
+        """
+        token = self._token or self._fetch_token()
+        response = self.session.request(
+            method,
+            urljoin(self.base_url, f'/gui/?token={token}&{query}'),
+            timeout=10,
+            **kwargs
+        )
+        if response.status_code in (400, 401):
+            token = self._fetch_token(stale_token=token)
+            response = self.session.request(
+                method,
+                urljoin(self.base_url, f'/gui/?token={token}&{query}'),
+                timeout=10,
+                **kwargs
+            )
+        return response
+    
+    def _gui_get(self, query: str) -> requests.Response:
+        """GET a /gui/ query with the cached token"""
+        return self._gui_request('GET', query)
+    
+    def is_connected(self) -> bool:
+        """Check if uTorrent is accessible"""
+        try:
+            response = self._gui_get('list=1')
             return response.status_code == 200
         except Exception as e:
             logger.error(f"uTorrent connection error: {e}")
@@ -39,10 +119,7 @@ class UTorrentService:
     def get_server_status(self) -> Dict:
         """Get uTorrent server status"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, '/gui/?list=1'),
-                timeout=10
-            )
+            response = self._gui_get('list=1')
             response.raise_for_status()
             data = response.json()
             
@@ -59,72 +136,208 @@ class UTorrentService:
             logger.error(f"Error getting uTorrent status: {e}")
             return {'status': 'error', 'message': str(e)}
     
-    def get_torrents(self) -> List[Dict]:
-        """Get list of all torrents"""
-        try:
-            response = self.session.get(
-                urljoin(self.base_url, '/gui/?list=1'),
-                timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
+    @staticmethod
+    def _format_torrent(torrent: list) -> Dict:
+        """Convert a WebUI torrent row into a dict"""
+        return {
+            'hash': torrent[0],
+            'status': torrent[1],
+            'name': torrent[2],
+            'size': torrent[3],
+            'progress': torrent[4],
+            'downloaded': torrent[5],
+            'uploaded': torrent[6],
+            'ratio': torrent[7],
+            'upload_speed': torrent[8],
+            'download_speed': torrent[9],
+            'eta': torrent[10],
+            'label': torrent[11],
+            'peers': torrent[12],
+            'peers_total': torrent[13],
+            'seeds': torrent[14],
+            'seeds_total': torrent[15],
+            'availability': torrent[16],
+            'torrent_queue_order': torrent[17],
+            'remaining': torrent[18],
+            'added_on': torrent[23] if len(torrent) > 23 else None,
+            'completed_on': torrent[24] if len(torrent) > 24 else None,
+            'save_path': torrent[26] if len(torrent) > 26 else None
+        }
+    
+    def sync_torrents(self) -> List[list]:
+        """Bring the in-memory torrent table up to date and return its rows
+        
+        The first call downloads the full list; later calls pass the cache
+        id from the previous response so uTorrent only returns changed
+        torrents (torrentp) and removed hashes (torrentm). Rows are kept as
+        the raw WebUI arrays and returned as a list taken under the lock,
+        since another poll may update the table.
+        """
+        with self._table_lock:
+            query = 'list=1'
+            if self._cache_id is not None:
+                query += f'&cid={self._cache_id}'
+            try:
+                response = self._gui_get(query)
+                response.raise_for_status()
+                data = response.json()
+            except Exception:
+                # Next poll starts over with a full list
+                self._cache_id = None
+                raise
+            
+            if 'torrents' in data:
+                self._torrent_table = {t[0]: t for t in data['torrents']}
+            else:
+                for torrent in data.get('torrentp', []):
+                    self._torrent_table[torrent[0]] = torrent
+                for hash_id in data.get('torrentm', []):
+                    self._torrent_table.pop(hash_id, None)
             
-            torrents = []
-            for torrent in data.get('torrents', []):
-                torrents.append({
-                    'hash': torrent[0],
-                    'status': torrent[1],
-                    'name': torrent[2],
-                    'size': torrent[3],
-                    'progress': torrent[4],
-                    'downloaded': torrent[5],
-                    'uploaded': torrent[6],
-                    'ratio': torrent[7],
-                    'upload_speed': torrent[8],
-                    'download_speed': torrent[9],
-                    'eta': torrent[10],
-                    'label': torrent[11],
-                    'peers': torrent[12],
-                    'seeds': torrent[13],
-                    'availability': torrent[14],
-                    'torrent_queue_order': torrent[15],
-                    'remaining': torrent[16]
-                })
-            return torrents
+            self._cache_id = data.get('torrentc')
+            return list(self._torrent_table.values())
+    
+    def _fetch_rows(self) -> List[list]:
+        """Get the raw torrent rows for a snapshot, or an empty list on error"""
+        try:
+            return self.sync_torrents()
         except Exception as e:
             logger.error(f"Error getting torrents: {e}")
             return []
     
+    def get_torrents(self) -> List[Dict]:
+        """Get list of all torrents"""
+        return self.get_snapshot().to_dicts()
+    
+    @staticmethod
+    def _aggregate_torrents(store: TorrentStore) -> Dict:
+        """Compute torrent stats and bandwidth totals from the store columns"""
+        columns = store.columns
+        states = columns['state']
+        return {
+            'stats': {
+                'total_torrents': len(store),
+                'downloading': states.count('downloading'),
+                'seeding': states.count('seeding'),
+                'total_size': sum(columns['size']),
+                'total_uploaded': sum(columns['uploaded']),
+                'total_downloaded': sum(columns['downloaded'])
+            },
+            'bandwidth': {
+                'upload_speed': sum(columns['upload_speed']),
+                'download_speed': sum(columns['download_speed']),
+                'active_connections': sum(columns['active'])
+            }
+        }
+    
+    def get_snapshot(self):
+        """Get the shared short-lived torrent list snapshot"""
+        return self.snapshots.get()
+    
     def get_torrent_stats(self) -> Dict:
         """Get torrent statistics"""
         try:
-            torrents = self.get_torrents()
-            
-            downloading = sum(1 for t in torrents if t['status'] in [200, 201])
-            seeding = sum(1 for t in torrents if t['status'] in [136])
-            total_size = sum(t['size'] for t in torrents)
-            total_uploaded = sum(t['uploaded'] for t in torrents)
-            total_downloaded = sum(t['downloaded'] for t in torrents)
-            
-            return {
-                'total_torrents': len(torrents),
-                'downloading': downloading,
-                'seeding': seeding,
-                'total_size': total_size,
-                'total_uploaded': total_uploaded,
-                'total_downloaded': total_downloaded
-            }
+            return self.get_snapshot().aggregates['stats']
         except Exception as e:
             logger.error(f"Error getting torrent stats: {e}")
             return {}
     
+    def _detail_fingerprint(self, hash_id: str):
+        """Status and completion of a torrent in the last snapshot, or None if absent
+        
+        Reads whatever snapshot is held, expired or not, so opening a detail
+        never refetches the whole list; only a cold start fetches one.
+        """
+        store = (self.snapshots.peek() or self.get_snapshot()).store
+        index = store.find(hash_id)
+        if index is None:
+            return None
+        return store.columns['state'][index], store.columns['progress'][index] >= 1
+    
+    def _gui_json(self, query: str) -> Dict:
+        """GET a /gui/ query and decode the JSON reply"""
+        response = self._gui_get(query)
+        response.raise_for_status()
+        return response.json()
+    
+    def _fetch_files(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's file list with action=getfiles"""
+        data = self._gui_json(f'action=getfiles&hash={hash_id}')
+        files = data.get('files', [None, []])[1]
+        return [{
+            'name': f[0],
+            'size': f[1],
+            'downloaded': f[2],
+            'priority': f[3]
+        } for f in files]
+    
+    def _fetch_peers(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's connected peers with action=getpeers"""
+        data = self._gui_json(f'action=getpeers&hash={hash_id}')
+        peers = data.get('peers', [None, []])[1]
+        return [{
+            'country': p[0],
+            'ip': p[1],
+            'port': p[4],
+            'client': p[5],
+            'flags': p[6],
+            'progress': p[7] / 1000,
+            'download_speed': p[8],
+            'upload_speed': p[9],
+            'uploaded': p[13],
+            'downloaded': p[14]
+        } for p in peers]
+    
+    def _fetch_trackers(self, hash_id: str) -> List[Dict]:
+        """Fetch a torrent's tracker list with action=getprops
+        
+        The WebUI only exposes tracker URLs (blank lines separate tiers),
+        not per-tracker announce status.
+        """
+        data = self._gui_json(f'action=getprops&hash={hash_id}')
+        props = (data.get('props') or [{}])[0]
+        trackers, tier = [], 0
+        for line in props.get('trackers', '').splitlines():
+            line = line.strip()
+            if not line:
+                tier += 1
+                continue
+            trackers.append({'url': line, 'tier': tier})
+        # Collapse tier numbers left sparse by repeated blank lines
+        tiers = {t: i for i, t in enumerate(sorted({t['tier'] for t in trackers}))}
+        for tracker in trackers:
+            tracker['tier'] = tiers[tracker['tier']]
+        return trackers
+    
+    def get_tracker_urls(self, hashes: List[str]) -> Dict[str, List[str]]:
+        """Get tracker URLs for many torrents
+        
+        The WebUI has no list-wide tracker column, so this is one getprops
+        call per hash; hashes that fail are left out so a later run retries them.
+        """
+        urls = {}
+        for hash_id in hashes:
+            try:
+                urls[hash_id] = [t['url'] for t in self._fetch_trackers(hash_id)]
+            except Exception as e:
+                logger.error(f"Error fetching trackers for {hash_id}: {e}")
+        return urls
+    
+    def get_torrent_detail(self, hash_id: str, kind: str) -> Optional[Dict]:
+        """Get files, peers or trackers for one torrent (None if not in the list)"""
+        try:
+            return self.details.get(hash_id, kind)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting torrent {kind}: {e}")
+            return {}
+    
     def start_torrent(self, hash_id: str) -> bool:
         """Start a torrent"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action=start&hash={hash_id}'),
-                timeout=10
-            )
+            response = self._gui_get(f'action=start&hash={hash_id}')
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error starting torrent: {e}")
@@ -133,10 +346,8 @@ class UTorrentService:
     def stop_torrent(self, hash_id: str) -> bool:
         """Stop a torrent"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action=stop&hash={hash_id}'),
-                timeout=10
-            )
+            response = self._gui_get(f'action=stop&hash={hash_id}')
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error stopping torrent: {e}")
@@ -145,10 +356,8 @@ class UTorrentService:
     def pause_torrent(self, hash_id: str) -> bool:
         """Pause a torrent"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action=pause&hash={hash_id}'),
-                timeout=10
-            )
+            response = self._gui_get(f'action=pause&hash={hash_id}')
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error pausing torrent: {e}")
@@ -157,10 +366,8 @@ class UTorrentService:
     def resume_torrent(self, hash_id: str) -> bool:
         """Resume a torrent"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action=resume&hash={hash_id}'),
-                timeout=10
-            )
+            response = self._gui_get(f'action=resume&hash={hash_id}')
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error resuming torrent: {e}")
@@ -170,40 +377,62 @@ class UTorrentService:
         """Remove a torrent"""
         try:
             action = 'removedata' if delete_files else 'remove'
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action={action}&hash={hash_id}'),
-                timeout=10
-            )
+            response = self._gui_get(f'action={action}&hash={hash_id}')
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error removing torrent: {e}")
             return False
     
+    def bulk_action(self, action: str, hashes: List[str]) -> Dict[str, bool]:
+        """Apply an action to many torrents with repeated &hash= parameters
+        
+        Hashes are sent BULK_CHUNK_SIZE at a time; uTorrent reports one
+        status per request, so every hash in a chunk shares its result.
+        """
+        webui_action = BULK_ACTIONS[action]
+        results = {}
+        for start in range(0, len(hashes), BULK_CHUNK_SIZE):
+            chunk = hashes[start:start + BULK_CHUNK_SIZE]
+            query = f'action={webui_action}' + ''.join(f'&hash={h}' for h in chunk)
+            try:
+                success = self._gui_get(query).status_code == 200
+            except Exception as e:
+                logger.error(f"Error running bulk {action}: {e}")
+                success = False
+            results.update((h, success) for h in chunk)
+        if hashes:
+            self.snapshots.invalidate()
+        return results
+    
     def add_torrent_url(self, url: str) -> bool:
         """Add torrent from URL"""
         try:
-            response = self.session.get(
-                urljoin(self.base_url, f'/gui/?action=add-url&s={url}'),
-                timeout=10
-            )
+            response = self._gui_get(f"action=add-url&s={quote(url, safe='')}")
+            self.snapshots.invalidate()
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Error adding torrent: {e}")
             return False
     
+    def add_torrent_file(self, filename: str, data: bytes) -> bool:
+        """Add torrent from .torrent file contents"""
+        try:
+            response = self._gui_request(
+                'POST', 'action=add-file',
+                files={'torrent_file': (filename, data, 'application/x-bittorrent')}
+            )
+            self.snapshots.invalidate()
+            # uTorrent reports rejected files in a JSON "error" field
+            return response.status_code == 200 and 'error' not in (response.json() or {})
+        except Exception as e:
+            logger.error(f"Error adding torrent file: {e}")
+            return False
+    
     def get_bandwidth_stats(self) -> Dict:
         """Get bandwidth statistics"""
         try:
-            torrents = self.get_torrents()
-            
-            upload_speed = sum(t['upload_speed'] for t in torrents)
-            download_speed = sum(t['download_speed'] for t in torrents)
-            
-            return {
-                'upload_speed': upload_speed,
-                'download_speed': download_speed,
-                'active_connections': len([t for t in torrents if t['status'] != 0])
-            }
+            return self.get_snapshot().aggregates['bandwidth']
         except Exception as e:
             logger.error(f"Error getting bandwidth stats: {e}")
             return {}
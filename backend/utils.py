@@ -2,9 +2,11 @@
 Utility decorators and helpers
 """
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from models import User, AuditLog, db
+import re
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -55,6 +57,69 @@ def log_audit(user_id: int, action: str, ip_address: str, status: str = 'success
         logger.error(f"Error logging audit: {e}")
 
 
+def log_audit_batch(user_id: int, ip_address: str, entries: list):
+    """Log many audit entries in a single commit
+    
+    entries is a list of dicts with action, target and optionally status,
+    details and error_message.
+    """
+    try:
+        for entry in entries:
+            db.session.add(AuditLog(
+                user_id=user_id,
+                action=entry['action'],
+                target=entry.get('target'),
+                details=entry.get('details'),
+                status=entry.get('status', 'success'),
+                error_message=entry.get('error_message'),
+                ip_address=ip_address
+            ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error logging audit batch: {e}")
+
+
+HASH_PATTERN = re.compile(r'[0-9A-Fa-f]{40}')
+
+BULK_FILTER_KEYS = ('state', 'label', 'name')
+
+
+def resolve_bulk_hashes(data: dict, get_store) -> list:
+    """Get the hashes a bulk request targets: an explicit list or a filter over the torrent store
+    
+    get_store is only called for filter requests, so explicit hash lists
+    never trigger a torrent list fetch.
+    """
+    hashes = data.get('hashes')
+    if hashes is not None:
+        if not isinstance(hashes, list):
+            raise ValueError('hashes must be a list')
+        invalid = [h for h in hashes if not isinstance(h, str) or not HASH_PATTERN.fullmatch(h)]
+        if invalid:
+            raise ValueError(f'hashes must be 40-character hex infohashes: {invalid[:3]}')
+        return list(dict.fromkeys(hashes))
+    
+    criteria = data.get('filter')
+    if not isinstance(criteria, dict) or not criteria:
+        raise ValueError('hashes or filter required')
+    # A filter that narrows nothing would select every torrent
+    unknown = set(criteria) - set(BULK_FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"unknown filter keys: {', '.join(sorted(unknown))}")
+    if any(not isinstance(value, str) for value in criteria.values()):
+        raise ValueError('filter values must be strings')
+    if not any(criteria.values()):
+        raise ValueError('filter needs at least one non-empty criterion')
+    _, rows = get_store().query(
+        state=criteria.get('state'),
+        label=criteria.get('label'),
+        name=criteria.get('name'),
+        fields=['hash']
+    )
+    return [row['hash'] for row in rows]
+
+
 def handle_errors(fn):
     """Decorator to handle common errors"""
     @wraps(fn)
@@ -69,6 +134,87 @@ def handle_errors(fn):
     return wrapper
 
 
+def get_shared_metrics(section: str):
+    """Get a section of the shared metrics snapshot, or None if unavailable or stale"""
+    reader = current_app.extensions.get('metrics_snapshot')
+    if reader is None:
+        return None
+    return reader.get(section)
+
+
+TORRENT_QUERY_ARGS = ('sort', 'order', 'state', 'label', 'name', 'offset', 'limit', 'fields')
+
+
+def parse_torrent_query():
+    """Parse sort/filter/paging arguments for torrent lists, or None if none were given"""
+    args = request.args
+    if not any(key in args for key in TORRENT_QUERY_ARGS):
+        return None
+    
+    sort = args.get('sort') or None
+    descending = args.get('order', '').lower() == 'desc'
+    if sort and sort.startswith('-'):
+        sort, descending = sort[1:], True
+    fields = args.get('fields')
+    
+    return {
+        'state': args.get('state'),
+        'label': args.get('label'),
+        'name': args.get('name'),
+        'sort': sort,
+        'descending': descending,
+        'offset': args.get('offset', 0, type=int),
+        'limit': args.get('limit', type=int),
+        'fields': [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    }
+
+
+def arr_list_response(key: str, get_page, iter_pages, default_size: int = 50):
+    """Serve a paged Radarr/Sonarr list as one page or, with ?stream=true, every page as NDJSON
+    
+    get_page(page, page_size) and iter_pages(start_page, page_size, max_workers)
+    are service methods that raise on upstream errors. A stream that fails
+    part way ends with an {"error", "resume_page"} line so the client can
+    continue with ?page=<resume_page>.
+    """
+    args = request.args
+    page = max(1, args.get('page', 1, type=int))
+    
+    if args.get('stream', 'false').lower() == 'true':
+        page_size = args.get('page_size', current_app.config.get('ARR_PAGE_SIZE', 250), type=int)
+        pages = iter_pages(page, max(1, min(page_size, 1000)), current_app.config.get('ARR_PAGE_WORKERS', 4))
+        
+        def generate():
+            resume_page = page
+            try:
+                for result in pages:
+                    for record in result['records']:
+                        yield json.dumps(record) + '\n'
+                    resume_page = result['page'] + 1
+            except Exception as e:
+                logger.error(f"Error streaming {key}: {e}")
+                yield json.dumps({'error': str(e), 'resume_page': resume_page}) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    page_size = args.get('page_size', args.get('limit', default_size, type=int), type=int)
+    try:
+        result = get_page(page, max(1, min(page_size, 1000)))
+    except Exception as e:
+        logger.error(f"Error fetching {key} page {page}: {e}")
+        return jsonify({'error': f'Failed to fetch {key}'}), 502
+    
+    return jsonify({
+        key: result['records'],
+        'count': len(result['records']),
+        'page': result['page'],
+        'page_size': result['page_size'],
+        'pages': result['pages'],
+        'total': result['total'],
+        'next_page': result['page'] + 1 if result['page'] < result['pages'] else None
+    }), 200
+
+
 def rate_limit(limit: int = 100, window: int = 60):
     """Simple rate limiting decorator"""
     def decorator(fn):